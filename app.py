@@ -1,38 +1,197 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from flight_tracker import FlightTracker
+from flask import (Flask, Response, current_app, render_template, request, redirect, url_for, flash, jsonify, g,
+                   session, stream_with_context)
+from markupsafe import Markup
+from flight_tracker import FlightTracker, load_env
+from flight_metrics import CONTENT_TYPE, HTTP_CACHE_TOTAL, HTTP_REQUEST_SECONDS, REGISTRY
+from flight_http import LRUCache, compress_response, template_token
+from flight_events import OVERFLOW, EventBroker, format_sse
+from flight_models import FLIGHT_STATES, LISTED_STATES, dumps
+from flight_airports import lookup, validate_route
+from flight_currency import CURRENCIES, default_currency, format_money, validate_currency
+from flight_logging import bind, new_id, setup_logging, unbind
+import flight_profiling
+import logging
 import os
-import traceback
+import threading
+import time
 
-app = Flask(__name__)
-app.secret_key = os.environ.get('SECRET_KEY', 'flight-tracker-secret-key-2025')
+load_env()
+setup_logging()
+logger = logging.getLogger('app')
 
-# Initialize tracker
-tracker = None
-try:
-    tracker = FlightTracker()
-    print("✅ Flight Tracker initialized successfully")
-except Exception as e:
-    print(f"❌ Error initializing tracker: {e}")
-    traceback.print_exc()
+class WorkerTracker:
+    """One FlightTracker per thread of each worker process, built lazily
+    
+    With gunicorn --preload the app is imported once in the master and the
+    workers are forked from it; anything the master built (the tracker's
+    alert batch and breaker, background threads) must not be shared, so
+    each worker builds its own on first use. gthread workers serve several
+    requests at once and a check leaves its outcome on the tracker
+    (last_failure_reason, last_page_stats, pending_alerts), so each thread
+    gets its own tracker too. The threads of a worker share one circuit
+    breaker, so only one of them sends the half-open probe.
+    """
+    
+    def __init__(self, db_path=None, tracker=None):
+        self.db_path = db_path or os.getenv('DATABASE_URL') or os.getenv('DATABASE_PATH', 'flights.db')
+        # A tracker passed in serves every thread of the process that built the app
+        self._tracker = tracker
+        self._tracker_pid = os.getpid() if tracker is not None else None
+        self._breaker = None
+        self._breaker_pid = None
+        # Bumped by reset(); each thread rebuilds its tracker when it sees a new one
+        self._generation = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+    
+    def get(self):
+        """This thread's tracker, or None if it could not be initialized"""
+        pid = os.getpid()
+        if self._tracker_pid == pid:
+            return self._tracker
+        local = self._local
+        if getattr(local, 'key', None) == (pid, self._generation):
+            return local.tracker
+        with self._lock:
+            local.tracker = None
+            try:
+                local.tracker = FlightTracker(self.db_path,
+                                              breaker=self._breaker if self._breaker_pid == pid else None)
+                if self._breaker_pid != pid:
+                    self._breaker, self._breaker_pid = local.tracker.breaker, pid
+                logger.debug("Flight Tracker initialized",
+                             extra={'pid': pid, 'thread_name': threading.current_thread().name})
+            except Exception as e:
+                logger.exception("Error initializing tracker: %s", e)
+            local.key = (pid, self._generation)
+        return local.tracker
+    
+    def reset(self):
+        """Forget the trackers so the next request in each thread builds a new one"""
+        with self._lock:
+            self._tracker = self._tracker_pid = None
+            self._breaker = self._breaker_pid = None
+            self._generation += 1
+
+def get_tracker():
+    """FlightTracker for the current app and worker process"""
+    return current_app.extensions['flight_tracker'].get()
+
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.log_token = bind(request_id=request.headers.get('X-Request-ID') or new_id())
+
+def record_request_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        HTTP_REQUEST_SECONDS.labels(endpoint=request.endpoint or 'unknown', status=response.status_code) \
+            .observe(time.perf_counter() - start)
+    return response
+
+def start_profile():
+    """Profile this request if it asks to with an X-Profile header and profiling is enabled
+    
+    The header lists flight_profiling modes, e.g. "cprofile" or
+    "sample,memory". Only honoured with PROFILE_REQUESTS=1; a request that
+    comes in while another is being profiled is served unprofiled.
+    """
+    modes = request.headers.get('X-Profile')
+    if not modes or not current_app.config['PROFILE_REQUESTS']:
+        return
+    try:
+        modes = flight_profiling.parse_modes(modes)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not modes:
+        return
+    g.profilers = flight_profiling.start(modes)
+    if g.profilers is None:
+        g.profile_busy = True
+
+def finish_profile(response):
+    profilers = g.pop('profilers', None)
+    if profilers is not None:
+        name = f"request-{time.strftime('%Y%m%d-%H%M%S')}-{request.endpoint or 'unknown'}-{new_id()}"
+        paths = flight_profiling.finish(profilers, current_app.config['PROFILE_DIR'], name)
+        response.headers['X-Profile-Files'] = ', '.join(os.path.basename(path) for path in paths)
+        logger.info("Request profile written to %s", ', '.join(paths))
+    elif g.pop('profile_busy', False):
+        response.headers['X-Profile-Files'] = 'busy'
+    return response
+
+def compress(response):
+    cache = current_app.extensions['http_cache']
+    return compress_response(response, request.accept_encodings, cache['encoded'], g.get('page_etag'))
+
+def cached_page(tracker, render, versioned=True):
+    """Serve a GET page under a weak ETag of the data version, rendering on cache misses
+    
+    render returns the page's HTML, or a response (e.g. a redirect) that is
+    sent as-is. Pages showing flashed messages are one-off and bypass both
+    the ETag and the cache.
+    """
+    if '_flashes' in session:
+        response = current_app.make_response(render())
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    
+    cache = current_app.extensions['http_cache']
+    version = tracker.get_data_version() if versioned else 0
+    etag = f"{version}-{cache['token']}"
+    if request.if_none_match.contains_weak(etag):
+        HTTP_CACHE_TOTAL.labels(cache='page', outcome='not_modified').inc()
+        response = current_app.response_class(status=304)
+    else:
+        key = (request.full_path, etag)
+        body = cache['pages'].get(key)
+        if body is None:
+            body = render()
+            if not isinstance(body, str):
+                return body
+            cache['pages'].put(key, body)
+        response = current_app.make_response(body)
+        g.page_etag = etag
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def render_flight_cards(flights):
+    """HTML for each flight card, re-rendered only when that flight's row changes"""
+    cards = current_app.extensions['http_cache']['cards']
+    template = current_app.jinja_env.get_template('_flight_card.html')
+    return [cards.get_or_create(flight, lambda flight=flight: Markup(template.render(flight=flight)))
+            for flight in flights]
+
+def clear_request_context(exc):
+    # A request that failed before its response was built still stops its profilers
+    profilers = g.pop('profilers', None)
+    if profilers is not None:
+        flight_profiling.finish(profilers)
+    token = g.pop('log_token', None)
+    if token is not None:
+        unbind(token)
 
-@app.route('/')
 def index():
     """Home page - shows all tracked flights"""
+    tracker = get_tracker()
     try:
         if tracker is None:
             return render_template('error.html', 
                                  error="Flight Tracker could not be initialized. Please check configuration.")
         
-        flights = tracker.get_all_flights()
-        return render_template('index.html', flights=flights)
+        def render():
+            flights = tracker.get_all_flights()
+            return render_template('index.html', flights=flights, cards=render_flight_cards(flights),
+                                   last_event_id=tracker.get_last_event_id())
+        
+        return cached_page(tracker, render)
     except Exception as e:
-        print(f"❌ Error loading flights: {e}")
-        traceback.print_exc()
+        logger.exception("Error loading flights: %s", e)
         return render_template('error.html', error=str(e))
 
-@app.route('/add', methods=['GET', 'POST'])
 def add_flight():
     """Add new flight page"""
+    tracker = get_tracker()
     if tracker is None:
         flash('⚠️ Tracker is currently unavailable. Please try again later.', 'warning')
         return redirect(url_for('index'))
@@ -45,21 +204,23 @@ def add_flight():
             departure_date = request.form.get('departure_date', '').strip()
             email = request.form.get('email', '').strip()
             target_price = request.form.get('target_price', '').strip()
+            currency = request.form.get('currency', '').strip().upper() or None
             
-            print(f"📝 Form data received:")
-            print(f"   Origin: {origin}")
-            print(f"   Destination: {destination}")
-            print(f"   Date: {departure_date}")
-            print(f"   Email: {email}")
-            print(f"   Target: {target_price}")
+            logger.debug("Form data received", extra={
+                'origin': origin, 'destination': destination, 'departure_date': departure_date,
+                'target_price': target_price, 'currency': currency,
+            })
             
             # Validate inputs
             if not origin or not destination or not departure_date or not email:
                 flash('❌ Please fill in all required fields!', 'error')
                 return redirect(url_for('add_flight'))
             
-            if len(origin) != 3 or len(destination) != 3:
-                flash('❌ Airport codes must be exactly 3 letters!', 'error')
+            try:
+                origin, destination = validate_route(origin, destination)
+                currency = validate_currency(currency or default_currency())
+            except ValueError as e:
+                flash(f'❌ {e}!', 'error')
                 return redirect(url_for('add_flight'))
             
             # Convert target price to float if provided
@@ -78,47 +239,60 @@ def add_flight():
                 destination=destination,
                 departure_date=departure_date,
                 email=email,
-                target_price=target_price
+                target_price=target_price,
+                currency=currency
             )
             
-            print(f"✅ Flight added successfully! ID: {flight_id}")
             flash(f'✅ Flight added successfully! Tracking {origin} → {destination}', 'success')
+            unlisted = [code for code in (origin, destination) if lookup(code) is None]
+            if unlisted:
+                flash(f"⚠️ {' and '.join(unlisted)} not in the airport list; check the code if no prices come in.",
+                      'warning')
             return redirect(url_for('index'))
             
         except Exception as e:
-            print(f"❌ Error adding flight: {e}")
-            traceback.print_exc()
+            logger.exception("Error adding flight: %s", e)
             flash(f'❌ Error adding flight: {str(e)}', 'error')
             return redirect(url_for('add_flight'))
     
     # GET request - show form
-    return render_template('add_flight.html')
+    return cached_page(tracker, lambda: render_template('add_flight.html'), versioned=False)
 
-@app.route('/check/<int:flight_id>')
 def check_flight(flight_id):
-    """Check price for a specific flight"""
+    """Check price for a specific flight
+    
+    The dashboard's script asks for JSON and gets the price from the
+    event stream; plain links get a flash message and a redirect.
+    """
+    tracker = get_tracker()
+    wants_json = request.accept_mimetypes.best == 'application/json'
     if tracker is None:
+        if wants_json:
+            return jsonify({'error': 'Tracker is currently unavailable'}), 503
         flash('⚠️ Tracker is currently unavailable.', 'warning')
         return redirect(url_for('index'))
     
     try:
-        print(f"🔍 Checking price for flight ID: {flight_id}")
         current_price = tracker.check_price(flight_id)
         
+        if wants_json:
+            amount, currency = current_price or (None, None)
+            return jsonify({'flight_id': flight_id, 'price': amount, 'currency': currency})
         if current_price:
-            flash(f'✅ Current price: ₹{current_price}', 'success')
+            flash(f'✅ Current price: {format_money(*current_price)}', 'success')
         else:
             flash('⚠️ Could not fetch price. Please try again later.', 'warning')
     except Exception as e:
-        print(f"❌ Error checking flight: {e}")
-        traceback.print_exc()
+        logger.exception("Error checking flight: %s", e)
+        if wants_json:
+            return jsonify({'flight_id': flight_id, 'price': None, 'error': str(e)}), 500
         flash(f'❌ Error: {str(e)}', 'error')
     
     return redirect(url_for('index'))
 
-@app.route('/delete/<int:flight_id>')
 def delete_flight(flight_id):
     """Delete a tracked flight"""
+    tracker = get_tracker()
     if tracker is None:
         flash('⚠️ Tracker is currently unavailable.', 'warning')
         return redirect(url_for('index'))
@@ -127,71 +301,233 @@ def delete_flight(flight_id):
         tracker.delete_flight(flight_id)
         flash(f'✅ Flight deleted successfully!', 'success')
     except Exception as e:
-        print(f"❌ Error deleting flight: {e}")
+        logger.error("Error deleting flight: %s", e)
         flash(f'❌ Error: {str(e)}', 'error')
     
     return redirect(url_for('index'))
 
-@app.route('/history/<int:flight_id>')
+def pause_flight(flight_id):
+    """Stop checking a flight until it is resumed"""
+    return change_status(flight_id, 'pause_flight', '⏸️ Flight paused. It will not be checked until resumed.')
+
+def resume_flight(flight_id):
+    """Start checking a paused flight again"""
+    return change_status(flight_id, 'resume_flight', '▶️ Flight resumed!')
+
+def change_status(flight_id, action, message):
+    """Pause or resume a flight from the dashboard; action is the FlightTracker method"""
+    tracker = get_tracker()
+    if tracker is None:
+        flash('⚠️ Tracker is currently unavailable.', 'warning')
+        return redirect(url_for('index'))
+    
+    try:
+        getattr(tracker, action)(flight_id)
+        flash(message, 'success')
+    except ValueError as e:
+        flash(f'❌ {e}', 'error')
+    
+    return redirect(url_for('index'))
+
 def price_history(flight_id):
     """View price history for a flight"""
+    tracker = get_tracker()
     if tracker is None:
         flash('⚠️ Tracker is currently unavailable.', 'warning')
         return redirect(url_for('index'))
     
-    try:
+    def render():
         history = tracker.get_price_history(flight_id)
         
         # Get flight details
-        flights = tracker.get_all_flights()
-        flight = next((f for f in flights if f[0] == flight_id), None)
+        flight = tracker.get_flight(flight_id)
         
         if flight is None:
             flash('❌ Flight not found!', 'error')
             return redirect(url_for('index'))
         
         return render_template('history.html', history=history, flight=flight, flight_id=flight_id)
+    
+    try:
+        return cached_page(tracker, render)
     except Exception as e:
-        print(f"❌ Error loading history: {e}")
-        traceback.print_exc()
+        logger.exception("Error loading history: %s", e)
         flash(f'❌ Error: {str(e)}', 'error')
         return redirect(url_for('index'))
 
-@app.route('/api/flights')
 def api_flights():
-    """API endpoint to get all flights as JSON"""
+    """API endpoint to get flights as JSON
+    
+    ?status=active,paused picks the lifecycle states to include; by
+    default every state but archived.
+    """
+    tracker = get_tracker()
     if tracker is None:
         return jsonify({'error': 'Tracker is currently unavailable', 'flights': []}), 503
     
+    statuses = LISTED_STATES
+    if request.args.get('status'):
+        statuses = tuple(status.strip() for status in request.args['status'].split(','))
+        unknown = set(statuses) - set(FLIGHT_STATES)
+        if unknown:
+            return jsonify({'error': f"Unknown status {', '.join(sorted(unknown))}; "
+                                     f"expected one of {', '.join(FLIGHT_STATES)}"}), 400
+    
     try:
-        flights = tracker.get_all_flights()
-        flights_data = []
-        
-        for flight in flights:
-            flights_data.append({
-                'id': flight[0],
-                'origin': flight[1],
-                'destination': flight[2],
-                'departure_date': flight[3],
-                'email': flight[4],
-                'target_price': flight[5],
-                'created_at': flight[6]
-            })
-        
-        return jsonify(flights_data)
+        flights = tracker.get_all_flights(statuses=statuses)
+        return Response(dumps(flights), mimetype='application/json')
     except Exception as e:
-        print(f"❌ API Error: {e}")
+        logger.error("API Error: %s", e)
         return jsonify({'error': str(e)}), 500
 
-@app.route('/health')
+def api_flight_status(flight_id, action):
+    """API endpoint to pause or resume a flight; returns the updated flight as JSON"""
+    tracker = get_tracker()
+    if tracker is None:
+        return jsonify({'error': 'Tracker is currently unavailable'}), 503
+    
+    if tracker.get_flight(flight_id) is None:
+        return jsonify({'error': f'Flight {flight_id} not found'}), 404
+    try:
+        if action == 'pause':
+            tracker.pause_flight(flight_id)
+        else:
+            tracker.resume_flight(flight_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify(tracker.get_flight(flight_id)._asdict())
+
 def health():
     """Health check endpoint"""
+    tracker = get_tracker()
+    providers = {}
+    if tracker is not None:
+        try:
+            providers = tracker.get_provider_health()
+        except Exception as e:
+            logger.warning("Could not read provider health: %s", e)
+    
+    healthy = tracker is not None and all(p['state'] != 'open' for p in providers.values())
     return jsonify({
-        'status': 'healthy' if tracker is not None else 'degraded',
+        'status': 'healthy' if healthy else 'degraded',
         'service': 'flight-price-tracker',
-        'tracker_enabled': tracker is not None
+        'tracker_enabled': tracker is not None,
+        'providers': providers,
     }), 200
 
+def events():
+    """Server-Sent Events stream of new prices and alerts
+    
+    Streams end after SSE_STREAM_SECONDS; the browser reconnects with
+    Last-Event-ID and missed events are replayed from the database. Each
+    open stream holds a worker thread, so a worker serves at most
+    SSE_MAX_STREAMS and asks further clients to retry later.
+    """
+    tracker = get_tracker()
+    if tracker is None:
+        return jsonify({'error': 'Tracker is currently unavailable'}), 503
+    
+    config = current_app.config
+    broker = current_app.extensions['event_broker']
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_id') or 0)
+    except ValueError:
+        last_id = 0
+    
+    def stream():
+        # Subscribe inside the generator so the finally below always unsubscribes
+        subscription = broker.subscribe()
+        if subscription is None:
+            yield f"retry: {config['SSE_BUSY_RETRY_MS']}\n\n"
+            return
+        
+        sent = last_id
+        deadline = time.monotonic() + config['SSE_STREAM_SECONDS']
+        try:
+            yield f"retry: {config['SSE_RETRY_MS']}\n\n"
+            backlog = tracker.get_events(sent) if sent else []
+            while backlog:
+                for event in backlog:
+                    yield format_sse(event)
+                    sent = event.id
+                backlog = tracker.get_events(sent)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                event = subscription.get(timeout=min(remaining, config['SSE_HEARTBEAT_SECONDS']))
+                if event is OVERFLOW:
+                    return
+                if event is None:
+                    yield ': keep-alive\n\n'
+                elif event.id > sent:
+                    yield format_sse(event)
+                    sent = event.id
+        finally:
+            broker.unsubscribe(subscription)
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def metrics():
+    """Prometheus metrics endpoint"""
+    return REGISTRY.render(), 200, {'Content-Type': CONTENT_TYPE}
+
+def create_app(db_path=None, tracker=None):
+    """Build the Flask app; the tracker is created per worker process on first use"""
+    app = Flask(__name__)
+    app.secret_key = os.environ.get('SECRET_KEY', 'flight-tracker-secret-key-2025')
+    app.extensions['flight_tracker'] = WorkerTracker(db_path, tracker)
+    app.extensions['http_cache'] = {
+        'token': template_token(os.path.join(app.root_path, app.template_folder)),
+        'pages': LRUCache('page', int(os.getenv('HTTP_PAGE_CACHE_SIZE', 256))),
+        'encoded': LRUCache('encoded', int(os.getenv('HTTP_PAGE_CACHE_SIZE', 256)) * 2),
+        'cards': LRUCache('card', int(os.getenv('HTTP_CARD_CACHE_SIZE', 4096))),
+    }
+    app.extensions['event_broker'] = EventBroker(
+        app.extensions['flight_tracker'].get,
+        poll_interval=float(os.getenv('SSE_POLL_SECONDS', 1)),
+        max_subscribers=int(os.getenv('SSE_MAX_STREAMS', 12)),
+    )
+    app.config.update(
+        SSE_STREAM_SECONDS=float(os.getenv('SSE_STREAM_SECONDS', 300)),
+        SSE_HEARTBEAT_SECONDS=15,
+        SSE_RETRY_MS=3000,
+        SSE_BUSY_RETRY_MS=30000,
+        PROFILE_REQUESTS=os.getenv('PROFILE_REQUESTS', '0') == '1',
+        PROFILE_DIR=os.getenv('PROFILE_DIR', 'profiles'),
+    )
+    
+    app.add_template_filter(format_money, 'money')
+    app.jinja_env.globals['currencies'] = sorted(CURRENCIES)
+    app.jinja_env.globals['default_currency'] = default_currency
+    
+    app.before_request(start_request_timer)
+    app.before_request(start_profile)
+    # after_request hooks run last-registered first: compress before timing and profiling end
+    app.after_request(finish_profile)
+    app.after_request(record_request_latency)
+    app.after_request(compress)
+    app.teardown_request(clear_request_context)
+    
+    app.add_url_rule('/', view_func=index)
+    app.add_url_rule('/add', view_func=add_flight, methods=['GET', 'POST'])
+    app.add_url_rule('/check/<int:flight_id>', view_func=check_flight)
+    app.add_url_rule('/delete/<int:flight_id>', view_func=delete_flight)
+    app.add_url_rule('/pause/<int:flight_id>', view_func=pause_flight)
+    app.add_url_rule('/resume/<int:flight_id>', view_func=resume_flight)
+    app.add_url_rule('/history/<int:flight_id>', view_func=price_history)
+    app.add_url_rule('/api/flights', view_func=api_flights)
+    app.add_url_rule('/api/flights/<int:flight_id>/<any(pause, resume):action>', view_func=api_flight_status,
+                     methods=['POST'])
+    app.add_url_rule('/events', view_func=events)
+    app.add_url_rule('/health', view_func=health)
+    app.add_url_rule('/metrics', view_func=metrics)
+    return app
+
+# Module-level app for `gunicorn app:app` and `python app.py`
+app = create_app()
+
 if __name__ == '__main__':
     # Create necessary directories
     os.makedirs('templates', exist_ok=True)
@@ -203,7 +539,9 @@ if __name__ == '__main__':
     print("🚀 Flight Price Tracker Starting...")
     print("="*70)
     print(f"📱 Server: http://localhost:{port}")
-    print(f"🔧 Tracker Status: {'✅ Enabled' if tracker else '❌ Disabled'}")
+    with app.app_context():
+        tracker_enabled = get_tracker() is not None
+    print(f"🔧 Tracker Status: {'✅ Enabled' if tracker_enabled else '❌ Disabled'}")
     print("🛑 Press Ctrl+C to stop")
     print("="*70 + "\n")
     
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark: FlightTracker read/write methods and Flask routes at several data scales
+
+Each scale is a number of price_history rows; the flight count is scale/100
+(at least 10). Generated databases are cached in --data-dir and copied before
+each run, so write benchmarks never change the cached data. With
+--database-url the same runs go against PostgreSQL instead; that database
+is emptied and regenerated for every scale.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from common import emit, percentile, reset_postgres
+
+from flight_currency import Money
+
+from generate_dataset import generate
+
+SCALES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+
+
+def measure(func, repeat):
+    """p50/p99 milliseconds of func() over repeat calls"""
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - start)
+    return {
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'ops_per_sec': round(len(samples) / sum(samples), 1),
+    }
+
+
+def dataset(data_dir, rows):
+    """Path to a cached database with the given history size"""
+    flights = max(10, rows // 100)
+    path = os.path.join(data_dir, f'flights-{flights}-{rows}.db')
+    if not os.path.exists(path):
+        generate(path + '.tmp', flights, rows)
+        os.replace(path + '.tmp', path)
+    return path, flights
+
+
+def bench_tracker(tracker, flight_ids, repeat):
+    rng = random.Random(1)
+    pick = lambda: rng.choice(flight_ids)
+    added = []
+
+    results = {
+        'get_all_flights': measure(lambda i: tracker.get_all_flights(), max(3, repeat // 10)),
+        'get_flight': measure(lambda i: tracker.get_flight(pick()), repeat),
+        'get_price_history': measure(lambda i: tracker.get_price_history(pick()), repeat),
+        'record_price': measure(lambda i: tracker.record_price(pick(), Money(5000.0, 'INR'), 4000.0), repeat),
+        'add_flight': measure(lambda i: added.append(
+            tracker.add_flight('DEL', 'BOM', '2030-01-01', 'bench@example.com', 4000.0)), repeat),
+    }
+    results['delete_flight'] = measure(lambda i: tracker.delete_flight(added[i]), len(added))
+    return results
+
+
+def bench_routes(app_module, flight_ids, repeat):
+    client = app_module.app.test_client()
+    rng = random.Random(2)
+    heavy = max(3, repeat // 10)
+    return {
+        'index': measure(lambda i: client.get('/'), heavy),
+        'api_flights': measure(lambda i: client.get('/api/flights'), heavy),
+        'history': measure(lambda i: client.get(f'/history/{rng.choice(flight_ids)}'), repeat),
+        'health': measure(lambda i: client.get('/health'), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='1k,100k,1m', help=f'Comma list of {",".join(SCALES)}')
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'flight-bench-data'))
+    parser.add_argument('--database-url', help='Scratch PostgreSQL database to benchmark instead of SQLite '
+                                               '(its tables are dropped)')
+    parser.add_argument('--output', help='Append JSON results to this file')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    args.data_dir = os.path.abspath(args.data_dir)
+    os.makedirs(args.data_dir, exist_ok=True)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # app.py opens flights.db in the working directory at import
+    os.chdir(args.data_dir)
+
+    from flight_logging import setup_logging
+    setup_logging()
+    from flight_tracker import FlightTracker
+    import app as app_module
+
+    results = {'backend': 'postgresql' if args.database_url else 'sqlite'}
+    for scale in args.scales.split(','):
+        if args.database_url:
+            work, flights = args.database_url, max(10, SCALES[scale] // 100)
+            reset_postgres(work)
+            generate(work, flights, SCALES[scale])
+        else:
+            source, flights = dataset(args.data_dir, SCALES[scale])
+            work = os.path.join(args.data_dir, f'work-{scale}.db')
+            shutil.copyfile(source, work)
+
+        tracker = FlightTracker(work)
+        app_module.app = app_module.create_app(tracker=tracker)
+        flight_ids = [flight.id for flight in tracker.get_all_flights()]
+
+        results[scale] = {
+            'flights': flights,
+            'history_rows': SCALES[scale],
+            'db_mb': round(tracker.store.size_bytes() / 1024 / 1024, 2),
+            'tracker': bench_tracker(tracker, flight_ids, args.repeat),
+            'routes': bench_routes(app_module, flight_ids, args.repeat),
+        }
+        if not args.database_url:
+            os.remove(work)
+
+    emit('db_scale', results, output)
+
+
+if __name__ == '__main__':
+    main()
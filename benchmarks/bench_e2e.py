@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark against a local Google Flights stand-in and SMTP sink
+
+Scenarios:
+  check_price   FlightTracker.check_price for each flight, one at a time
+  cycle         flight_scheduler.check_all_flights over every flight
+  http          Flask endpoints through the test client
+
+Reports checks/min, p50/p99 latency and peak RSS as one JSON document.
+The check scenarios need Chrome and chromedriver; if the driver cannot
+start they are reported with an "error" field instead of numbers.
+"""
+
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+from common import emit, percentile, reset_postgres
+
+from fixture_server import VARIANTS, base_price, start_fixture_server
+from smtp_sink import start_smtp_sink
+
+ROUTES = [('DEL', 'BOM'), ('BOM', 'BLR'), ('DEL', 'BLR'), ('HYD', 'MAA'), ('CCU', 'DEL'),
+          ('GOI', 'BOM'), ('PNQ', 'DEL'), ('BLR', 'HYD'), ('DEL', 'DXB'), ('BOM', 'SIN')]
+
+
+def latency_stats(samples):
+    """p50/p99/mean in milliseconds for a list of durations in seconds"""
+    if not samples:
+        return {}
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 2),
+        'p99_ms': round(percentile(samples, 99) * 1000, 2),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 2),
+    }
+
+
+def peak_rss_mb():
+    """Peak RSS of this process and of reaped children (Chrome, chromedriver)"""
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {'self': round(self_kb / 1024, 1), 'children': round(children_kb / 1024, 1)}
+
+
+def seed_flights(tracker, count):
+    """Add count flights; half have a target above the fixture price so they alert"""
+    flight_ids = []
+    for i in range(count):
+        origin, destination = ROUTES[i % len(ROUTES)]
+        date = f'2030-{i % 12 + 1:02d}-{i % 28 + 1:02d}'
+        price = base_price(origin, destination, date)
+        target = price + 500 if i % 2 == 0 else price - 500
+        flight_ids.append(tracker.add_flight(origin, destination, date, f'user{i % 7}@example.com', target))
+    return flight_ids
+
+
+def bench_check_price(tracker, flight_ids):
+    samples = []
+    failures = 0
+    start = time.perf_counter()
+    for flight_id in flight_ids:
+        check_start = time.perf_counter()
+        try:
+            if tracker.check_price(flight_id) is None:
+                failures += 1
+        except Exception as e:
+            if not samples:
+                return {'error': f'{type(e).__name__}: {e}'}
+            failures += 1
+        samples.append(time.perf_counter() - check_start)
+    elapsed = time.perf_counter() - start
+    return {
+        'checks_per_min': round(len(flight_ids) / elapsed * 60, 2),
+        'failures': failures,
+        'latency': latency_stats(samples),
+    }
+
+
+def bench_cycle(flight_scheduler, store, flight_count):
+    before = store.count_rows('price_history')
+    start = time.perf_counter()
+    flight_scheduler.check_all_flights()
+    elapsed = time.perf_counter() - start
+    priced = store.count_rows('price_history') - before
+    results = {
+        'flights': flight_count,
+        'priced': priced,
+        'cycle_seconds': round(elapsed, 3),
+        'checks_per_min': round(flight_count / elapsed * 60, 2),
+    }
+    if flight_count and not priced:
+        results['error'] = 'no checks succeeded (is Chrome available?)'
+    return results
+
+
+def bench_http(app_module, flight_ids, requests_per_endpoint):
+    client = app_module.app.test_client()
+    endpoints = {
+        'index': '/',
+        'api_flights': '/api/flights',
+        'history': f'/history/{flight_ids[0]}',
+        'add_flight_form': '/add',
+        'health': '/health',
+        'metrics': '/metrics',
+    }
+    results = {}
+    for name, path in endpoints.items():
+        samples = []
+        for _ in range(requests_per_endpoint):
+            start = time.perf_counter()
+            response = client.get(path)
+            samples.append(time.perf_counter() - start)
+        stats = latency_stats(samples)
+        stats['status'] = response.status_code
+        stats['bytes'] = len(response.get_data())
+        stats['requests_per_sec'] = round(len(samples) / sum(samples), 1)
+        results[name] = stats
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--flights', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--variant', choices=VARIANTS, default='primary')
+    parser.add_argument('--http-requests', type=int, default=200, help='Requests per endpoint')
+    parser.add_argument('--scenarios', default='check_price,cycle,http')
+    parser.add_argument('--database-url', help='Scratch PostgreSQL database to use instead of a SQLite file '
+                                               '(its tables are dropped)')
+    parser.add_argument('--output', help='Append JSON results to this file')
+    args = parser.parse_args()
+    scenarios = args.scenarios.split(',')
+    output = os.path.abspath(args.output) if args.output else None
+
+    fixture = start_fixture_server(args.latency_ms, args.jitter_ms, args.variant)
+    sink = start_smtp_sink()
+
+    # Configure the tracker before importing it; everything runs in a scratch directory
+    os.environ.update({
+        'FLIGHTS_BASE_URL': fixture.base_url,
+        'SMTP_SERVER': '127.0.0.1',
+        'SMTP_PORT': str(sink.server_address[1]),
+        'SMTP_STARTTLS': '0',
+        'EMAIL_ADDRESS': 'tracker@example.com',
+        'EMAIL_PASSWORD': 'benchmark',
+        'CHECK_INTERVAL_SECONDS': '0',
+        'LOG_LEVEL': os.getenv('LOG_LEVEL', 'WARNING'),
+    })
+    if args.database_url:
+        # The scheduler builds its own tracker from DATABASE_URL
+        os.environ['DATABASE_URL'] = args.database_url
+        reset_postgres(args.database_url)
+    os.chdir(tempfile.mkdtemp(prefix='flight-bench-'))
+
+    from flight_logging import setup_logging
+    setup_logging()
+    import flight_scheduler
+    from flight_tracker import FlightTracker
+
+    tracker = FlightTracker()
+    flight_ids = seed_flights(tracker, args.flights)
+
+    results = {
+        'config': {
+            'flights': args.flights,
+            'latency_ms': args.latency_ms,
+            'jitter_ms': args.jitter_ms,
+            'variant': args.variant,
+            'backend': 'postgresql' if args.database_url else 'sqlite',
+        },
+    }
+
+    if 'check_price' in scenarios:
+        results['check_price'] = bench_check_price(tracker, flight_ids)
+    if 'cycle' in scenarios:
+        results['cycle'] = bench_cycle(flight_scheduler, tracker.store, len(flight_ids))
+    if 'http' in scenarios:
+        import app as app_module
+        app_module.app = app_module.create_app(tracker=tracker)
+        results['http'] = bench_http(app_module, flight_ids, args.http_requests)
+
+    results['fixture_searches'] = fixture.searches
+    results['emails'] = {'messages': sink.messages, 'bytes': sink.bytes}
+    results['peak_rss_mb'] = peak_rss_mb()
+    emit('e2e', results, output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Benchmark: alert email construction throughput (messages built per second)
+"""
+
+import argparse
+import time
+
+from common import emit
+
+from flight_alerts import PriceAlert
+from flight_email import build_alert_message
+
+
+def make_alerts(count):
+    """Synthetic alerts for one recipient"""
+    return [
+        PriceAlert(i, 'DEL', 'BOM', f'2030-01-{i % 28 + 1:02d}', 4200.0 + i, 5000.0, 'INR')
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipients', type=int, default=10000)
+    parser.add_argument('--alerts-per-recipient', type=int, default=3)
+    parser.add_argument('--serialize', action='store_true', help='Also render each message to bytes')
+    parser.add_argument('--output', help='Append JSON results to this file')
+    args = parser.parse_args()
+
+    alerts = make_alerts(args.alerts_per_recipient)
+
+    start = time.perf_counter()
+    total_bytes = 0
+    for i in range(args.recipients):
+        msg = build_alert_message('tracker@example.com', f'user{i}@example.com', alerts)
+        if args.serialize:
+            total_bytes += len(msg.as_bytes())
+    elapsed = time.perf_counter() - start
+
+    emit('email_build', {
+        'recipients': args.recipients,
+        'alerts_per_recipient': args.alerts_per_recipient,
+        'serialize': args.serialize,
+        'seconds': round(elapsed, 4),
+        'messages_per_sec': round(args.recipients / elapsed, 1),
+        'avg_message_bytes': round(total_bytes / args.recipients) if args.serialize else None,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Load test: the web app under gunicorn with different worker settings
+
+For each configuration a gunicorn server is started on a generated
+database (gunicorn.conf.py plus command-line overrides). Client threads
+then request a mix of pages over keep-alive connections for a fixed time.
+--gzip and --revalidate make the clients ask for compressed bodies and
+send If-None-Match, like browsers reloading the dashboard. Reports
+requests/sec, p50/p99 latency, mean body size, errors and the RSS of the
+whole server process tree.
+"""
+
+import argparse
+import http.client
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from common import REPO_ROOT, emit, percentile, reset_postgres
+
+from generate_dataset import generate
+
+# name: gunicorn command-line overrides (gunicorn runs sync workers with
+# --threads > 1 as gthread, so sync configurations pin one thread)
+CONFIGS = {
+    'sync-w2': ['-k', 'sync', '-w', '2', '--threads', '1'],
+    'sync-w4': ['-k', 'sync', '-w', '4', '--threads', '1'],
+    'gthread-w2-t4': ['-k', 'gthread', '-w', '2', '--threads', '4'],
+    'gthread-w2-t8': ['-k', 'gthread', '-w', '2', '--threads', '8'],
+    'gthread-w1-t8': ['-k', 'gthread', '-w', '1', '--threads', '8'],
+    'gthread-w2-t16': ['-k', 'gthread', '-w', '2', '--threads', '16'],
+}
+
+# (weight, path) of the request mix; {id} is a random flight id
+MIX = [(5, '/'), (3, '/history/{id}'), (2, '/api/flights'), (1, '/health')]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/health')
+            conn.getresponse().read()
+            conn.close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def fetch(conn, path, headers, etags):
+    if etags is not None and path in etags:
+        headers = dict(headers, **{'If-None-Match': etags[path]})
+    conn.request('GET', path, headers=headers)
+    response = conn.getresponse()
+    response.body_bytes = len(response.read())
+    if etags is not None and response.getheader('ETag'):
+        etags[path] = response.getheader('ETag')
+    return response
+
+
+def client(port, paths, stop, samples, sizes, errors, keepalive, headers, revalidate):
+    conn = None
+    etags = {} if revalidate else None
+    while not stop.is_set():
+        path = random.choice(paths)
+        start = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                response = fetch(conn, path, headers, etags)
+            else:
+                try:
+                    response = fetch(conn, path, headers, etags)
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    # The server closed an idle keep-alive connection (e.g. a worker
+                    # recycled by max_requests); like browsers, retry once on a new one
+                    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                    response = fetch(conn, path, headers, etags)
+            if response.status >= 500:
+                errors.append(response.status)
+            if not keepalive or response.getheader('Connection', '').lower() == 'close':
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn = None
+            continue
+        samples.append(time.perf_counter() - start)
+        sizes.append(response.body_bytes)
+
+
+def run_config(name, overrides, db_path, flight_ids, clients, duration, keepalive, gzip, revalidate):
+    from flight_tabs import process_tree_rss
+
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=db_path, LOG_LEVEL='WARNING')
+    command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(REPO_ROOT, 'gunicorn.conf.py'),
+               '--bind', f'127.0.0.1:{port}', *overrides, 'app:app']
+    server = subprocess.Popen(command, cwd=REPO_ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for(port):
+            return {'error': 'server did not start'}
+
+        paths = [path.format(id=random.choice(flight_ids)) for weight, path in MIX for _ in range(weight * 20)]
+        samples, sizes, errors = [], [], []
+        stop = threading.Event()
+        headers = {} if keepalive else {'Connection': 'close'}
+        if gzip:
+            headers['Accept-Encoding'] = 'gzip'
+        threads = [threading.Thread(target=client,
+                                    args=(port, paths, stop, samples, sizes, errors, keepalive, headers, revalidate))
+                   for _ in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        rss = process_tree_rss(server.pid)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        return {
+            'requests_per_sec': round(len(samples) / elapsed, 1),
+            'p50_ms': round(percentile(samples, 50) * 1000, 2) if samples else None,
+            'p99_ms': round(percentile(samples, 99) * 1000, 2) if samples else None,
+            'mean_body_bytes': round(sum(sizes) / len(sizes)) if sizes else None,
+            'errors': len(errors),
+            'rss_mb': round(rss / 1048576, 1) if rss else None,
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--configs', default=','.join(CONFIGS), help=f'Comma list of {",".join(CONFIGS)}')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of load per configuration')
+    parser.add_argument('--flights', type=int, default=200)
+    parser.add_argument('--history', type=int, default=20000)
+    parser.add_argument('--no-keepalive', action='store_true', help='Open a new connection per request')
+    parser.add_argument('--gzip', action='store_true', help='Send Accept-Encoding: gzip')
+    parser.add_argument('--revalidate', action='store_true',
+                        help='Send If-None-Match with the last ETag seen per page, like a browser reloading')
+    parser.add_argument('--database-url', help='Scratch PostgreSQL database to serve from instead of a SQLite file '
+                                               '(its tables are dropped)')
+    parser.add_argument('--output', help='Append JSON results to this file')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        sys.exit("gunicorn is not installed (pip install -r requirements.txt)")
+
+    workdir = tempfile.mkdtemp(prefix='flight-load-')
+    db_path = args.database_url or os.path.join(workdir, 'flights.db')
+    if args.database_url:
+        reset_postgres(db_path)
+    generate(db_path, args.flights, args.history)
+    flight_ids = list(range(1, args.flights + 1))
+
+    results = {
+        'config': {'clients': args.clients, 'duration_s': args.duration, 'flights': args.flights,
+                   'history': args.history, 'keepalive': not args.no_keepalive,
+                   'gzip': args.gzip, 'revalidate': args.revalidate, 'cpus': os.cpu_count(),
+                   'backend': 'postgresql' if args.database_url else 'sqlite'},
+    }
+    for name in args.configs.split(','):
+        results[name] = run_config(name, CONFIGS[name], db_path, flight_ids, args.clients,
+                                   args.duration, not args.no_keepalive, args.gzip, args.revalidate)
+    shutil.rmtree(workdir, ignore_errors=True)
+    emit('http_load', results, output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark: caller-side cost of logging vs the print() calls it replaced
+"""
+
+import argparse
+import logging
+import os
+import time
+
+from common import emit
+
+from flight_logging import log_context, setup_logging, shutdown_logging
+
+
+def per_call_us(func, calls):
+    """Average microseconds per call of func"""
+    start = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return round((time.perf_counter() - start) / calls * 1e6, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=100000)
+    parser.add_argument('--format', choices=['json', 'text'], default='json')
+    parser.add_argument('--output', help='Append JSON results to this file')
+    args = parser.parse_args()
+
+    devnull = open(os.devnull, 'w')
+    setup_logging(level='INFO', fmt=args.format, stream=devnull)
+    logger = logging.getLogger('bench')
+
+    def print_line(i):
+        print(f"💰 Found price: ₹{i}", file=devnull)
+
+    def print_line_flushed(i):
+        print(f"💰 Found price: ₹{i}", file=devnull, flush=True)
+
+    def log_info(i):
+        logger.info("Found price: ₹%s", i, extra={'selector': 'span.price'})
+
+    def log_debug_disabled(i):
+        logger.debug("Form data received", extra={'origin': 'DEL', 'destination': 'BOM'})
+
+    results = {'calls': args.calls, 'format': args.format}
+    results['print_us'] = per_call_us(print_line, args.calls)
+    results['print_flush_us'] = per_call_us(print_line_flushed, args.calls)
+    results['log_debug_disabled_us'] = per_call_us(log_debug_disabled, args.calls)
+    with log_context(cycle_id='bench', check_id='bench'):
+        results['log_info_enqueue_us'] = per_call_us(log_info, args.calls)
+
+    # Time for the listener thread to format and write everything queued
+    start = time.perf_counter()
+    shutdown_logging()
+    results['drain_seconds'] = round(time.perf_counter() - start, 4)
+
+    devnull.close()
+    emit('logging_overhead', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
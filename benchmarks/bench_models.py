@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Flight record representations: memory per row, load time and JSON throughput
+
+Loads every flight from a generated database as plain tuples (what
+sqlite3 returns), Flight namedtuples (flight_models.fetch_records), Flight
+namedtuples through a sqlite3 row_factory, slotted dataclasses and dicts. Reports retained bytes per row (tracemalloc,
+strings included) and load time. Then serializes the list for
+/api/flights the old way (hand-built dicts through Flask's JSON settings)
+and with flight_models.dumps, with and without orjson.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+from common import emit
+
+from generate_dataset import generate
+
+
+@dataclass(slots=True, frozen=True)
+class SlottedFlight:
+    id: int
+    origin: str
+    destination: str
+    departure_date: str
+    email: str
+    target_price: float
+    created_at: str
+    search_id: int
+    currency: str
+    status: str
+
+
+def load(db_path, representation):
+    from flight_models import Flight, fetch_records
+    from flight_store import FLIGHT_QUERY
+
+    conn = sqlite3.connect(db_path)
+    if representation == 'row_factory':
+        conn.row_factory = lambda cursor, row: Flight._make(row)
+    cursor = conn.execute(FLIGHT_QUERY)
+    rows = fetch_records(Flight, cursor) if representation == 'namedtuple' else cursor.fetchall()
+    conn.close()
+    if representation == 'dataclass':
+        rows = [SlottedFlight(*row) for row in rows]
+    elif representation == 'dict':
+        rows = [dict(zip(Flight._fields, row)) for row in rows]
+    return rows
+
+
+def measure_load(db_path, representation, repeat):
+    tracemalloc.start()
+    rows = load(db_path, representation)
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    count = len(rows)
+    del rows
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        load(db_path, representation)
+    seconds = (time.perf_counter() - start) / repeat
+    return {'bytes_per_row': round(retained / count), 'load_ms': round(seconds * 1000, 1),
+            'rows_per_sec': round(count / seconds)}
+
+
+def old_api_json(flights):
+    """What /api/flights did before: positional dicts through jsonify's defaults"""
+    data = [{'id': f[0], 'origin': f[1], 'destination': f[2], 'departure_date': f[3], 'email': f[4],
+             'target_price': f[5], 'created_at': f[6], 'search_id': f[7], 'currency': f[8],
+             'status': f[9]}
+            for f in flights]
+    return json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def measure_json(func, flights, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        body = func(flights)
+    seconds = (time.perf_counter() - start) / repeat
+    return {'ms': round(seconds * 1000, 1), 'rows_per_sec': round(len(flights) / seconds), 'bytes': len(body)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--flights', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='Append JSON results to this file')
+    args = parser.parse_args()
+
+    import flight_models
+
+    workdir = tempfile.mkdtemp(prefix='flight-models-')
+    db_path = os.path.join(workdir, 'flights.db')
+    generate(db_path, args.flights, 0)
+
+    results = {'config': {'flights': args.flights, 'orjson': flight_models.orjson is not None}}
+    for representation in ('tuple', 'namedtuple', 'row_factory', 'dataclass', 'dict'):
+        results[representation] = measure_load(db_path, representation, args.repeat)
+
+    flights = load(db_path, 'namedtuple')
+    results['json_old'] = measure_json(old_api_json, flights, args.repeat)
+    results['json_dumps'] = measure_json(flight_models.dumps, flights, args.repeat)
+    if flight_models.orjson is not None:
+        orjson, flight_models.orjson = flight_models.orjson, None
+        results['json_dumps_stdlib'] = measure_json(flight_models.dumps, flights, args.repeat)
+        flight_models.orjson = orjson
+
+    os.remove(db_path)
+    os.rmdir(workdir)
+    emit('models', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: page weight and page-ready time with and without the lean profile
+
+Runs the same checks against the local fixture server once per scraper
+profile (SCRAPER_PROFILE=default and lean) and reports, per profile, the
+bytes the browser transferred (Resource Timing), the bytes and requests the
+fixture server actually served, page-ready time (navigation until a price
+is found) and whole-check latency. Needs Chrome and chromedriver.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from common import emit, percentile
+
+from bench_e2e import latency_stats, seed_flights
+from fixture_server import VARIANTS, start_fixture_server
+
+
+def run_profile(tracker, fixture, profile, flight_ids):
+    tracker.scraper_profile = profile
+    served_bytes, served_requests = fixture.bytes_sent, fixture.requests
+    transfer, ready, checks = [], [], []
+    failures = 0
+
+    for flight_id in flight_ids:
+        start = time.perf_counter()
+        try:
+            if tracker.check_price(flight_id) is None:
+                failures += 1
+        except Exception as e:
+            if not checks:
+                return {'error': f'{type(e).__name__}: {e}'}
+            failures += 1
+        checks.append(time.perf_counter() - start)
+
+        stats = tracker.last_page_stats
+        if 'transfer_bytes' in stats:
+            transfer.append(stats['transfer_bytes'])
+        if stats.get('ready_ms') is not None:
+            ready.append(stats['ready_ms'] / 1000)
+
+    count = len(flight_ids)
+    return {
+        'failures': failures,
+        'transfer_bytes_p50': percentile(transfer, 50) if transfer else None,
+        'served_bytes_per_check': round((fixture.bytes_sent - served_bytes) / count),
+        'served_requests_per_check': round((fixture.requests - served_requests) / count, 2),
+        'page_ready': latency_stats(ready),
+        'check': latency_stats(checks),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--flights', type=int, default=10)
+    parser.add_argument('--latency-ms', type=float, default=100)
+    parser.add_argument('--variant', choices=VARIANTS, default='primary')
+    parser.add_argument('--profiles', default='default,lean')
+    parser.add_argument('--output', help='Append JSON results to this file')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    fixture = start_fixture_server(args.latency_ms, 0, args.variant)
+    os.environ.update({
+        'FLIGHTS_BASE_URL': fixture.base_url,
+        'LOG_LEVEL': os.getenv('LOG_LEVEL', 'WARNING'),
+    })
+    os.chdir(tempfile.mkdtemp(prefix='flight-bench-'))
+
+    from flight_logging import setup_logging
+    setup_logging()
+    from flight_tracker import FlightTracker
+
+    tracker = FlightTracker()
+    # Keep alert delivery (and SMTP) out of the timing
+    flight_ids = seed_flights(tracker, args.flights)
+    tracker.send_email_alert = lambda *a, **k: None
+
+    results = {'config': {'flights': args.flights, 'latency_ms': args.latency_ms, 'variant': args.variant}}
+    for profile in args.profiles.split(','):
+        results[profile] = run_profile(tracker, fixture, profile, flight_ids)
+
+    default, lean = results.get('default', {}), results.get('lean', {})
+    if default.get('served_bytes_per_check') and 'served_bytes_per_check' in lean:
+        results['lean_bytes_saved_pct'] = round(
+            100 * (1 - lean['served_bytes_per_check'] / default['served_bytes_per_check']), 1)
+    emit('page_profile', results, output)
+
+
+if __name__ == '__main__':
+    main()
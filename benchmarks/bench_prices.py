@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark: price parsing throughput and accuracy across currency formats
+
+Builds result pages of --itineraries price texts in several locale
+formats (₹7,349, $1,234.56, 1.234,56 €, CHF 1'234.50, ¥12,345) and
+reads each page's price two ways: the old digit filter on the first
+element, and flight_currency.lowest_price over every element. Reports
+pages and itineraries parsed per second and how often each way gets the
+cheapest fare right. Also times flight_scraper.find_price on a full
+fixture page, which adds HTML parsing.
+"""
+
+import argparse
+import random
+import time
+
+from common import emit
+
+from fixture_server import render_results
+from flight_currency import lowest_price
+from flight_scraper import find_price
+
+# (format for an amount, currency, decimals shown)
+FORMATS = {
+    'inr': (lambda amount: f'₹{amount:,.0f}', 'INR', 0),
+    'usd': (lambda amount: f'${amount:,.2f}', 'USD', 2),
+    'eur': (lambda amount: f'{amount:,.2f} €'.replace(',', ' ').replace('.', ',').replace(' ', '.'), 'EUR', 2),
+    'chf': (lambda amount: f"CHF {amount:,.2f}".replace(',', "'"), 'CHF', 2),
+    'jpy': (lambda amount: f'¥{amount:,.0f}', 'JPY', 0),
+}
+
+
+def make_pages(fmt, pages, itineraries, seed=1):
+    """[(texts, cheapest)] with the cheapest fare somewhere other than first"""
+    render, _, decimals = FORMATS[fmt]
+    rng = random.Random(seed)
+    result = []
+    for _ in range(pages):
+        amounts = [round(rng.uniform(80, 12000), decimals) for _ in range(itineraries)]
+        result.append(([f'{render(amount)} round trip' for amount in amounts], min(amounts)))
+    return result
+
+
+def old_digit_filter(texts):
+    digits = ''.join(filter(str.isdigit, texts[0]))
+    return float(digits) if digits else None
+
+
+def new_parser(texts):
+    price = lowest_price(texts)
+    return price.amount if price else None
+
+
+def measure(func, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        prices = [func(texts) for texts, _ in pages]
+    seconds = (time.perf_counter() - start) / repeat
+    correct = sum(price == cheapest for price, (_, cheapest) in zip(prices, pages))
+    return {'pages_per_sec': round(len(pages) / seconds), 'correct_pct': round(correct / len(pages) * 100, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=2000)
+    parser.add_argument('--itineraries', type=int, default=25, help='Price texts per page')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='Append JSON results to this file')
+    args = parser.parse_args()
+
+    results = {'config': {'pages': args.pages, 'itineraries': args.itineraries}}
+    for fmt in FORMATS:
+        pages = make_pages(fmt, args.pages, args.itineraries)
+        old = measure(old_digit_filter, pages, args.repeat)
+        new = measure(new_parser, pages, args.repeat)
+        new['itineraries_per_sec'] = new['pages_per_sec'] * args.itineraries
+        results[fmt] = {'digit_filter_first': old, 'lowest_price_all': new}
+
+    html = render_results('DEL', 'BOM', '2030-01-01', 'primary', args.itineraries)
+    start = time.perf_counter()
+    for _ in range(args.repeat * 10):
+        find_price(html)
+    results['find_price_page_ms'] = round((time.perf_counter() - start) / (args.repeat * 10) * 1000, 3)
+
+    emit('prices', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark: flight_cli.py startup time per subcommand
+
+Runs each subcommand in a fresh interpreter against a small database and
+reports wall time, plus which heavy modules (selenium, webdriver_manager,
+smtplib, email, dotenv, psycopg) were imported on the way.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import REPO_ROOT, emit, percentile
+
+HEAVY_MODULES = ('selenium', 'webdriver_manager', 'smtplib', 'email', 'dotenv', 'psycopg', 'psycopg_pool')
+
+COMMANDS = {
+    'help': ['--help'],
+    'list': ['list'],
+    'history': ['history', '1'],
+    'add': ['add', '--origin', 'DEL', '--destination', 'BOM', '--departure', '2030-01-01',
+            '--email', 'bench@example.com', '--target', '5000'],
+}
+
+
+def heavy_imports(args, cwd):
+    """Top-level heavy packages imported while running the command"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', os.path.join(REPO_ROOT, 'flight_cli.py'), *args],
+                            cwd=cwd, capture_output=True, text=True)
+    found = set()
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            module = line.rsplit('|', 1)[1].strip().split('.')[0]
+            if module in HEAVY_MODULES:
+                found.add(module)
+    return sorted(found)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output', help='Append JSON results to this file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='flight-startup-')
+    cli = os.path.join(REPO_ROOT, 'flight_cli.py')
+    env = {**os.environ, 'LOG_LEVEL': 'WARNING'}
+
+    # Seed one flight so list/history have something to show
+    subprocess.run([sys.executable, cli, *COMMANDS['add']], cwd=workdir, env=env, capture_output=True, check=True)
+
+    results = {'runs': args.runs}
+    for name, command in COMMANDS.items():
+        samples = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, cli, *command], cwd=workdir, env=env, capture_output=True)
+            samples.append(time.perf_counter() - start)
+        results[name] = {
+            'p50_ms': round(percentile(samples, 50) * 1000, 1),
+            'min_ms': round(min(samples) * 1000, 1),
+            'heavy_imports': heavy_imports(command, workdir),
+        }
+
+    start = time.perf_counter()
+    for _ in range(args.runs):
+        subprocess.run([sys.executable, '-c', 'pass'], capture_output=True)
+    results['bare_interpreter_ms'] = round((time.perf_counter() - start) / args.runs * 1000, 1)
+
+    emit('cli_startup', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
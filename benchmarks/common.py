@@ -0,0 +1,72 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def git_commit():
+    """Short hash of the commit being benchmarked, if available"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def timed(func, *args, repeat=1, **kwargs):
+    """Run func repeat times; return (last result, elapsed seconds per run)"""
+    result = None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(*args, **kwargs)
+    return result, (time.perf_counter() - start) / repeat
+
+
+def emit(benchmark, results, output=None):
+    """Print benchmark results as one JSON document (and append to output file)"""
+    doc = {
+        'benchmark': benchmark,
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+    line = json.dumps(doc, sort_keys=True)
+    print(line)
+    if output:
+        with open(output, 'a') as f:
+            f.write(line + '\n')
+    return doc
+
+
+def reset_postgres(url):
+    """Drop every table in a scratch PostgreSQL database so a run starts from an empty schema"""
+    import psycopg
+    import flight_store
+
+    with psycopg.connect(url, autocommit=True) as conn:
+        tables = [row[0] for row in conn.execute(
+            "SELECT tablename FROM pg_tables WHERE schemaname = current_schema()")]
+        if tables:
+            conn.execute(f"DROP TABLE {', '.join(tables)} CASCADE")
+    flight_store._initialized_databases.discard(url)
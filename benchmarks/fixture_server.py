@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Local Google Flights stand-in for benchmarks
+
+Serves /travel/flights?q=flights+from+XXX+to+YYY+on+DATE with a results page
+shaped like the real one (inline CSS, a list of itineraries, third-party
+script and font references). Latency and markup variant are configurable per
+server and can be overridden per request with ?latency_ms= and ?variant=.
+
+Markup variants:
+  primary   price in div.YMlIz.FpEdX (first selector hits)
+  fallback  price only in span.price (third selector hits)
+  aria      price only in an aria-label (last selector hits)
+  none      no price on the page (every selector times out)
+"""
+
+import argparse
+import hashlib
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+VARIANTS = ('primary', 'fallback', 'aria', 'none')
+
+QUERY_RE = re.compile(r'flights from (\w+) to (\w+) on ([\d-]+)')
+
+# Static assets referenced by every results page, with realistic sizes
+ASSETS = {
+    '/static/results.css': ('text/css', b'.itinerary{display:flex;padding:12px}\n' * 1500),
+    '/static/roboto.woff2': ('font/woff2', bytes(48 * 1024)),
+    '/static/app.js': ('application/javascript', b'window.__app=1;\n' * 6000),
+    '/analytics/collect.js': ('application/javascript', b'(function(){var t=Date.now();})();\n' * 2000),
+    '/ads/pixel.gif': ('image/gif', bytes(43)),
+}
+
+PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<title>{origin} to {destination} | Google Flights</title>
+<link rel="stylesheet" href="/static/results.css">
+<link rel="preload" href="/static/roboto.woff2" as="font" crossorigin>
+<style>{inline_css}</style>
+<script src="/static/app.js" defer></script>
+<script src="/analytics/collect.js" async></script>
+</head>
+<body>
+<div class="header">Flights from {origin} to {destination} on {date}</div>
+<ul class="results">
+{itineraries}
+</ul>
+<img src="/ads/pixel.gif" width="1" height="1" alt="">
+</body>
+</html>
+"""
+
+INLINE_CSS = ''.join(f'.c{i}{{margin:{i % 9}px;color:#{i % 4096:03x}}}' for i in range(800))
+
+
+def _route_seed(origin, destination, date):
+    return int(hashlib.sha1(f'{origin}{destination}{date}'.encode()).hexdigest()[:8], 16)
+
+
+def base_price(origin, destination, date):
+    """Deterministic cheapest fare for a route and date"""
+    return 3000 + _route_seed(origin, destination, date) % 9000
+
+
+def render_itinerary(price, variant, index):
+    formatted = f'₹{price:,}'
+    airline = ('IndiGo', 'Air India', 'Vistara', 'SpiceJet', 'Akasa Air')[index % 5]
+    if variant == 'primary':
+        price_html = f'<div class="YMlIz FpEdX"><span>{formatted}</span></div>'
+    elif variant == 'fallback':
+        price_html = f'<span class="price-text">{formatted}</span>'
+    elif variant == 'aria':
+        price_html = f'<div aria-label="{price} Indian rupees price">{formatted}</div>'
+    else:
+        price_html = '<div class="sold-out">Prices unavailable</div>'
+    return (
+        f'<li class="itinerary c{index}"><div class="airline">{airline}</div>'
+        f'<div class="times">0{index % 10}:15 – 1{index % 10}:40</div>'
+        f'<div class="duration">2 hr {index * 5 % 60} min</div>{price_html}</li>'
+    )
+
+
+def render_results(origin, destination, date, variant, count=25):
+    """Full results page HTML for a search"""
+    cheapest = base_price(origin, destination, date)
+    rng = random.Random(_route_seed(origin, destination, date))
+    prices = [cheapest] + sorted(cheapest + rng.randint(100, 6000) for _ in range(count - 1))
+    itineraries = '\n'.join(render_itinerary(p, variant, i) for i, p in enumerate(prices))
+    return PAGE.format(origin=origin, destination=destination, date=date,
+                       inline_css=INLINE_CSS, itineraries=itineraries)
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = parse_qs(parsed.query)
+        server = self.server
+
+        if parsed.path in ASSETS:
+            content_type, body = ASSETS[parsed.path]
+            return self._send(200, content_type, body)
+
+        if parsed.path != '/travel/flights':
+            return self._send(404, 'text/plain', b'not found')
+
+        latency_ms = float(params.get('latency_ms', [server.latency_ms])[0])
+        jitter_ms = server.jitter_ms
+        time.sleep(max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000)
+
+        match = QUERY_RE.search(params.get('q', [''])[0])
+        if not match:
+            return self._send(400, 'text/plain', b'bad query')
+        variant = params.get('variant', [server.variant])[0]
+        with server.lock:
+            server.searches += 1
+        html = render_results(*match.groups(), variant=variant)
+        self._send(200, 'text/html; charset=utf-8', html.encode('utf-8'))
+
+    def _send(self, status, content_type, body):
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.bytes_sent += len(body)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=0, jitter_ms=0, variant='primary'):
+        super().__init__(address, FixtureHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.variant = variant
+        self.searches = 0
+        self.requests = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+def start_fixture_server(latency_ms=0, jitter_ms=0, variant='primary', host='127.0.0.1', port=0):
+    """Start a fixture server on a background thread"""
+    server = FixtureServer((host, port), latency_ms, jitter_ms, variant)
+    threading.Thread(target=server.serve_forever, name='fixture-server', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=300)
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--variant', choices=VARIANTS, default='primary')
+    args = parser.parse_args()
+
+    server = FixtureServer(('127.0.0.1', args.port), args.latency_ms, args.jitter_ms, args.variant)
+    print(f"Serving fixture flights at {server.base_url} (FLIGHTS_BASE_URL={server.base_url})")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Fill a flights database with synthetic flights and price history
+
+Routes follow a Zipf-like popularity curve, departure dates cluster in the
+next few weeks with a long tail, users track several flights each, and every
+flight's history is a random walk sampled every 6 hours (like the scheduler).
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import emit
+
+AIRPORTS = ['DEL', 'BOM', 'BLR', 'HYD', 'MAA', 'CCU', 'GOI', 'PNQ', 'AMD', 'COK',
+            'JAI', 'LKO', 'IXC', 'TRV', 'DXB', 'SIN', 'LHR', 'JFK', 'BKK', 'DOH']
+
+
+def route_catalog(rng):
+    """All ordered airport pairs with Zipf-like popularity weights"""
+    routes = [(a, b) for a in AIRPORTS for b in AIRPORTS if a != b]
+    rng.shuffle(routes)
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(len(routes))]
+    return routes, weights
+
+
+def generate(db_path, flights, history, seed=42, users=None, batch=50000):
+    """Create flights and price history in db_path (a file or postgresql:// URL); returns row counts"""
+    from flight_tracker import FlightTracker
+
+    rng = random.Random(seed)
+    store = FlightTracker(db_path).store
+
+    routes, weights = route_catalog(rng)
+    users = users or max(1, flights // 3)
+    now = datetime.now()
+
+    # Flights on the same route and date share one search
+    keys = []
+    flight_rows = []
+    base_prices = []
+    for _ in range(flights):
+        origin, destination = rng.choices(routes, weights)[0]
+        days_out = min(int(rng.expovariate(1 / 30)) + 1, 330)
+        keys.append((origin, destination, (now + timedelta(days=days_out)).strftime('%Y-%m-%d')))
+        base = rng.lognormvariate(8.6, 0.45)
+        target = round(base * rng.uniform(0.75, 1.0), -1) if rng.random() < 0.8 else None
+        created = now - timedelta(days=rng.uniform(0, 60))
+        flight_rows.append((f'user{rng.randrange(users)}@example.com', target, created.strftime('%Y-%m-%d %H:%M:%S')))
+        base_prices.append(base)
+
+    search_ids = store.ensure_searches(keys)
+    flight_ids = store.import_flights([(search_ids[key], *row) for key, row in zip(keys, flight_rows)]) \
+        if flights else []
+
+    # Spread history evenly across flights, newest observation per flight at `now`
+    per_flight, extra = divmod(history, flights) if flights else (0, 0)
+    pending = []
+    for index, flight_id in enumerate(flight_ids):
+        price = base_prices[index]
+        count = per_flight + (1 if index < extra else 0)
+        for step in range(count):
+            price = max(800.0, price * rng.gauss(1.0, 0.03))
+            checked = now - timedelta(hours=6 * (count - step))
+            pending.append((flight_id, round(price), checked.strftime('%Y-%m-%d %H:%M:%S')))
+        if len(pending) >= batch:
+            store.import_history(pending)
+            pending.clear()
+    if pending:
+        store.import_history(pending)
+
+    return {'flights': flights, 'history': history}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='flights.db', help='SQLite file or postgresql:// URL')
+    parser.add_argument('--flights', type=int, default=1000)
+    parser.add_argument('--history', type=int, default=100000, help='Total price history rows')
+    parser.add_argument('--users', type=int, help='Distinct alert emails (default flights/3)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from flight_store import POSTGRES_SCHEMES, open_store
+
+    start = time.perf_counter()
+    db_path = args.db if args.db.startswith(POSTGRES_SCHEMES) else os.path.abspath(args.db)
+    counts = generate(db_path, args.flights, args.history, args.seed, args.users)
+    counts['seconds'] = round(time.perf_counter() - start, 2)
+    counts['db_mb'] = round(open_store(db_path).size_bytes() / 1024 / 1024, 2)
+    emit('generate_dataset', counts)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Flight Airports - IATA code validation and lookup from a bundled airport list
+
+data/airports.csv lists major airports (iata, name, city, country). Point
+AIRPORTS_FILE at a fuller CSV with the same columns, or at an OurAirports
+airports.csv export, to cover more. The file is read once per process
+into a dict keyed by code. A well-formed code that is not in the list is
+still accepted, since the bundled list is far from every IATA airport
+(FlightTracker.add_flight logs a warning). Set AIRPORTS_STRICT=1 to reject
+such codes.
+"""
+
+import csv
+import os
+import re
+import threading
+from collections import namedtuple
+
+Airport = namedtuple('Airport', 'iata name city country')
+
+DEFAULT_AIRPORTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'airports.csv')
+
+IATA_RE = re.compile(r'^[A-Z]{3}$')
+
+# OurAirports column names for the fields of Airport
+_OURAIRPORTS_COLUMNS = ('iata_code', 'name', 'municipality', 'iso_country')
+
+_airports = None
+_lock = threading.Lock()
+
+
+def load_airports(path):
+    """Read an airport CSV into {code: Airport}"""
+    airports = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        columns = _OURAIRPORTS_COLUMNS if 'iata_code' in (reader.fieldnames or ()) else Airport._fields
+        for row in reader:
+            code = (row.get(columns[0]) or '').strip().upper()
+            if IATA_RE.match(code):
+                airports[code] = Airport(code, *(row.get(column, '') for column in columns[1:]))
+    return airports
+
+
+def airports():
+    """The process-wide airport table (AIRPORTS_FILE, or the bundled list)"""
+    global _airports
+    if _airports is None:
+        with _lock:
+            if _airports is None:
+                _airports = load_airports(os.getenv('AIRPORTS_FILE') or DEFAULT_AIRPORTS_FILE)
+    return _airports
+
+
+def lookup(code):
+    """Airport for a code, or None"""
+    return airports().get((code or '').strip().upper())
+
+
+def validate_code(code):
+    """Normalized IATA code; raises ValueError for malformed codes, and for unknown ones if AIRPORTS_STRICT=1"""
+    code = (code or '').strip().upper()
+    if not IATA_RE.match(code):
+        raise ValueError(f"Airport codes must be exactly 3 letters (got {code!r})")
+    if code not in airports() and os.getenv('AIRPORTS_STRICT', '0') == '1':
+        raise ValueError(f"Unknown airport code {code}")
+    return code
+
+
+def validate_route(origin, destination):
+    """(origin, destination) as validated codes; raises ValueError"""
+    origin, destination = validate_code(origin), validate_code(destination)
+    if origin == destination:
+        raise ValueError("Origin and destination must be different airports")
+    return origin, destination
@@ -0,0 +1,52 @@
+"""
+Flight Alerts - Debounced price alert state machine and per-recipient batching
+"""
+
+from collections import defaultdict, namedtuple
+
+# Alert states persisted in the alert_state table
+ARMED = 'armed'
+FIRED = 'fired'
+
+# A single price drop waiting to be sent; both prices are in currency
+PriceAlert = namedtuple('PriceAlert', 'flight_id origin destination departure_date current_price target_price currency')
+
+
+def next_alert_state(state, current_price, target_price, rearm_pct):
+    """Return (new_state, should_alert) for a new price observation
+
+    An armed flight fires once when the price reaches the target. It stays
+    fired until the price rebounds rearm_pct percent above the target, so a
+    fare sitting under target does not alert on every check.
+    """
+    if not target_price:
+        return state or ARMED, False
+
+    if state == FIRED:
+        if current_price >= target_price * (1 + rearm_pct / 100):
+            return ARMED, False
+        return FIRED, False
+
+    if current_price <= target_price:
+        return FIRED, True
+    return ARMED, False
+
+
+class AlertBatch:
+    """Collects alerts during a check cycle, grouped by recipient"""
+
+    def __init__(self):
+        self._by_recipient = defaultdict(list)
+
+    def add(self, recipient, alert):
+        """Queue an alert for a recipient"""
+        self._by_recipient[recipient].append(alert)
+
+    def drain(self):
+        """Return queued alerts as {recipient: [alerts]} and reset the batch"""
+        pending = dict(self._by_recipient)
+        self._by_recipient.clear()
+        return pending
+
+    def __len__(self):
+        return sum(len(alerts) for alerts in self._by_recipient.values())
@@ -0,0 +1,216 @@
+"""
+Flight Artifacts - Bounded, asynchronous store for debug captures of failed scrapes
+
+The screenshot and page source are taken from the driver in memory (the
+driver is about to quit), then written by a background thread. Captures
+are sampled at DEBUG_ARTIFACT_SAMPLE_RATE and kept as a ring buffer capped
+by count and total size. index.jsonl records every kept capture, so saved
+pages can be re-parsed offline with flight_scraper.find_price.
+
+Several processes (gunicorn workers, the scheduler) may share a directory.
+Each write re-reads index.jsonl under an flock on index.lock. The caps and
+the index then cover every process's captures, not just the writer's own.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows: only captures from one process are kept in order
+    fcntl = None
+
+from flight_metrics import DEBUG_ARTIFACTS_TOTAL
+
+logger = logging.getLogger('flight_artifacts')
+
+INDEX_FILE = 'index.jsonl'
+LOCK_FILE = 'index.lock'
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class ArtifactStore:
+    """Ring buffer of debug captures in one directory, written off the hot path"""
+
+    def __init__(self, directory, max_count=100, max_bytes=100 * 1024 * 1024, sample_rate=1.0, queue_size=32):
+        self.directory = directory
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def capture(self, driver, flight_id, reason, **context):
+        """Queue a screenshot and page source of driver's current page; returns the capture id or None"""
+        if random.random() >= self.sample_rate:
+            DEBUG_ARTIFACTS_TOTAL.labels(outcome='sampled_out').inc()
+            return None
+
+        try:
+            screenshot = driver.get_screenshot_as_png()
+        except Exception:
+            screenshot = None
+        try:
+            page_source = driver.page_source
+            url = driver.current_url
+        except Exception:
+            page_source, url = None, None
+        if screenshot is None and page_source is None:
+            return None
+
+        capture_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{flight_id}-{os.urandom(3).hex()}"
+        entry = dict(context, id=capture_id, flight_id=flight_id, reason=reason, url=url,
+                     captured_at=time.strftime('%Y-%m-%dT%H:%M:%S'))
+        try:
+            self._queue.put_nowait((entry, screenshot, page_source))
+        except queue.Full:
+            DEBUG_ARTIFACTS_TOTAL.labels(outcome='dropped').inc()
+            return None
+
+        self._ensure_writer()
+        return capture_id
+
+    def flush(self):
+        """Block until every queued capture has been written"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def entries(self):
+        """Kept captures, oldest first"""
+        return self._read_index()
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._write_loop, name='artifact-writer', daemon=True)
+                self._thread.start()
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE)) as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            return []
+
+    @contextmanager
+    def _index_locked(self):
+        """Hold the directory's index against other threads and processes"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.directory, LOCK_FILE), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_loop(self):
+        while True:
+            entry, screenshot, page_source = self._queue.get()
+            try:
+                self._write(entry, screenshot, page_source)
+                DEBUG_ARTIFACTS_TOTAL.labels(outcome='saved').inc()
+            except Exception as e:
+                DEBUG_ARTIFACTS_TOTAL.labels(outcome='failed').inc()
+                logger.warning("Could not write debug artifact: %s", e)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, entry, screenshot, page_source):
+        os.makedirs(self.directory, exist_ok=True)
+        files = {}
+        if screenshot:
+            files['screenshot'] = entry['id'] + '.png'
+            with open(os.path.join(self.directory, files['screenshot']), 'wb') as f:
+                f.write(screenshot)
+        if page_source:
+            files['html'] = entry['id'] + '.html'
+            with open(os.path.join(self.directory, files['html']), 'w', encoding='utf-8') as f:
+                f.write(page_source)
+        entry['files'] = files
+        entry['bytes'] = len(screenshot or b'') + len((page_source or '').encode('utf-8'))
+
+        with self._index_locked():
+            # Another process may have added or evicted captures since this one last looked
+            entries = self._read_index()
+            entries.append(entry)
+            evicted = self._evict(entries)
+            if evicted:
+                self._rewrite_index(entries)
+            else:
+                with open(os.path.join(self.directory, INDEX_FILE), 'a') as f:
+                    f.write(json.dumps(entry) + '\n')
+        logger.debug("Debug artifact saved", extra={'artifact': entry['id'], 'flight_id': entry['flight_id']})
+
+    def _evict(self, entries):
+        """Drop the oldest captures until under both caps; returns how many went"""
+        evicted = 0
+        total = sum(e.get('bytes', 0) for e in entries)
+        while entries and (len(entries) > self.max_count or total > self.max_bytes):
+            oldest = entries.pop(0)
+            total -= oldest.get('bytes', 0)
+            for name in oldest.get('files', {}).values():
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+            evicted += 1
+        if evicted:
+            DEBUG_ARTIFACTS_TOTAL.labels(outcome='evicted').inc(evicted)
+        return evicted
+
+    def _rewrite_index(self, entries):
+        path = os.path.join(self.directory, INDEX_FILE)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+        os.replace(tmp, path)
+
+
+def artifact_store(directory=None):
+    """The process-wide store for directory (default DEBUG_ARTIFACT_DIR), configured from the environment"""
+    directory = os.path.abspath(directory or os.getenv('DEBUG_ARTIFACT_DIR', 'debug_artifacts'))
+    with _stores_lock:
+        store = _stores.get(directory)
+        if store is None:
+            store = _stores[directory] = ArtifactStore(
+                directory,
+                max_count=int(os.getenv('DEBUG_ARTIFACT_MAX_COUNT', 100)),
+                max_bytes=int(float(os.getenv('DEBUG_ARTIFACT_MAX_MB', 100)) * 1024 * 1024),
+                sample_rate=float(os.getenv('DEBUG_ARTIFACT_SAMPLE_RATE', 1.0)),
+            )
+            # Short-lived processes (flight_cli.py check) should not lose queued captures
+            atexit.register(store.flush)
+        return store
+
+
+def replay(directory=None, selectors=None):
+    """Re-parse every kept page with the offline parser; yields (entry, price, selector)"""
+    from flight_scraper import find_price
+
+    store = artifact_store(directory)
+    for entry in store.entries():
+        html_file = entry.get('files', {}).get('html')
+        if not html_file:
+            yield entry, None, None
+            continue
+        try:
+            with open(os.path.join(store.directory, html_file), encoding='utf-8') as f:
+                price, selector = find_price(f.read(), selectors)
+        except OSError:
+            price, selector = None, None
+        yield entry, price, selector
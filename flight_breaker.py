@@ -0,0 +1,132 @@
+"""
+Flight Breaker - Per-provider circuit breaker with jittered exponential backoff
+
+A provider's circuit opens when too many recent checks fail (blocked,
+markup changed, driver crashes). While open, checks are refused without
+starting Chrome. Once the backoff expires a single half-open probe is let
+through: success closes the circuit, failure reopens it for twice as long.
+A breaker may be shared by threads (one per web worker); its state changes
+are serialized, so only one of them gets the probe.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+from flight_metrics import BREAKER_STATE
+
+# Breaker states, persisted in the provider_health table
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """A check was refused because the provider's circuit is open"""
+
+    def __init__(self, provider, retry_at):
+        super().__init__(f"{provider} circuit open until {time.strftime('%H:%M:%S', time.localtime(retry_at))}")
+        self.provider = provider
+        self.retry_at = retry_at
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker for one price source"""
+
+    def __init__(self, provider, window=20, failure_rate=0.5, min_calls=5,
+                 backoff_seconds=300, max_backoff_seconds=21600):
+        self.provider = provider
+        self.threshold = failure_rate
+        self.min_calls = min_calls
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+        self.state = CLOSED
+        self.recent = deque(maxlen=window)
+        self.opens = 0
+        self.opened_until = 0.0
+        self.consecutive_failures = 0
+        self._probing = False
+        self._lock = threading.RLock()
+        BREAKER_STATE.labels(provider=provider).set(0)
+
+    def failure_rate(self):
+        if not self.recent:
+            return 0.0
+        return self.recent.count(False) / len(self.recent)
+
+    def allow(self):
+        """Return True if a check may run now (claims the probe when half-open)"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.time() < self.opened_until:
+                    return False
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record(self, success):
+        """Feed one check outcome into the breaker"""
+        with self._lock:
+            self.consecutive_failures = 0 if success else self.consecutive_failures + 1
+
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if success:
+                    self.opens = 0
+                    self.recent.clear()
+                    self._set_state(CLOSED)
+                else:
+                    self.trip()
+                return
+
+            self.recent.append(success)
+            if len(self.recent) >= self.min_calls and self.failure_rate() >= self.threshold:
+                self.trip()
+
+    def trip(self):
+        """Open the circuit for an exponentially growing, jittered period"""
+        with self._lock:
+            self.opens += 1
+            backoff = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (self.opens - 1))
+            # Equal jitter: keep at least half the backoff, spread the rest
+            self.opened_until = time.time() + backoff * random.uniform(0.5, 1.0)
+            self._set_state(OPEN)
+
+    def pacing(self, interval):
+        """Pause before the next check: interval, doubled per consecutive failure (max 32x), jittered"""
+        if not self.consecutive_failures:
+            return interval
+        return interval * 2 ** min(self.consecutive_failures, 5) * random.uniform(0.8, 1.2)
+
+    def _set_state(self, state):
+        self.state = state
+        BREAKER_STATE.labels(provider=self.provider).set(_STATE_VALUES[state])
+
+    def snapshot(self):
+        """State for persistence and /health"""
+        with self._lock:
+            return {
+                'provider': self.provider,
+                'state': self.state,
+                'failure_rate': round(self.failure_rate(), 3),
+                'recent': ''.join('s' if ok else 'f' for ok in self.recent),
+                'opens': self.opens,
+                'opened_until': self.opened_until,
+            }
+
+    def restore(self, state, recent, opens, opened_until):
+        """Load persisted state (another process may have tripped the breaker)"""
+        with self._lock:
+            self.recent.clear()
+            self.recent.extend(c == 's' for c in recent or '')
+            self.opens = opens or 0
+            self.opened_until = opened_until or 0.0
+            self._probing = False
+            self._set_state(state or CLOSED)
@@ -0,0 +1,267 @@
+"""
+Flight Browser - Chrome driver creation with a cached chromedriver path
+
+ChromeDriverManager().install() does filesystem and version checks and may
+go to the network, so the resolved chromedriver path is cached in-process and
+on disk, keyed by the Chrome binary it was resolved for. A cached path is
+validated with a stat; it is only re-resolved when missing or when starting
+a driver with it fails.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+
+logger = logging.getLogger('flight_browser')
+
+CHROME_BINARIES = ('google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome')
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'flight-tracker', 'chromedriver.json')
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+# Page-load profiles: "default" matches the historical options, "lean" also
+# blocks fonts, stylesheets, media and third-party trackers via CDP, shrinks
+# the viewport and turns off Chrome's background services.
+PROFILES = ('default', 'lean')
+
+LEAN_BLOCKED_URLS = [
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.css', '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico', '*.mp4', '*.webm',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*googlesyndication.com*',
+    '*googleadservices.com*', '*/analytics/*', '*/ads/*', '*/gen_204*', '*/log?*',
+]
+
+LEAN_ARGUMENTS = [
+    '--window-size=800,600',
+    '--disable-background-networking',
+    '--disable-background-timer-throttling',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-client-side-phishing-detection',
+    '--disable-domain-reliability',
+    '--disable-features=Translate,OptimizationHints,MediaRouter,InterestFeedContentSuggestions',
+    '--metrics-recording-only',
+    '--mute-audio',
+    '--no-first-run',
+]
+
+# Bytes transferred and timing for the current document (Resource Timing API)
+PAGE_STATS_SCRIPT = """
+const nav = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+let bytes = nav ? (nav.transferSize || 0) : 0;
+for (const r of resources) { bytes += r.transferSize || 0; }
+return {
+    transfer_bytes: bytes,
+    resources: resources.length,
+    dom_content_loaded_ms: nav ? nav.domContentLoadedEventEnd : null,
+};
+"""
+
+_lock = threading.Lock()
+_resolved = {}
+
+
+def scraper_profile():
+    """Configured page-load profile (SCRAPER_PROFILE, default "default")"""
+    profile = os.getenv('SCRAPER_PROFILE', 'default').lower()
+    return profile if profile in PROFILES else 'default'
+
+
+def blocked_urls():
+    """URL patterns blocked by the lean profile, plus any from SCRAPER_BLOCKLIST"""
+    extra = [p.strip() for p in os.getenv('SCRAPER_BLOCKLIST', '').split(',') if p.strip()]
+    return LEAN_BLOCKED_URLS + extra
+
+
+def _cache_file():
+    return os.getenv('CHROMEDRIVER_CACHE', DEFAULT_CACHE_FILE)
+
+
+def chrome_fingerprint():
+    """Identify the installed Chrome cheaply (path + mtime changes on upgrade)"""
+    binary = os.getenv('CHROME_BINARY')
+    if not binary:
+        binary = next((path for path in map(shutil.which, CHROME_BINARIES) if path), None)
+    if not binary:
+        return 'unknown'
+    try:
+        real = os.path.realpath(binary)
+        return f'{real}:{int(os.stat(real).st_mtime)}'
+    except OSError:
+        return binary
+
+
+def _usable(path):
+    return bool(path) and os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def _read_disk_cache(key):
+    try:
+        with open(_cache_file()) as f:
+            return json.load(f).get(key)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_disk_cache(key, path):
+    cache_file = _cache_file()
+    try:
+        try:
+            with open(cache_file) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+        entries[key] = path
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp = f'{cache_file}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp, cache_file)
+    except OSError as e:
+        logger.debug("Could not write chromedriver cache: %s", e)
+
+
+def resolve_chromedriver(refresh=False):
+    """Path to a chromedriver binary, or None to let Selenium locate one
+
+    Order: CHROMEDRIVER_PATH, in-process cache, on-disk cache,
+    ChromeDriverManager, chromedriver on PATH.
+    """
+    explicit = os.getenv('CHROMEDRIVER_PATH')
+    if explicit:
+        return explicit
+
+    key = chrome_fingerprint()
+    with _lock:
+        if not refresh:
+            path = _resolved.get(key)
+            if _usable(path):
+                return path
+            path = _read_disk_cache(key)
+            if _usable(path):
+                _resolved[key] = path
+                return path
+
+        path = None
+        try:
+            from webdriver_manager.chrome import ChromeDriverManager
+            path = ChromeDriverManager().install()
+            logger.debug("Resolved chromedriver with ChromeDriverManager: %s", path)
+        except Exception as e:
+            logger.warning("ChromeDriverManager failed: %s", e)
+            path = shutil.which('chromedriver')
+
+        if _usable(path):
+            _resolved[key] = path
+            _write_disk_cache(key, path)
+            return path
+
+        _resolved.pop(key, None)
+        return None
+
+
+def invalidate_chromedriver():
+    """Forget the cached path for the current Chrome (memory and disk)"""
+    key = chrome_fingerprint()
+    with _lock:
+        _resolved.pop(key, None)
+        if _read_disk_cache(key) is not None:
+            _write_disk_cache(key, None)
+
+
+def chrome_options(profile='default'):
+    """Headless Chrome options used for every scrape"""
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+
+    # Essential options for headless mode
+    options.add_argument('--headless')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-software-rasterizer')
+    options.add_argument('--disable-extensions')
+
+    # User agent to avoid detection
+    options.add_argument(f'user-agent={USER_AGENT}')
+
+    # Performance optimizations
+    options.add_argument('--blink-settings=imagesEnabled=false')  # Don't load images
+    options.page_load_strategy = 'eager'  # Don't wait for all resources
+
+    if profile == 'lean':
+        for argument in LEAN_ARGUMENTS:
+            options.add_argument(argument)
+        options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2,
+            'profile.default_content_setting_values.notifications': 2,
+        })
+
+    binary = os.getenv('CHROME_BINARY')
+    if binary:
+        options.binary_location = binary
+    return options
+
+
+def apply_profile(driver, profile):
+    """Install per-session settings that need CDP (URL blocking for lean)"""
+    if profile != 'lean':
+        return
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': blocked_urls()})
+    except Exception as e:
+        logger.warning("Could not enable request blocking: %s", e)
+
+
+def page_stats(driver):
+    """Bytes transferred and resource count for the loaded page, or {}"""
+    try:
+        return driver.execute_script(PAGE_STATS_SCRIPT) or {}
+    except Exception:
+        return {}
+
+
+def _start(path, options):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    if path:
+        return webdriver.Chrome(service=Service(path), options=options)
+    return webdriver.Chrome(options=options)
+
+
+def create_driver(options=None, profile=None):
+    """Start headless Chrome, re-resolving chromedriver once if the cached one fails"""
+    profile = profile or scraper_profile()
+    options = options or chrome_options(profile)
+    path = resolve_chromedriver()
+    try:
+        driver = _start(path, options)
+        apply_profile(driver, profile)
+        logger.debug("Chrome driver initialized", extra={'chromedriver': path or 'selenium-manager',
+                                                        'profile': profile})
+        return driver
+    except Exception as e:
+        if path is None:
+            logger.error("Could not initialize Chrome driver: %s", e)
+            raise
+        logger.warning("Chrome driver failed with %s, re-resolving: %s", path, e)
+
+    invalidate_chromedriver()
+    fresh = resolve_chromedriver(refresh=True)
+    try:
+        driver = _start(fresh if fresh != path else None, options)
+        apply_profile(driver, profile)
+        logger.debug("Chrome driver initialized after re-resolve", extra={'chromedriver': fresh})
+        return driver
+    except Exception as e:
+        logger.error("Could not initialize Chrome driver: %s", e)
+        raise
@@ -3,36 +3,50 @@
 Flight Tracker CLI - Command Line Interface
 """
 
+import os
 import sys
 import argparse
-from tabulate import tabulate
 from flight_tracker import FlightTracker
+from flight_currency import default_currency, format_money
+from flight_models import LISTED_STATES
+from flight_logging import setup_logging
 
 def add_flight(args):
     """Add a new flight to track"""
+    from flight_airports import lookup
+    
     tracker = FlightTracker()
     
-    flight_id = tracker.add_flight(
-        origin=args.origin,
-        destination=args.destination,
-        departure_date=args.departure,
-        email=args.email,
-        target_price=args.target
-    )
+    try:
+        flight_id = tracker.add_flight(
+            origin=args.origin,
+            destination=args.destination,
+            departure_date=args.departure,
+            email=args.email,
+            target_price=args.target,
+            currency=args.currency
+        )
+    except ValueError as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
     
+    origin, destination = lookup(args.origin), lookup(args.destination)
     print(f"\n✅ Flight added successfully!")
     print(f"📋 Flight ID: {flight_id}")
-    print(f"✈️  Route: {args.origin} → {args.destination}")
+    print(f"✈️  Route: {args.origin.upper()} → {args.destination.upper()}"
+          + (f" ({origin.city} → {destination.city})" if origin and destination else ""))
     print(f"📅 Date: {args.departure}")
     print(f"📧 Alert Email: {args.email}")
     if args.target:
-        print(f"🎯 Target Price: ₹{args.target}")
+        print(f"🎯 Target Price: {format_money(args.target, (args.currency or default_currency()).upper())}")
     print(f"\n💡 Tip: Run 'python flight_cli.py check {flight_id}' to check current price")
 
 def list_flights(args):
-    """List all tracked flights"""
+    """List tracked flights (archived ones too with --all)"""
+    from tabulate import tabulate
+    
     tracker = FlightTracker()
-    flights = tracker.get_all_flights()
+    flights = tracker.get_all_flights(statuses=None if args.all else LISTED_STATES)
     
     if not flights:
         print("\n📭 No flights being tracked yet.")
@@ -42,30 +56,50 @@ def list_flights(args):
     # Format data for table
     table_data = []
     for flight in flights:
-        flight_id = flight[0]
-        origin = flight[1]
-        destination = flight[2]
-        departure_date = flight[3]
-        email = flight[4]
-        target_price = f"₹{flight[5]}" if flight[5] else "None"
-        created_at = flight[6]
+        target_price = format_money(flight.target_price, flight.currency) if flight.target_price else "None"
         
         table_data.append([
-            flight_id,
-            f"{origin} → {destination}",
-            departure_date,
-            email,
+            flight.id,
+            f"{flight.origin} → {flight.destination}",
+            flight.departure_date,
+            flight.email,
             target_price,
-            created_at
+            flight.status,
+            flight.created_at
         ])
     
-    headers = ["ID", "Route", "Departure", "Email", "Target Price", "Added On"]
+    headers = ["ID", "Route", "Departure", "Email", "Target Price", "Status", "Added On"]
     print("\n" + "="*100)
     print("✈️  YOUR TRACKED FLIGHTS")
     print("="*100)
     print(tabulate(table_data, headers=headers, tablefmt="grid"))
     print(f"\n📊 Total flights tracked: {len(flights)}")
 
+def pause_flight(args):
+    """Stop checking a flight until it is resumed"""
+    tracker = FlightTracker()
+    
+    try:
+        tracker.pause_flight(args.flight_id)
+    except ValueError as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
+    
+    print(f"\n⏸️  Flight {args.flight_id} paused")
+    print(f"💡 Resume it with: python flight_cli.py resume {args.flight_id}")
+
+def resume_flight(args):
+    """Start checking a paused flight again"""
+    tracker = FlightTracker()
+    
+    try:
+        tracker.resume_flight(args.flight_id)
+    except ValueError as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
+    
+    print(f"\n▶️  Flight {args.flight_id} resumed")
+
 def check_price(args):
     """Check current price for a flight"""
     tracker = FlightTracker()
@@ -76,12 +110,14 @@ def check_price(args):
     current_price = tracker.check_price(args.flight_id)
     
     if current_price:
-        print(f"\n✅ Current Price: ₹{current_price}")
+        print(f"\n✅ Current Price: {format_money(*current_price)}")
     else:
         print(f"\n❌ Could not fetch price. Flight ID might not exist.")
 
 def price_history(args):
     """Show price history for a flight"""
+    from tabulate import tabulate
+    
     tracker = FlightTracker()
     history = tracker.get_price_history(args.flight_id)
     
@@ -93,24 +129,116 @@ def price_history(args):
     print("="*60)
     
     table_data = []
-    for i, (price, checked_at) in enumerate(history, 1):
-        table_data.append([i, f"₹{price}", checked_at])
+    for i, observation in enumerate(history, 1):
+        table_data.append([i, format_money(observation.price, observation.currency), observation.checked_at])
     
     headers = ["#", "Price", "Checked At"]
     print(tabulate(table_data, headers=headers, tablefmt="grid"))
     
-    if len(history) > 1:
-        latest_price = history[0][0]
-        oldest_price = history[-1][0]
+    # Compare like with like: the oldest price seen in the latest price's currency
+    same_currency = [observation for observation in history if observation.currency == history[0].currency]
+    if len(same_currency) > 1:
+        latest_price = same_currency[0].price
+        oldest_price = same_currency[-1].price
         change = latest_price - oldest_price
+        currency = history[0].currency
         
         if change < 0:
-            print(f"\n📉 Price decreased by ₹{abs(change)} ({abs(change/oldest_price*100):.1f}%)")
+            print(f"\n📉 Price decreased by {format_money(abs(change), currency)} ({abs(change/oldest_price*100):.1f}%)")
         elif change > 0:
-            print(f"\n📈 Price increased by ₹{change} ({change/oldest_price*100:.1f}%)")
+            print(f"\n📈 Price increased by {format_money(change, currency)} ({change/oldest_price*100:.1f}%)")
         else:
             print(f"\n➡️  Price unchanged")
 
+def failures(args):
+    """Show why checks failed and how much scrape time that cost"""
+    from tabulate import tabulate
+    
+    tracker = FlightTracker()
+    summary = tracker.get_failure_summary(args.days)
+    
+    if not summary:
+        print(f"\n✅ No failed checks in the last {args.days} day(s)")
+        return
+    
+    table_data = [[reason, stats['count'], f"{stats['seconds']:.0f}s"] for reason, stats in summary.items()]
+    print(f"\n🧯 Failed checks in the last {args.days} day(s)")
+    print(tabulate(table_data, headers=["Reason", "Checks", "Time Spent"], tablefmt="grid"))
+    
+    queued = tracker.due_retries(float('inf'))
+    if queued:
+        print(f"\n🔁 {len(queued)} flight(s) waiting to be retried")
+
+def routes(args):
+    """Show tracked routes with subscriber counts and recent prices"""
+    from tabulate import tabulate
+    from flight_airports import lookup
+    
+    tracker = FlightTracker()
+    summary = tracker.get_route_summary(args.days, args.currency)
+    
+    if not summary:
+        print("\n📭 No routes being tracked yet.")
+        return
+    
+    table_data = []
+    for route in summary:
+        origin, destination = lookup(route['origin']), lookup(route['destination'])
+        cities = f" ({origin.city} → {destination.city})" if origin and destination else ""
+        table_data.append([
+            f"{route['origin']} → {route['destination']}{cities}",
+            route['searches'],
+            route['subscribers'],
+            route['observations'],
+            format_money(route['low'], route['currency']),
+            format_money(route['average'], route['currency']),
+        ])
+    
+    headers = ["Route", "Dates", "Subscribers", "Prices Seen", "Lowest", "Average"]
+    print(f"\n🗺️  Tracked routes (prices from the last {args.days} day(s))")
+    print(tabulate(table_data, headers=headers, tablefmt="grid"))
+
+def replay_artifacts(args):
+    """Re-parse saved failure pages with the current selectors"""
+    from tabulate import tabulate
+    from flight_artifacts import replay
+    
+    table_data = []
+    recovered = 0
+    for entry, price, selector in replay(args.dir):
+        recovered += price is not None
+        table_data.append([entry['id'], entry['flight_id'], entry['reason'],
+                           format_money(*price) if price is not None else "-", selector or "-"])
+    
+    if not table_data:
+        print("\n📭 No debug artifacts saved yet.")
+        return
+    
+    print(tabulate(table_data, headers=["Capture", "Flight", "Reason", "Offline Price", "Selector"], tablefmt="grid"))
+    print(f"\n🔎 {recovered}/{len(table_data)} saved page(s) yield a price with the current selectors")
+
+def exchange_rates(args):
+    """Show the cached exchange rates, refreshing them first if asked"""
+    from tabulate import tabulate
+    from flight_currency import fx_rates, rates_file, refresh_rates
+    
+    if args.refresh:
+        try:
+            refresh_rates(args.url)
+        except Exception as e:
+            print(f"\n❌ Could not refresh exchange rates: {e}")
+            sys.exit(1)
+    
+    rates = fx_rates()
+    if not rates.rates:
+        print(f"\n📭 No exchange rates cached at {rates_file()}")
+        print("💡 Fetch them with: python flight_cli.py fx --refresh")
+        return
+    
+    table_data = [[code, rate] for code, rate in sorted(rates.rates.items())]
+    print(f"\n💱 Exchange rates per 1 {rates.base} (as of {rates.date or 'unknown'})")
+    print(tabulate(table_data, headers=["Currency", "Rate"], tablefmt="grid"))
+
 def main():
     parser = argparse.ArgumentParser(
         description="✈️ Flight Price Tracker - Monitor flight prices and get alerts",
@@ -126,11 +254,27 @@ Examples:
   # List all tracked flights
   python flight_cli.py list
   
+  # Stop checking a flight for now, then start again
+  python flight_cli.py pause 1
+  python flight_cli.py resume 1
+  
   # Check current price
   python flight_cli.py check 1
   
   # View price history
   python flight_cli.py history 1
+  
+  # Tracked routes, busiest first
+  python flight_cli.py routes
+  
+  # Why checks failed this week
+  python flight_cli.py failures --days 7
+  
+  # Re-parse pages saved from failed checks
+  python flight_cli.py replay
+  
+  # Download the latest exchange rates
+  python flight_cli.py fx --refresh
         """
     )
     
@@ -143,12 +287,23 @@ Examples:
     add_parser.add_argument('--departure', required=True, help='Departure date (YYYY-MM-DD)')
     add_parser.add_argument('--email', required=True, help='Email for alerts')
     add_parser.add_argument('--target', type=float, help='Target price (optional)')
+    add_parser.add_argument('--currency', help='Currency of the target and alerts (default DEFAULT_CURRENCY or INR)')
     add_parser.set_defaults(func=add_flight)
     
     # List flights command
     list_parser = subparsers.add_parser('list', help='List all tracked flights')
+    list_parser.add_argument('--all', action='store_true', help='Include archived flights')
     list_parser.set_defaults(func=list_flights)
     
+    # Pause and resume commands
+    pause_parser = subparsers.add_parser('pause', help='Stop checking a flight until it is resumed')
+    pause_parser.add_argument('flight_id', type=int, help='Flight ID to pause')
+    pause_parser.set_defaults(func=pause_flight)
+    
+    resume_parser = subparsers.add_parser('resume', help='Start checking a paused flight again')
+    resume_parser.add_argument('flight_id', type=int, help='Flight ID to resume')
+    resume_parser.set_defaults(func=resume_flight)
+    
     # Check price command
     check_parser = subparsers.add_parser('check', help='Check current price for a flight')
     check_parser.add_argument('flight_id', type=int, help='Flight ID to check')
@@ -159,6 +314,28 @@ Examples:
     history_parser.add_argument('flight_id', type=int, help='Flight ID')
     history_parser.set_defaults(func=price_history)
     
+    # Route summary command
+    routes_parser = subparsers.add_parser('routes', help='Summarize tracked routes')
+    routes_parser.add_argument('--days', type=int, default=7, help='How many days of prices to include')
+    routes_parser.add_argument('--currency', help='Show prices in this currency (default DEFAULT_CURRENCY or INR)')
+    routes_parser.set_defaults(func=routes)
+    
+    # Failure summary command
+    failures_parser = subparsers.add_parser('failures', help='Summarize failed checks by reason')
+    failures_parser.add_argument('--days', type=int, default=7, help='How many days back to look')
+    failures_parser.set_defaults(func=failures)
+    
+    # Replay saved failure pages against the offline parser
+    replay_parser = subparsers.add_parser('replay', help='Re-parse pages saved from failed checks')
+    replay_parser.add_argument('--dir', help='Artifact directory (default DEBUG_ARTIFACT_DIR or debug_artifacts)')
+    replay_parser.set_defaults(func=replay_artifacts)
+    
+    # Exchange rate cache
+    fx_parser = subparsers.add_parser('fx', help='Show or refresh cached exchange rates')
+    fx_parser.add_argument('--refresh', action='store_true', help='Download current rates first')
+    fx_parser.add_argument('--url', help='Rate source (default FX_RATES_URL or the ECB daily feed)')
+    fx_parser.set_defaults(func=exchange_rates)
+    
     # Parse arguments
     args = parser.parse_args()
     
@@ -166,6 +343,9 @@ Examples:
         parser.print_help()
         sys.exit(1)
     
+    # Tracker logs go to stderr; only warnings unless LOG_LEVEL says otherwise
+    setup_logging(level=os.getenv('LOG_LEVEL', 'WARNING'), fmt=os.getenv('LOG_FORMAT', 'text'), stream=sys.stderr)
+    
     # Execute command
     args.func(args)
 
@@ -0,0 +1,264 @@
+"""
+Flight Currency - Price parsing, formatting and conversion between currencies
+
+Prices on a results page are read with one compiled regular expression
+that finds every amount in a text together with its currency marker (a
+symbol such as ₹, $ or €, or an ISO code such as AED), so all itineraries
+on a page can be parsed in one pass. Digit grouping and decimal marks are
+worked out per amount: "$1,234.56", "1.234,56 €", "₹1,23,456" and
+"CHF 1'234.50" all read correctly. Amounts without a marker are taken to
+be in DEFAULT_CURRENCY (INR).
+
+Conversions use a cached table of reference rates, data/fx_rates.json
+(or FX_RATES_FILE), written by refresh_rates() from FX_RATES_URL. The
+file is re-read when it changes on disk.
+"""
+
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger('flight_currency')
+
+Money = namedtuple('Money', 'amount currency')
+
+# Rates are units of each currency per one unit of base
+FxRates = namedtuple('FxRates', 'base date rates')
+
+DEFAULT_RATES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'fx_rates.json')
+
+# Euro foreign exchange reference rates, published each working day
+DEFAULT_RATES_URL = 'https://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml'
+
+# Display symbol and number of decimals per ISO code
+CURRENCIES = {
+    'INR': ('₹', 2), 'USD': ('$', 2), 'EUR': ('€', 2), 'GBP': ('£', 2), 'JPY': ('¥', 0),
+    'AED': ('AED ', 2), 'SGD': ('S$', 2), 'AUD': ('A$', 2), 'CAD': ('C$', 2), 'NZD': ('NZ$', 2),
+    'HKD': ('HK$', 2), 'CHF': ('CHF ', 2), 'CNY': ('CN¥', 2), 'KRW': ('₩', 0), 'THB': ('฿', 2),
+    'MYR': ('RM', 2), 'IDR': ('Rp', 0), 'LKR': ('LKR ', 2), 'NPR': ('NPR ', 2), 'BDT': ('৳', 2),
+    'QAR': ('QAR ', 2), 'SAR': ('SAR ', 2), 'OMR': ('OMR ', 3), 'KWD': ('KWD ', 3), 'BHD': ('BHD ', 3),
+    'ZAR': ('R', 2), 'BRL': ('R$', 2), 'MXN': ('MX$', 2), 'SEK': ('SEK ', 2), 'NOK': ('NOK ', 2),
+    'DKK': ('DKK ', 2), 'PLN': ('zł', 2), 'TRY': ('₺', 2), 'PHP': ('₱', 2), 'VND': ('₫', 0),
+}
+
+# Symbols and names seen on result pages; a bare "$" or "¥" is read as USD or JPY
+SYMBOLS = {
+    '₹': 'INR', 'Rs.': 'INR', 'Rs': 'INR', '€': 'EUR', '£': 'GBP', '¥': 'JPY', '￥': 'JPY', '₩': 'KRW',
+    '฿': 'THB', '₺': 'TRY', '₱': 'PHP', '₫': 'VND', '৳': 'BDT', 'zł': 'PLN', '$': 'USD', 'US$': 'USD',
+    'S$': 'SGD', 'A$': 'AUD', 'AU$': 'AUD', 'C$': 'CAD', 'CA$': 'CAD', 'NZ$': 'NZD', 'HK$': 'HKD',
+    'R$': 'BRL', 'MX$': 'MXN', 'CN¥': 'CNY', 'RM': 'MYR', 'Rp': 'IDR',
+}
+
+ISO_CODE_RE = re.compile(r'^[A-Z]{3}$')
+
+# Longest markers first so "US$" wins over "$" and "Rs." over "Rs"
+_MARKER = '|'.join(
+    [re.escape(symbol) if not symbol[0].isalpha() else rf'(?<![A-Za-z]){re.escape(symbol)}(?![A-Za-z])'
+     for symbol in sorted(SYMBOLS, key=len, reverse=True)]
+    + [rf'(?<![A-Za-z])(?:{"|".join(sorted(CURRENCIES))})(?![A-Za-z])']
+)
+# Digits with grouping or decimal marks; a space or apostrophe only groups thousands
+_NUMBER = r"\d+(?:[ \u00a0\u202f']\d{3}(?!\d)|[.,]\d+)*"
+# A match can only start at a digit or a marker's first character; checking that
+# first lets the scan skip ordinary words about three times faster
+_START = '(?=[\\d' + ''.join(sorted({re.escape(marker[0]) for marker in [*SYMBOLS, *CURRENCIES]})) + '])'
+PRICE_RE = re.compile(rf'{_START}(?:(?P<before>{_MARKER})[ \u00a0\u202f]?)?(?P<number>{_NUMBER})'
+                      rf'(?:[ \u00a0\u202f]?(?P<after>{_MARKER}))?')
+_GROUPING_RE = re.compile(r"[ \u00a0\u202f']")
+
+_rates = None
+_rates_mtime = None
+_lock = threading.Lock()
+
+
+def default_currency():
+    """Currency of prices shown without a marker, and of new flights (DEFAULT_CURRENCY)"""
+    return os.getenv('DEFAULT_CURRENCY', 'INR').strip().upper()
+
+
+def _marker_currency(marker):
+    return SYMBOLS.get(marker) or marker
+
+
+def parse_amount(number, currency=None):
+    """Float value of a number as written on a page, e.g. "1,234.56" or "1.234,56"
+
+    With both marks present the last one is the decimal mark. A single mark
+    repeated ("1,23,456") or followed by exactly three digits ("1.234")
+    groups digits, unless the currency has decimals of that length;
+    otherwise it is the decimal mark ("12,50").
+    """
+    number = _GROUPING_RE.sub('', number)
+    dot, comma = number.rfind('.'), number.rfind(',')
+    if dot >= 0 and comma >= 0:
+        decimal = '.' if dot > comma else ','
+        grouping = ',' if decimal == '.' else '.'
+        return float(number.replace(grouping, '').replace(decimal, '.'))
+    mark = '.' if dot >= 0 else ',' if comma >= 0 else None
+    if mark is None:
+        return float(number)
+    decimals = CURRENCIES.get(currency, (None, 2))[1]
+    digits_after = len(number) - number.rfind(mark) - 1
+    if number.count(mark) > 1 or decimals == 0 or (digits_after == 3 and decimals != 3):
+        return float(number.replace(mark, ''))
+    return float(number.replace(mark, '.'))
+
+
+def parse_prices(text):
+    """Every amount in text as Money; currency is None where no marker was found"""
+    prices = []
+    for match in PRICE_RE.finditer(text):
+        marker = match['before'] or match['after']
+        currency = _marker_currency(marker) if marker else None
+        try:
+            prices.append(Money(parse_amount(match['number'], currency), currency))
+        except ValueError:
+            continue
+    return prices
+
+
+def parse_price(text, currency=None):
+    """The first amount in text as Money (bare amounts in currency or DEFAULT_CURRENCY), or None"""
+    prices = parse_prices(text)
+    if not prices:
+        return None
+    marked = [price for price in prices if price.currency]
+    if marked:
+        return marked[0]
+    return Money(prices[0].amount, currency or default_currency())
+
+
+def lowest_price(texts, currency=None):
+    """Cheapest amount across element texts (one per itinerary) as Money, or None
+
+    Amounts with a currency marker are preferred, in the currency of the
+    first one found; bare numbers (in currency or DEFAULT_CURRENCY) only
+    count when no text has a marker, and only from texts holding a single
+    number, so durations and stop counts are not taken for prices.
+    """
+    marked_currency = None
+    lowest = None
+    bare = None
+    for text in texts:
+        prices = parse_prices(text or '')
+        for price in prices:
+            if price.currency:
+                if marked_currency is None:
+                    marked_currency = price.currency
+                if price.currency == marked_currency and (lowest is None or price.amount < lowest):
+                    lowest = price.amount
+        if marked_currency is None and len(prices) == 1 and (bare is None or prices[0].amount < bare):
+            bare = prices[0].amount
+    if lowest is not None:
+        return Money(lowest, marked_currency)
+    if bare is not None:
+        return Money(bare, currency or default_currency())
+    return None
+
+
+def format_money(amount, currency=None):
+    """Amount with its currency symbol and grouping, e.g. ₹4,200 or $1,234.56"""
+    if amount is None:
+        return '-'
+    currency = currency or default_currency()
+    symbol, decimals = CURRENCIES.get(currency, (f'{currency} ', 2))
+    if decimals and amount != int(amount):
+        return f'{symbol}{amount:,.{decimals}f}'
+    return f'{symbol}{amount:,.0f}'
+
+
+def validate_currency(code):
+    """Normalized ISO code; raises ValueError for unknown currencies"""
+    code = (code or '').strip().upper()
+    if not ISO_CODE_RE.match(code):
+        raise ValueError(f"Currencies must be 3-letter ISO codes (got {code!r})")
+    if code not in CURRENCIES and code not in fx_rates().rates:
+        raise ValueError(f"Unknown currency {code}")
+    return code
+
+
+# Exchange rates
+
+def rates_file():
+    return os.getenv('FX_RATES_FILE') or DEFAULT_RATES_FILE
+
+
+def fx_rates():
+    """The process-wide rate table, re-read whenever the file changes; empty if there is none"""
+    global _rates, _rates_mtime
+    path = rates_file()
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        mtime = None
+    if _rates is None or mtime != _rates_mtime:
+        with _lock:
+            if _rates is None or mtime != _rates_mtime:
+                _rates = load_rates(path) if mtime is not None else FxRates('EUR', None, {})
+                _rates_mtime = mtime
+    return _rates
+
+
+def load_rates(path):
+    """Read a rate table written by save_rates"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    base = data['base'].upper()
+    rates = {code.upper(): float(rate) for code, rate in data['rates'].items()}
+    rates[base] = 1.0
+    return FxRates(base, data.get('date'), rates)
+
+
+def save_rates(table, path=None):
+    """Write a rate table atomically, so readers never see half a file"""
+    path = path or rates_file()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.fx_rates-')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({'base': table.base, 'date': table.date, 'rates': table.rates}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def convert(price, currency, rates=None):
+    """price (Money) in another currency, or None if either rate is missing"""
+    if price.currency == currency:
+        return price
+    rates = (rates or fx_rates()).rates
+    if price.currency not in rates or currency not in rates:
+        return None
+    return Money(round(price.amount * rates[currency] / rates[price.currency], 2), currency)
+
+
+def parse_rates(body):
+    """FxRates from an ECB daily reference rate XML document or a {base, date, rates} JSON object"""
+    text = body.decode('utf-8') if isinstance(body, bytes) else body
+    if text.lstrip().startswith('{'):
+        data = json.loads(text)
+        return FxRates(data['base'].upper(), data.get('date'),
+                       {code.upper(): float(rate) for code, rate in data['rates'].items()})
+    date = re.search(r"time=['\"]([\d-]+)['\"]", text)
+    rates = {code: float(rate) for code, rate in
+             re.findall(r"currency=['\"]([A-Z]{3})['\"]\s+rate=['\"]([\d.]+)['\"]", text)}
+    if not rates:
+        raise ValueError("No exchange rates found in the response")
+    return FxRates('EUR', date[1] if date else None, rates)
+
+
+def refresh_rates(url=None, path=None, timeout=30):
+    """Download rates from url (FX_RATES_URL, default the ECB daily feed) into the cache file"""
+    from urllib.request import urlopen
+
+    url = url or os.getenv('FX_RATES_URL') or DEFAULT_RATES_URL
+    start = time.perf_counter()
+    with urlopen(url, timeout=timeout) as response:
+        table = parse_rates(response.read())
+    save_rates(table, path)
+    logger.info("Exchange rates refreshed: %d currencies as of %s", len(table.rates), table.date,
+                extra={'url': url, 'duration_s': round(time.perf_counter() - start, 3)})
+    return table
@@ -0,0 +1,91 @@
+"""
+Flight Email - Price alert message templates and SMTP delivery
+"""
+
+import smtplib
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from html import escape
+from string import Template
+
+from flight_currency import format_money
+
+# Templates are compiled once at import and reused for every message
+SUBJECT_SINGLE = Template('✈️ Price Alert: $origin → $destination')
+SUBJECT_DIGEST = Template('✈️ Price Alert: $count flights dropped below your target')
+
+TEXT_ROW = Template('• $origin → $destination on $date: $current_price (target $target_price, save $savings)')
+TEXT_BODY = Template("""🎉 Great news! Flight prices have dropped!
+
+$rows
+
+Book now before the price goes up!
+
+Happy travels! ✈️
+""")
+
+HTML_ROW = Template(
+    '<tr><td>$origin → $destination</td><td>$date</td>'
+    '<td><strong>$current_price</strong></td><td>$target_price</td><td>$savings</td></tr>'
+)
+HTML_BODY = Template("""<html>
+<body style="font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;">
+<h2 style="color: #667eea;">🎉 Great news! Flight prices have dropped!</h2>
+<table cellpadding="8" style="border-collapse: collapse;">
+<tr><th>Route</th><th>Date</th><th>Current Price</th><th>Your Target</th><th>Savings</th></tr>
+$rows
+</table>
+<p>Book now before the price goes up!</p>
+<p>Happy travels! ✈️</p>
+</body>
+</html>
+""")
+
+
+def _row_fields(alert, quote=str):
+    """Template fields for one alert row"""
+    return {
+        'origin': quote(alert.origin),
+        'destination': quote(alert.destination),
+        'date': quote(alert.departure_date),
+        'current_price': quote(format_money(alert.current_price, alert.currency)),
+        'target_price': quote(format_money(alert.target_price, alert.currency)),
+        'savings': quote(format_money(alert.target_price - alert.current_price, alert.currency)),
+    }
+
+
+def build_alert_message(sender, recipient, alerts):
+    """Build one plain text + HTML message covering all of a recipient's alerts"""
+    if len(alerts) == 1:
+        subject = SUBJECT_SINGLE.substitute(origin=alerts[0].origin, destination=alerts[0].destination)
+    else:
+        subject = SUBJECT_DIGEST.substitute(count=len(alerts))
+
+    text_rows = '\n'.join(TEXT_ROW.substitute(_row_fields(a)) for a in alerts)
+    html_rows = '\n'.join(HTML_ROW.substitute(_row_fields(a, escape)) for a in alerts)
+
+    msg = MIMEMultipart('alternative')
+    msg['From'] = sender
+    msg['To'] = recipient
+    msg['Subject'] = subject
+    msg.attach(MIMEText(TEXT_BODY.substitute(rows=text_rows), 'plain', 'utf-8'))
+    msg.attach(MIMEText(HTML_BODY.substitute(rows=html_rows), 'html', 'utf-8'))
+    return msg
+
+
+def send_messages(smtp_server, smtp_port, username, password, messages, starttls=True):
+    """Send messages over a single SMTP connection; return the number sent"""
+    if not messages:
+        return 0
+
+    server = smtplib.SMTP(smtp_server, smtp_port)
+    try:
+        if starttls:
+            server.starttls()
+        server.login(username, password)
+        for msg in messages:
+            server.send_message(msg)
+    finally:
+        server.quit()
+
+    return len(messages)
@@ -0,0 +1,119 @@
+"""
+Flight Events - Price and alert events, fanned out to live dashboards
+
+record_price writes an events row in the same transaction as the price, so
+events from the scheduler process and the web app land in one place. Each
+web worker runs a single EventBroker thread that polls the table by
+primary key while anyone is subscribed and hands new rows to every open
+stream. Many dashboards therefore cost one cheap query per poll interval,
+not one each.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from flight_metrics import SSE_STREAMS
+
+logger = logging.getLogger('flight_events')
+
+# Event kinds
+PRICE = 'price'
+ALERT = 'alert'
+
+Event = namedtuple('Event', 'id kind flight_id payload created_at')
+
+# Returned by Subscription.get when the subscriber fell behind and missed events
+OVERFLOW = object()
+
+
+def format_sse(event):
+    """One Server-Sent Events message for event"""
+    data = dict(event.payload, flight_id=event.flight_id)
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {json.dumps(data)}\n\n"
+
+
+class Subscription:
+    """A bounded queue of events for one open stream"""
+
+    def __init__(self, queue_size):
+        self._queue = queue.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Next event, OVERFLOW, or None if nothing arrived within timeout"""
+        if self.overflowed:
+            return OVERFLOW
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroker:
+    """In-process pub/sub fed by polling the events table
+
+    get_tracker returns this process's FlightTracker. The polling thread
+    starts with the first subscriber and exits when the last one leaves.
+    After a fork the child starts over with no subscribers or thread.
+    """
+
+    def __init__(self, get_tracker, poll_interval=1.0, max_subscribers=12, queue_size=100):
+        self.get_tracker = get_tracker
+        self.poll_interval = poll_interval
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._thread = None
+        self._last_id = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        """A new Subscription, or None when this process already serves max_subscribers streams"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._subscribers, self._thread, self._pid = set(), None, os.getpid()
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscription = Subscription(self.queue_size)
+            self._subscribers.add(subscription)
+            SSE_STREAMS.set(len(self._subscribers))
+            if self._thread is None or not self._thread.is_alive():
+                self._last_id = self.get_tracker().get_last_event_id()
+                self._thread = threading.Thread(target=self._poll_loop, name='event-broker', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            SSE_STREAMS.set(len(self._subscribers))
+
+    def _poll_loop(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                subscribers = list(self._subscribers)
+                if not subscribers:
+                    self._thread = None
+                    return
+            try:
+                events = self.get_tracker().get_events(self._last_id)
+            except Exception as e:
+                logger.warning("Could not read events: %s", e)
+                continue
+            for event in events:
+                for subscription in subscribers:
+                    subscription.put(event)
+                self._last_id = event.id
@@ -0,0 +1,120 @@
+"""
+Flight HTTP - Conditional GET, response compression and rendered-output caches
+
+Pages are tagged with a weak ETag made from the database's data version
+(bumped by triggers on flights and price_history) and a hash of the
+templates, so a repeat load with If-None-Match costs one single-row
+query. Rendered pages and their gzip/brotli encodings are kept in small
+per-process LRU caches keyed by that ETag, and flight cards are cached
+individually so one changed flight does not re-render the rest.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flight_metrics import HTTP_CACHE_TOTAL
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent as-is
+MIN_COMPRESS_BYTES = 512
+COMPRESSIBLE_TYPES = frozenset({'text/html', 'text/plain', 'text/css', 'application/json', 'application/javascript'})
+
+
+class LRUCache:
+    """Thread-safe mapping that drops the least recently used entry beyond max_entries"""
+
+    def __init__(self, name, max_entries=256):
+        self.name = name
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+        HTTP_CACHE_TOTAL.labels(cache=self.name, outcome='hit' if value is not None else 'miss').inc()
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def get_or_create(self, key, create):
+        value = self.get(key)
+        if value is None:
+            value = create()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def template_token(template_dir):
+    """Short hash of every template's content; changes when a deploy changes the markup"""
+    digest = hashlib.blake2b(digest_size=6)
+    for root, _, files in sorted(os.walk(template_dir)):
+        for name in sorted(files):
+            digest.update(name.encode())
+            with open(os.path.join(root, name), 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def choose_encoding(accept_encoding):
+    """Best encoding the client accepts ('br', 'gzip') or None"""
+    if brotli is not None and accept_encoding['br']:
+        return 'br'
+    if accept_encoding['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding, cached=False):
+    """Encode body; output that will be cached is worth the slowest, smallest setting"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=11 if cached else 5)
+    return gzip.compress(body, compresslevel=9 if cached else 6, mtime=0)
+
+
+def compress_response(response, accept_encoding, cache, cache_key=None):
+    """Compress a finished response in place when the client and content allow it
+
+    With cache_key (the page's ETag) the encoded body is reused across
+    requests, so a cached page is compressed once per encoding.
+    """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_BYTES:
+        return response
+
+    if cache_key is None:
+        encoded = compress(body, encoding)
+    else:
+        encoded = cache.get_or_create((cache_key, encoding), lambda: compress(body, encoding, cached=True))
+    response.set_data(encoded)
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,169 @@
+"""
+Flight Logging - Structured, leveled logging with a non-blocking queue handler
+
+Log calls only enqueue the record; a background listener thread formats it
+(JSON by default) and writes it to stdout. Context fields such as cycle_id,
+check_id or request_id are attached to every record logged while they are
+bound, so all lines belonging to one check can be correlated.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+_context = contextvars.ContextVar('flight_log_context', default={})
+
+# Attributes present on every LogRecord; anything else came from extra=
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_queue = None
+_queue_handler = None
+_formatter = None
+_stream = None
+
+
+def new_id():
+    """Short random correlation id"""
+    return os.urandom(6).hex()
+
+
+def bind(**fields):
+    """Add fields to the logging context; returns a token for unbind()"""
+    return _context.set({**_context.get(), **fields})
+
+
+def unbind(token):
+    """Restore the logging context from before bind()"""
+    _context.reset(token)
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach fields to every record logged inside the with-block"""
+    token = bind(**fields)
+    try:
+        yield
+    finally:
+        unbind(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copies the bound context onto each record before it is queued"""
+
+    def filter(self, record):
+        record.context = _context.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        doc = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        doc.update(getattr(record, 'context', {}))
+        for key, value in vars(record).items():
+            if key not in _RESERVED and key != 'context':
+                doc[key] = value
+        if record.exc_info:
+            doc['exc'] = self.formatException(record.exc_info)
+        return json.dumps(doc, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines with context fields appended"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s', '%H:%M:%S')
+
+    def format(self, record):
+        line = super().format(record)
+        context = getattr(record, 'context', {})
+        if context:
+            line += ' [' + ' '.join(f'{k}={v}' for k, v in context.items()) + ']'
+        return line
+
+
+def _in_process_queue_handler(log_queue):
+    """QueueHandler that skips pre-formatting; the queue never leaves the process"""
+    import logging.handlers
+
+    class InProcessQueueHandler(logging.handlers.QueueHandler):
+        def prepare(self, record):
+            record.msg = record.getMessage()
+            record.args = None
+            return record
+
+    return InProcessQueueHandler(log_queue)
+
+
+def _start_listener(stream):
+    """Start the background thread that drains the log queue"""
+    import logging.handlers
+    global _listener
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(_formatter)
+    _listener = logging.handlers.QueueListener(_queue, handler, respect_handler_level=False)
+    _listener.start()
+
+
+def _restart_after_fork():
+    """Threads do not survive fork(); give the child its own listener"""
+    global _queue
+    if _listener is None:
+        return
+    _queue = queue.SimpleQueue()
+    _queue_handler.queue = _queue
+    _start_listener(_stream)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging(level=None, fmt=None, stream=None):
+    """Configure the root logger once per process
+
+    LOG_LEVEL (default INFO) and LOG_FORMAT (json or text, default json)
+    environment variables are used when arguments are not given.
+    """
+    global _queue, _queue_handler, _formatter, _stream
+
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    fmt = (fmt or os.getenv('LOG_FORMAT', 'json')).lower()
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _listener is not None:
+        return root
+
+    _formatter = TextFormatter() if fmt == 'text' else JsonFormatter()
+    _stream = stream or sys.stdout
+    _queue = queue.SimpleQueue()
+    _queue_handler = _in_process_queue_handler(_queue)
+    _queue_handler.addFilter(ContextFilter())
+
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+
+    _start_listener(_stream)
+    atexit.register(shutdown_logging)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_after_fork)
+    return root
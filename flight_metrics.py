@@ -0,0 +1,270 @@
+"""
+Flight Metrics - Prometheus-style counters, gauges and histograms
+
+Metrics live in a process-wide registry and are rendered in the Prometheus
+text exposition format, either by the Flask /metrics endpoint or by the
+scheduler's standalone metrics server.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _escape(value):
+    """Escape a label value for the exposition format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=None):
+    """Render a {name="value",...} label set"""
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+class _Metric:
+    """Base class for labelled metrics"""
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, **labels):
+        """Return the child metric for a label set"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        """Child used when the metric has no labels"""
+        return self.labels()
+
+    def collect(self):
+        """Yield exposition lines for this metric"""
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.kind}'
+        for key, child in sorted(self._children.items()):
+            yield from child.samples(self.name, self.labelnames, key)
+
+
+class _Value:
+    """A single thread-safe float"""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        with self._lock:
+            self.value = float(value)
+
+    def samples(self, name, labelnames, key):
+        yield f'{name}{_format_labels(labelnames, key)} {self.value}'
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+
+class _HistogramValue:
+    """Bucketed observations for one label set"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        """Observe the wall time of the with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self, name, labelnames, key):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{_format_labels(labelnames, key, ("le", bound))} {cumulative}'
+        yield f'{name}_bucket{_format_labels(labelnames, key, ("le", "+Inf"))} {self.count}'
+        yield f'{name}_sum{_format_labels(labelnames, key)} {self.sum}'
+        yield f'{name}_count{_format_labels(labelnames, key)} {self.count}'
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (typically latencies in seconds)"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self):
+        """Render all metrics in the Prometheus text format"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Scraping
+SCRAPE_SECONDS = Histogram(
+    'flight_scrape_seconds', 'Time spent locating a price, per provider and selector',
+    ['provider', 'selector', 'outcome'])
+DRIVER_STARTUP_SECONDS = Histogram(
+    'flight_driver_startup_seconds', 'Time to start a Chrome driver')
+CHECKS_TOTAL = Counter(
+    'flight_checks_total', 'Price checks by provider and result', ['provider', 'result'])
+CHECK_SECONDS = Histogram(
+    'flight_check_seconds', 'End-to-end duration of a price check', ['provider'])
+BREAKER_STATE = Gauge(
+    'flight_breaker_state', 'Circuit breaker state per provider (0 closed, 1 half-open, 2 open)', ['provider'])
+BROWSER_TABS = Gauge(
+    'flight_browser_tabs', 'Tabs with a search in flight, and the current tab limit', ['state'])
+BROWSER_RSS_BYTES = Gauge(
+    'flight_browser_rss_bytes', 'Resident memory of the multiplexed browser process tree')
+SEARCH_RSS_BYTES = Gauge(
+    'flight_search_rss_bytes', 'Estimated browser memory per in-flight search')
+PRICES_SCREENED_TOTAL = Counter(
+    'flight_prices_screened_total', 'Found prices by outlier screening outcome '
+    '(accepted, confirmed, quarantined, rejected)', ['provider', 'outcome'])
+CHECK_FAILURE_SECONDS = Counter(
+    'flight_check_failure_seconds', 'Scrape time spent on checks that failed, by reason', ['reason'])
+DEBUG_ARTIFACTS_TOTAL = Counter(
+    'flight_debug_artifacts_total', 'Debug captures of failed scrapes by outcome', ['outcome'])
+PAGE_READY_SECONDS = Histogram(
+    'flight_page_ready_seconds', 'Time from navigation until a price was found', ['provider', 'profile'])
+PAGE_BYTES = Histogram(
+    'flight_page_bytes', 'Bytes transferred per results page load', ['provider', 'profile'],
+    buckets=(16384, 65536, 262144, 524288, 1048576, 2097152, 4194304, 8388608, 16777216))
+
+# Storage and email
+DB_QUERY_SECONDS = Histogram(
+    'flight_db_query_seconds', 'SQLite query latency by operation', ['operation'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+EMAIL_SEND_SECONDS = Histogram(
+    'flight_email_send_seconds', 'Time to deliver a batch of alert emails over SMTP')
+EMAILS_SENT_TOTAL = Counter(
+    'flight_emails_sent_total', 'Alert emails by result', ['result'])
+
+# Scheduler and web
+QUEUE_DEPTH = Gauge(
+    'flight_queue_depth', 'Items waiting to be processed', ['queue'])
+CYCLE_SECONDS = Histogram(
+    'flight_cycle_seconds', 'Duration of a full scheduler check cycle',
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200, 3600))
+HTTP_REQUEST_SECONDS = Histogram(
+    'flight_http_request_seconds', 'Flask request latency by endpoint and status', ['endpoint', 'status'])
+SSE_STREAMS = Gauge(
+    'flight_sse_streams', 'Open live-update (Server-Sent Events) streams in this process')
+HTTP_CACHE_TOTAL = Counter(
+    'flight_http_cache_total', 'Page, card and compressed-body cache lookups by outcome', ['cache', 'outcome'])
+
+
+def start_metrics_server(port, host='0.0.0.0'):
+    """Serve /metrics from a daemon thread; returns the server"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    return server
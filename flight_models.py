@@ -0,0 +1,62 @@
+"""
+Flight Models - Typed records for flights and price observations
+
+Rows are namedtuples: fields by name, no per-instance __dict__, the same
+footprint as the plain tuples sqlite3 returns, and still hashable (the
+web app caches flight cards by row). Queries name their columns, so adding
+a column to a table does not shift any field. A Flight is one subscriber's
+view of a search: the route and date come from the shared searches and
+routes tables. Prices and targets carry the currency they are in.
+
+A flight's status is its place in the lifecycle: active flights are
+checked; paused ones are kept but skipped until resumed; departed ones
+(departure date past) are no longer checked; and archived ones, departed
+ARCHIVE_AFTER_DAYS ago, are left out of listings.
+"""
+
+import json
+from collections import namedtuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Flight lifecycle states
+ACTIVE = 'active'
+PAUSED = 'paused'
+DEPARTED = 'departed'
+ARCHIVED = 'archived'
+FLIGHT_STATES = (ACTIVE, PAUSED, DEPARTED, ARCHIVED)
+
+# States shown by listings unless archived flights are asked for
+LISTED_STATES = (ACTIVE, PAUSED, DEPARTED)
+
+PRICE_OBSERVATION_COLUMNS = 'price, checked_at, currency'
+
+Flight = namedtuple('Flight', 'id origin destination departure_date email target_price created_at search_id '
+                               'currency status')
+PriceObservation = namedtuple('PriceObservation', PRICE_OBSERVATION_COLUMNS.replace(',', ''))
+
+
+def fetch_records(record, cursor):
+    """Build record (a namedtuple) from every remaining row of cursor
+
+    Mapping record._make over the cursor runs in C; a sqlite3 row_factory
+    would call back into Python for each row and is about a third slower.
+    """
+    return list(map(record._make, cursor))
+
+
+def fetch_record(record, cursor):
+    """The next row of cursor as record, or None"""
+    row = cursor.fetchone()
+    return record._make(row) if row is not None else None
+
+
+def dumps(records):
+    """JSON array of objects (as bytes) for a list of records; uses orjson when installed"""
+    objects = [record._asdict() for record in records]
+    if orjson is not None:
+        return orjson.dumps(objects)
+    return json.dumps(objects, separators=(',', ':')).encode('ascii')
@@ -0,0 +1,166 @@
+"""
+Flight Outliers - Screens each new price against its route's recent prices
+
+A mis-read number (a "1" from a badge, a fare from an ad) would otherwise be
+stored and could fire a false alert. Every found price is compared with the
+median of the search's recent accepted prices in the same currency, in units
+of the median absolute deviation (MAD, scaled to match a standard
+deviation). Prices within OUTLIER_THRESHOLD deviations are accepted. An
+outlier is held back: nothing is stored or alerted, and the check fails
+with reason 'outlier' so the flight is re-checked. If the re-check finds the
+same price again, it is a real change: it is confirmed and stored, and the
+window starts over from it. A price more than OUTLIER_MAX_RATIO times off the median is
+rejected, and has to be seen OUTLIER_REJECT_CONFIRMATIONS times in a row
+before it is confirmed, so a collapsed fare still gets through.
+
+Windows live in memory, one per search (route and departure date) and
+currency and per database. They are seeded from price_history the first
+time a search is seen. Set OUTLIER_THRESHOLD=0 to accept every price.
+"""
+
+import bisect
+import os
+import threading
+from collections import deque, namedtuple
+
+# Outcomes of screening a price
+ACCEPTED = 'accepted'
+CONFIRMED = 'confirmed'
+QUARANTINED = 'quarantined'
+REJECTED = 'rejected'
+
+# Outcomes for which the price is neither stored nor alerted on
+HELD_BACK = frozenset({QUARANTINED, REJECTED})
+
+# Scales the MAD of normally distributed prices to their standard deviation
+MAD_SCALE = 1.4826
+
+# deviation is in MADs from median; both are None while the window is warming up
+Verdict = namedtuple('Verdict', 'outcome median deviation')
+
+
+class RouteWindow:
+    """The last size accepted prices of a search, kept in arrival order and sorted"""
+
+    __slots__ = ('recent', 'ordered')
+
+    def __init__(self, size):
+        self.recent = deque(maxlen=size)
+        self.ordered = []
+
+    def add(self, price):
+        if len(self.recent) == self.recent.maxlen:
+            del self.ordered[bisect.bisect_left(self.ordered, self.recent[0])]
+        self.recent.append(price)
+        bisect.insort(self.ordered, price)
+
+    def __len__(self):
+        return len(self.ordered)
+
+    def median(self):
+        middle = len(self.ordered) // 2
+        if len(self.ordered) % 2:
+            return self.ordered[middle]
+        return (self.ordered[middle - 1] + self.ordered[middle]) / 2
+
+    def mad(self, median):
+        """Median absolute deviation from median"""
+        deviations = sorted(abs(price - median) for price in self.ordered)
+        middle = len(deviations) // 2
+        if len(deviations) % 2:
+            return deviations[middle]
+        return (deviations[middle - 1] + deviations[middle]) / 2
+
+
+class PriceScreen:
+    """Per-search price windows and the outliers waiting for a re-check"""
+
+    def __init__(self, threshold=5.0, window=50, min_samples=5, max_ratio=4.0, min_spread_pct=3.0,
+                 confirm_pct=2.0, reject_confirmations=3):
+        self.threshold = threshold
+        self.window = window
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        # Floor for the spread, so a route whose price never moved does not flag every small change
+        self.min_spread_pct = min_spread_pct
+        self.confirm_pct = confirm_pct
+        # Consistent sightings that confirm a price beyond max_ratio (a quarantined one needs 2)
+        self.reject_confirmations = reject_confirmations
+        self.windows = {}
+        # {key: (held-back price, times seen)}, until re-checks confirm or replace it
+        self.pending = {}
+        self._lock = threading.Lock()
+
+    def check(self, key, price, history=None):
+        """Screen price for a search; returns a Verdict
+
+        key is any hashable key for the search and currency, e.g.
+        (search_id, currency). history is called for the search's recent
+        prices (newest first) the first time the key is seen.
+        """
+        if not self.threshold:
+            return Verdict(ACCEPTED, None, None)
+
+        window = self.windows.get(key)
+        if window is None:
+            recent = list(history()) if history else []
+            with self._lock:
+                window = self.windows.get(key)
+                if window is None:
+                    window = RouteWindow(self.window)
+                    for seen in reversed(recent[:self.window]):
+                        window.add(seen)
+                    self.windows[key] = window
+
+        with self._lock:
+            if len(window) < self.min_samples:
+                window.add(price)
+                self.pending.pop(key, None)
+                return Verdict(ACCEPTED, None, None)
+
+            median = window.median()
+            spread = max(MAD_SCALE * window.mad(median), abs(median) * self.min_spread_pct / 100) or 1.0
+            deviation = round(abs(price - median) / spread, 2)
+            if deviation <= self.threshold:
+                window.add(price)
+                self.pending.pop(key, None)
+                return Verdict(ACCEPTED, median, deviation)
+
+            extreme = price <= 0 or median <= 0 or not 1 / self.max_ratio <= price / median <= self.max_ratio
+            previous, seen = self.pending.get(key, (None, 0))
+            if previous is None or abs(price - previous) > previous * self.confirm_pct / 100:
+                seen = 0
+            seen += 1
+            if price > 0 and seen >= (self.reject_confirmations if extreme else 2):
+                # The fare has moved to a new level: screen later prices against it, not the old one
+                del self.pending[key]
+                self.windows[key] = RouteWindow(self.window)
+                self.windows[key].add(price)
+                return Verdict(CONFIRMED, median, deviation)
+
+            self.pending[key] = (price, seen)
+            return Verdict(REJECTED if extreme else QUARANTINED, median, deviation)
+
+
+_screens = {}
+_screens_lock = threading.Lock()
+
+
+def price_screen(location):
+    """The process-wide screen for a database, configured from the environment"""
+    screen = _screens.get(location)
+    if screen is None:
+        with _screens_lock:
+            screen = _screens.get(location)
+            if screen is None:
+                screen = PriceScreen(
+                    threshold=float(os.getenv('OUTLIER_THRESHOLD', 5)),
+                    window=int(os.getenv('OUTLIER_WINDOW', 50)),
+                    min_samples=int(os.getenv('OUTLIER_MIN_SAMPLES', 5)),
+                    max_ratio=float(os.getenv('OUTLIER_MAX_RATIO', 4)),
+                    min_spread_pct=float(os.getenv('OUTLIER_MIN_SPREAD_PCT', 3)),
+                    confirm_pct=float(os.getenv('OUTLIER_CONFIRM_PCT', 2)),
+                    reject_confirmations=int(os.getenv('OUTLIER_REJECT_CONFIRMATIONS', 3)),
+                )
+                _screens[location] = screen
+    return screen
@@ -0,0 +1,218 @@
+"""
+Flight Profiling - Opt-in CPU and memory profiles of a scheduler cycle or a web request
+
+Spans (flight_tracing) show which stage of a check is slow; a profile shows
+which functions inside it take the time. Profiles are written to a local
+directory, one set of files per cycle or request:
+
+- cprofile: every call, deterministically. <name>.prof is pstats data
+  for python -m pstats, snakeviz or gprof2dot. Slows call-heavy code.
+- sample: a background thread records the stacks every
+  PROFILE_SAMPLE_MS (default 5). <name>.sample.folded holds collapsed
+  stacks weighted in microseconds of wall time, for speedscope or
+  flamegraph.pl. Cheap, and shows time spent waiting on the browser,
+  the database or SMTP, which cprofile attributes to a few C calls.
+- memory: tracemalloc snapshots before and after.
+  <name>.before.snapshot and <name>.after.snapshot load with
+  tracemalloc.Snapshot.load; <name>.memory.txt lists the lines whose
+  allocations grew most.
+
+Only one profile runs at a time in a process; cProfile and tracemalloc
+are process-wide.
+"""
+
+import cProfile
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+
+
+class CallProfiler:
+    """cProfile over the with-block's thread"""
+
+    suffix = '.prof'
+
+    def __init__(self, all_threads=False):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def dump(self, base):
+        self.profile.dump_stats(base + self.suffix)
+        return base + self.suffix
+
+
+class StackSampler:
+    """Samples stacks from a background thread; the profiled thread only, or all_threads"""
+
+    suffix = '.sample.folded'
+
+    def __init__(self, all_threads=False, interval=None):
+        self.all_threads = all_threads
+        self.interval = (interval or float(os.getenv('PROFILE_SAMPLE_MS', 5))) / 1000
+        self.stacks = defaultdict(int)
+        self.samples = 0
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        names = {}
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            # Each sample stands for the wall time since the previous one
+            weight = int((now - last) * 1e6)
+            last = now
+            frames = sys._current_frames()
+            if self.all_threads:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                targets = [ident for ident in frames if ident != threading.get_ident()]
+            else:
+                targets = [self._thread_id] if self._thread_id in frames else []
+            for ident in targets:
+                stack = self._stack(frames[ident])
+                if self.all_threads:
+                    stack.insert(0, names.get(ident, f'thread-{ident}'))
+                self.stacks[';'.join(stack)] += weight
+            self.samples += 1
+
+    @staticmethod
+    def _stack(frame):
+        """Frames of a stack, outermost first"""
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def dump(self, base):
+        with open(base + self.suffix, 'w') as f:
+            f.write(''.join(f'{stack} {us}\n' for stack, us in self.stacks.items() if us))
+        return base + self.suffix
+
+
+class MemorySnapshots:
+    """tracemalloc snapshots taken before and after the with-block"""
+
+    suffix = '.memory.txt'
+
+    def __init__(self, all_threads=False, frames=None, top=30):
+        self.frames = frames or int(os.getenv('PROFILE_MEMORY_FRAMES', 10))
+        self.top = top
+        self.before = self.after = self.peak = None
+        self._started = False
+
+    def start(self):
+        # Leave tracing on afterwards if something else (e.g. PYTHONTRACEMALLOC) started it
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started = True
+        tracemalloc.reset_peak()
+        self.before = tracemalloc.take_snapshot()
+
+    def stop(self):
+        self.after = tracemalloc.take_snapshot()
+        self.peak = tracemalloc.get_traced_memory()[1]
+        if self._started:
+            tracemalloc.stop()
+
+    def dump(self, base):
+        self.before.dump(base + '.before.snapshot')
+        self.after.dump(base + '.after.snapshot')
+        growth = self.after.compare_to(self.before, 'lineno')
+        with open(base + self.suffix, 'w') as f:
+            f.write(f'# Traced memory: {_kib(self._total(self.before))} before, '
+                    f'{_kib(self._total(self.after))} after, {_kib(self.peak)} peak\n')
+            f.write(f'# Top {self.top} lines by growth\n')
+            for stat in growth[:self.top]:
+                f.write(f'{stat}\n')
+        return base + self.suffix
+
+    @staticmethod
+    def _total(snapshot):
+        return sum(stat.size for stat in snapshot.statistics('filename'))
+
+
+def _kib(size):
+    return f'{size / 1024:,.1f} KiB'
+
+
+PROFILERS = {'cprofile': CallProfiler, 'sample': StackSampler, 'memory': MemorySnapshots}
+
+
+def parse_modes(value):
+    """Profile modes from a comma-separated string such as "cprofile,memory"; raises ValueError for unknown ones"""
+    modes = tuple(mode.strip().lower() for mode in (value or '').split(',') if mode.strip())
+    unknown = [mode for mode in modes if mode not in PROFILERS]
+    if unknown:
+        raise ValueError(f"Unknown profile mode {', '.join(unknown)}; expected {', '.join(PROFILERS)}")
+    return modes
+
+
+def start(modes, all_threads=False):
+    """Start profilers for modes; returns them, or None if another profile is running"""
+    if not _lock.acquire(blocking=False):
+        return None
+    profilers = []
+    try:
+        for mode in modes:
+            profiler = PROFILERS[mode](all_threads=all_threads)
+            profiler.start()
+            profilers.append(profiler)
+    except BaseException:
+        _stop(profilers)
+        raise
+    return profilers
+
+
+def _stop(profilers):
+    try:
+        for profiler in reversed(profilers):
+            profiler.stop()
+    finally:
+        _lock.release()
+
+
+def finish(profilers, directory=None, name=None):
+    """Stop profilers and write their files as directory/name.*; returns the paths (none if no directory)"""
+    _stop(profilers)
+    if directory is None:
+        return []
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, name)
+    return [profiler.dump(base) for profiler in profilers]
+
+
+@contextmanager
+def profiling(modes, directory, name, all_threads=False):
+    """Profile the with-block in each mode; yields the list the written paths are added to"""
+    paths = []
+    profilers = start(modes, all_threads) if modes else []
+    if profilers is None:
+        raise RuntimeError("Another profile is running in this process")
+    try:
+        yield paths
+    finally:
+        if profilers:
+            paths.extend(finish(profilers, directory, name))
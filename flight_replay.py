@@ -0,0 +1,287 @@
+"""
+Flight Replay - Record search result pages, and replay them in place of Chrome
+
+Tuning cycle concurrency, extraction or alerting against the live site is
+slow and never gives the same pages twice. With PROVIDER_MODE=record,
+every search page a check loads is saved to PROVIDER_SNAPSHOT_DIR. The
+snapshot holds its HTML, its page stats and how long the price took to
+show. With PROVIDER_MODE=replay, checks get a ReplayDriver instead of a
+browser. It serves the recorded pages in recording order for each
+search, and takes the recorded load time divided by REPLAY_SPEED (0: no
+waiting). A cycle can then be re-run offline on identical input, e.g. to
+compare SCRAPER_TABS settings or a new selector.
+
+Snapshots are keyed by the search URL's path and query, so a replay is
+independent of FLIGHTS_BASE_URL. Searches that were never recorded load
+as an empty page, i.e. no price.
+"""
+
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+logger = logging.getLogger('flight_replay')
+
+# PROVIDER_MODE values
+LIVE = 'live'
+RECORD = 'record'
+REPLAY = 'replay'
+PROVIDER_MODES = (LIVE, RECORD, REPLAY)
+
+INDEX_FILE = 'index.jsonl'
+
+EMPTY_PAGE = '<html><head></head><body></body></html>'
+
+# What POLL_SCRIPT counts as a price-bearing text
+_DIGIT_RE = re.compile('[0-9]')
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def provider_mode():
+    """PROVIDER_MODE: live (default), record or replay; raises ValueError for anything else"""
+    mode = os.getenv('PROVIDER_MODE', LIVE).strip().lower() or LIVE
+    if mode not in PROVIDER_MODES:
+        raise ValueError(f"PROVIDER_MODE must be one of {', '.join(PROVIDER_MODES)} (got {mode!r})")
+    return mode
+
+
+def snapshot_key(url):
+    """Search identity of a URL: its path and query, without scheme and host"""
+    parts = urlsplit(url)
+    return f'{parts.path}?{parts.query}' if parts.query else parts.path
+
+
+class SnapshotStore:
+    """Recorded search pages in one directory: index.jsonl plus one HTML file each"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._entries = None
+        self._queues = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def record(self, url, html, load_seconds, price=None, selector=None, stats=None, error=None):
+        """Save a loaded page; price is a flight_currency.Money or None. Returns the snapshot id"""
+        snapshot_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._ids)}"
+        entry = {
+            'id': snapshot_id,
+            'key': snapshot_key(url),
+            'url': url,
+            'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'load_seconds': round(load_seconds, 3),
+            'price': price.amount if price else None,
+            'currency': price.currency if price else None,
+            'selector': selector,
+            'error': error,
+            'stats': stats or {},
+            'html': f'{snapshot_id}.html',
+        }
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, entry['html']), 'w', encoding='utf-8') as f:
+                f.write(html or '')
+            with open(os.path.join(self.directory, INDEX_FILE), 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+            if self._entries is not None:
+                self._entries.append(entry)
+                self._queues = None
+        logger.debug("Snapshot recorded", extra={'snapshot': snapshot_id, 'key': entry['key']})
+        return snapshot_id
+
+    def entries(self):
+        """Recorded snapshots, oldest first"""
+        with self._lock:
+            return list(self._load())
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = []
+            try:
+                with open(os.path.join(self.directory, INDEX_FILE)) as f:
+                    self._entries = [json.loads(line) for line in f if line.strip()]
+            except (OSError, ValueError):
+                pass
+        return self._entries
+
+    def next_snapshot(self, url):
+        """The next recording of url's search, in recording order; the last one repeats. None if never recorded"""
+        key = snapshot_key(url)
+        with self._lock:
+            if self._queues is None:
+                self._queues = {}
+                for entry in self._load():
+                    self._queues.setdefault(entry['key'], [[], 0])[0].append(entry)
+            queue = self._queues.get(key)
+            if queue is None:
+                return None
+            recordings, position = queue
+            queue[1] = min(position + 1, len(recordings) - 1)
+            return recordings[position]
+
+    def rewind(self):
+        """Start every search's recordings from the first again"""
+        with self._lock:
+            self._queues = None
+
+    def read_html(self, entry):
+        try:
+            with open(os.path.join(self.directory, entry['html']), encoding='utf-8') as f:
+                return f.read()
+        except OSError as e:
+            logger.warning("Snapshot page missing: %s", e, extra={'snapshot': entry['id']})
+            return EMPTY_PAGE
+
+
+def snapshot_store(directory=None):
+    """The process-wide store for directory (default PROVIDER_SNAPSHOT_DIR or snapshots)"""
+    directory = os.path.abspath(directory or os.getenv('PROVIDER_SNAPSHOT_DIR', 'snapshots'))
+    with _stores_lock:
+        store = _stores.get(directory)
+        if store is None:
+            store = _stores[directory] = SnapshotStore(directory)
+        return store
+
+
+class _Element:
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class _Page:
+    """A replayed page in one tab"""
+
+    __slots__ = ('url', 'snapshot', 'html', 'ready_at', '_texts')
+
+    def __init__(self, url, snapshot, html, ready_at):
+        self.url = url
+        self.snapshot = snapshot
+        self.html = html
+        self.ready_at = ready_at
+        self._texts = {}
+
+    def texts(self, selectors):
+        """Element texts for each selector, parsing the page once for all selectors not seen yet"""
+        from flight_scraper import selector_texts
+
+        missing = [selector for selector in selectors if selector not in self._texts]
+        if missing:
+            self._texts.update(zip(missing, selector_texts(self.html, missing)))
+        return [self._texts[selector] for selector in selectors]
+
+
+class _SwitchTo:
+    def __init__(self, driver):
+        self._driver = driver
+
+    def window(self, handle):
+        if handle not in self._driver.pages:
+            raise RuntimeError(f"No such window: {handle}")
+        self._driver.current_window_handle = handle
+
+    def new_window(self, type_hint=None):
+        handle = f'replay-{next(self._driver._handles)}'
+        self._driver.pages[handle] = None
+        self._driver.current_window_handle = handle
+
+
+class ReplayDriver:
+    """Stands in for Selenium's Chrome driver, serving pages from a SnapshotStore
+
+    Covers what FlightTracker and TabPool use: get, find_element,
+    execute_script for their own scripts, tabs, page_source and quit. A
+    page with a price becomes ready after its recorded load time divided by
+    speed. A page without one is ready at once, and the tracker's own
+    timeouts then decide how long is spent on it.
+    """
+
+    def __init__(self, store, speed=1.0):
+        self.store = store
+        self.speed = speed
+        self.pages = {'replay-0': None}
+        self.current_window_handle = 'replay-0'
+        self.switch_to = _SwitchTo(self)
+        self._handles = itertools.count(1)
+
+    @property
+    def page(self):
+        return self.pages[self.current_window_handle]
+
+    @property
+    def window_handles(self):
+        return list(self.pages)
+
+    @property
+    def current_url(self):
+        return self.page.url if self.page else 'about:blank'
+
+    @property
+    def page_source(self):
+        return self.page.html if self.page else EMPTY_PAGE
+
+    def _load(self, url):
+        """Open url's next recording in the current tab; returns seconds until it is ready"""
+        snapshot = self.store.next_snapshot(url)
+        if snapshot is None:
+            logger.warning("No snapshot recorded for %s", snapshot_key(url))
+            html, delay = EMPTY_PAGE, 0.0
+        else:
+            html = self.store.read_html(snapshot)
+            found = snapshot.get('price') is not None
+            delay = snapshot['load_seconds'] / self.speed if found and self.speed else 0.0
+        self.pages[self.current_window_handle] = _Page(url, snapshot, html, time.perf_counter() + delay)
+        return delay
+
+    def get(self, url):
+        time.sleep(self._load(url))
+
+    def find_element(self, by, selector):
+        from selenium.common.exceptions import NoSuchElementException
+
+        texts = self.page.texts([selector])[0] if self.page else []
+        if not texts:
+            raise NoSuchElementException(f"Replayed page has no element for {selector}")
+        return _Element(texts[0])
+
+    def find_elements(self, by, selector):
+        return [_Element(text) for text in (self.page.texts([selector])[0] if self.page else [])]
+
+    def execute_script(self, script, *args):
+        from flight_browser import PAGE_STATS_SCRIPT
+        from flight_tabs import NAVIGATE_SCRIPT, POLL_SCRIPT
+        from flight_tracker import TEXTS_SCRIPT
+
+        if script == NAVIGATE_SCRIPT:
+            self._load(args[0])
+            return None
+        page = self.page
+        if script == POLL_SCRIPT:
+            if page is None or time.perf_counter() < page.ready_at:
+                return None
+            for selector, texts in zip(args[0], page.texts(args[0])):
+                if any(_DIGIT_RE.search(text) for text in texts):
+                    return [selector, texts]
+            return []
+        if script == TEXTS_SCRIPT:
+            return page.texts([args[0]])[0] if page else []
+        if script == PAGE_STATS_SCRIPT:
+            return dict(page.snapshot.get('stats') or {}) if page and page.snapshot else {}
+        return None
+
+    def get_screenshot_as_png(self):
+        return None
+
+    def close(self):
+        del self.pages[self.current_window_handle]
+
+    def quit(self):
+        self.pages.clear()
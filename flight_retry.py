@@ -0,0 +1,50 @@
+"""
+Flight Retry - Failure reasons and the backoff policy for re-checking failed flights
+"""
+
+import random
+
+# Why a check failed, recorded in check_failures and retry_queue
+NO_PRICE = 'no_price'
+TIMEOUT = 'timeout'
+DRIVER_CRASH = 'driver_crash'
+ERROR = 'error'
+CIRCUIT_OPEN = 'circuit_open'
+NOT_FOUND = 'not_found'
+OUTLIER = 'outlier'
+
+# Reasons worth another attempt in the same cycle; an open circuit is not.
+# An outlier is re-checked to confirm or replace the price held back.
+RETRYABLE = frozenset({NO_PRICE, TIMEOUT, DRIVER_CRASH, ERROR, OUTLIER})
+
+# WebDriver exceptions meaning the browser or its session went away
+_CRASH_EXCEPTIONS = {'InvalidSessionIdException', 'NoSuchWindowException', 'SessionNotCreatedException'}
+_CRASH_MESSAGES = ('crash', 'disconnected', 'not reachable', 'connection refused', 'no such session')
+
+
+def classify_failure(exc):
+    """Map an exception raised during a check to a failure reason"""
+    name = type(exc).__name__
+    message = str(exc).lower()
+    if name == 'TimeoutException' or isinstance(exc, TimeoutError):
+        return TIMEOUT
+    if name in _CRASH_EXCEPTIONS or isinstance(exc, ConnectionError) \
+            or any(text in message for text in _CRASH_MESSAGES):
+        return DRIVER_CRASH
+    return ERROR
+
+
+class RetryPolicy:
+    """Bounded attempts with exponential backoff and jitter"""
+
+    def __init__(self, max_attempts=3, base_delay=60, max_delay=1800):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def next_delay(self, failures):
+        """Seconds to wait after the given number of consecutive failures, or None to give up"""
+        if failures >= self.max_attempts:
+            return None
+        delay = min(self.max_delay, self.base_delay * 2 ** (failures - 1))
+        return delay * random.uniform(0.75, 1.25)
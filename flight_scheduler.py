@@ -3,55 +3,253 @@
 Flight Price Scheduler - Automatically checks prices at regular intervals
 """
 
+import argparse
+import logging
+import os
 import schedule
 import time
-from datetime import datetime
-from flight_tracker import FlightTracker
+from contextlib import nullcontext
+from flight_breaker import CircuitOpenError
+from flight_currency import refresh_rates
+from flight_models import ACTIVE
+from flight_retry import RETRYABLE
+from flight_tracker import FlightTracker, load_env
+from flight_metrics import CYCLE_SECONDS, QUEUE_DEPTH, start_metrics_server
+from flight_logging import log_context, new_id, setup_logging
+from flight_tracing import recording, span
+from flight_profiling import parse_modes, profiling
 
-def check_all_flights():
-    """Check prices for all tracked flights"""
-    print("\n" + "="*60)
-    print(f"🔄 Starting price check at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print("="*60)
+load_env()
+logger = logging.getLogger('flight_scheduler')
+
+# Pause between consecutive checks in a cycle
+CHECK_INTERVAL_SECONDS = float(os.getenv('CHECK_INTERVAL_SECONDS', 2))
+
+# Tabs of one browser to run searches in (1 = one browser per check) and the
+# browser RSS the tab count is scaled to stay under
+SCRAPER_TABS = int(os.getenv('SCRAPER_TABS', 1))
+SCRAPER_RSS_CEILING_MB = float(os.getenv('SCRAPER_RSS_CEILING_MB', 0)) or None
+
+# How long a cycle may keep retrying failed checks after its sweep
+CYCLE_BUDGET_SECONDS = float(os.getenv('CYCLE_BUDGET_SECONDS', 1800))
+
+def check_all_flights(trace_dir=None, profile=None, profile_dir=None):
+    """Check prices for all tracked flights
+
+    If trace_dir (or the TRACE_DIR environment variable) is set, the cycle's
+    spans are written there as a folded flame-graph file and a JSON summary.
+    profile (or PROFILE) lists flight_profiling modes to run over the cycle,
+    e.g. "sample,memory"; their files go to profile_dir (or PROFILE_DIR,
+    default profiles).
+    """
+    trace_dir = trace_dir or os.getenv('TRACE_DIR')
+    profile = parse_modes(profile if profile is not None else os.getenv('PROFILE'))
+    profile_dir = profile_dir or os.getenv('PROFILE_DIR', 'profiles')
+    cycle_id = new_id()
+    name = f"cycle-{time.strftime('%Y%m%d-%H%M%S')}-{cycle_id}"
+    
+    with log_context(cycle_id=cycle_id), CYCLE_SECONDS.time():
+        with profiling(profile, profile_dir, name, all_threads=True) as profiles:
+            with recording() if trace_dir else nullcontext() as recorder:
+                with span('check_all_flights', cycle_id=cycle_id):
+                    _check_all_flights()
+        
+        if recorder is not None:
+            path = recorder.dump(trace_dir, name)
+            logger.info("Trace written to %s.folded", path)
+        for path in profiles:
+            logger.info("Profile written to %s", path)
+
+def _check_all_flights():
+    logger.info("Starting price check")
     
     tracker = FlightTracker()
-    flights = tracker.get_all_flights()
+    
+    # Flights whose date has passed stop being checked
+    with span('db.advance_lifecycle'):
+        tracker.advance_lifecycle()
+    
+    with span('db.get_all_flights'):
+        flights = tracker.get_all_flights(statuses=(ACTIVE,))
     
     if not flights:
-        print("📭 No flights to check. Add flights using flight_cli.py")
+        logger.info("No active flights to check. Add flights using flight_cli.py")
         return
     
-    print(f"✈️  Checking {len(flights)} flight(s)...\n")
+    # One scrape per search; check_price records the price for all its subscribers
+    flight_ids = list({flight.search_id: flight.id for flight in flights}.values())
     
-    for flight in flights:
-        flight_id = flight[0]
-        origin = flight[1]
-        destination = flight[2]
-        departure_date = flight[3]
-        
-        print(f"🔍 Checking Flight #{flight_id}: {origin} → {destination} on {departure_date}")
+    logger.info("Checking %d flight(s) in %d search(es)", len(flights), len(flight_ids))
+    cycle_start = time.perf_counter()
+    deadline = time.time() + CYCLE_BUDGET_SECONDS
+    
+    if SCRAPER_TABS > 1:
+        succeeded = _check_in_tabs(tracker, flight_ids)
+    else:
+        succeeded = _check_one_by_one(tracker, flight_ids)
+    
+    QUEUE_DEPTH.labels(queue='cycle').set(0)
+    
+    # Re-check flights that failed, while the cycle's budget lasts
+    succeeded += process_retries(tracker, deadline)
+    
+    # One email per recipient for all drops found in this cycle
+    sent = tracker.flush_alerts()
+    
+    logger.info("Price check completed: %d/%d searches priced, %d alert(s), next check in 6 hours",
+                succeeded, len(flight_ids), sent,
+                extra={'duration_s': round(time.perf_counter() - cycle_start, 3)})
+
+def _check_one_by_one(tracker, flight_ids):
+    """Check flights sequentially, one browser per check; returns the number priced"""
+    succeeded = 0
+    
+    for position, flight_id in enumerate(flight_ids):
+        QUEUE_DEPTH.labels(queue='cycle').set(len(flight_ids) - position)
         
         try:
-            current_price = tracker.check_price(flight_id)
-            
-            if current_price:
-                print(f"✅ Current price: ₹{current_price}\n")
-            else:
-                print(f"⚠️  Could not fetch price\n")
-                
-        except Exception as e:
-            print(f"❌ Error checking flight #{flight_id}: {e}\n")
+            if _check_flight(tracker, flight_id, new_streak=True):
+                succeeded += 1
+        except CircuitOpenError as e:
+            # Nothing was launched, so there is nothing to pace
+            logger.warning("Skipping flight #%s: %s", flight_id, e, extra={'flight_id': flight_id})
+            continue
         
-        # Wait 2 seconds between flights to avoid rate limiting
-        time.sleep(2)
+        # Wait between flights to avoid rate limiting; longer while checks keep failing
+        with span('rate_limit.sleep'):
+            time.sleep(tracker.breaker.pacing(CHECK_INTERVAL_SECONDS))
     
-    print("="*60)
-    print(f"✅ Price check completed at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"⏰ Next check in 6 hours")
-    print("="*60 + "\n")
+    return succeeded
+
+def _check_in_tabs(tracker, flight_ids):
+    """Check flights concurrently in tabs of one browser; returns the number priced"""
+    succeeded = 0
+    remaining = len(flight_ids)
+    QUEUE_DEPTH.labels(queue='cycle').set(remaining)
+    
+    # Searches start at most once per CHECK_INTERVAL_SECONDS, as in the sequential loop
+    for flight_id, current_price, error in tracker.check_prices(
+            flight_ids, SCRAPER_TABS, SCRAPER_RSS_CEILING_MB, dispatch_interval=CHECK_INTERVAL_SECONDS):
+        remaining -= 1
+        QUEUE_DEPTH.labels(queue='cycle').set(remaining)
+        if current_price:
+            succeeded += 1
+        else:
+            logger.warning("Could not fetch price", extra={'flight_id': flight_id, 'reason': error})
+            if error in RETRYABLE:
+                tracker.queue_retry(flight_id, error, new_streak=True)
+    
+    return succeeded
+
+def _check_flight(tracker, flight_id, new_streak=False, retry=False):
+    """Check one flight, queueing a retry if it fails; returns True if it was priced
+
+    retry=True marks a re-check from the retry queue, which the circuit
+    breaker does not count as a new call to the provider.
+    """
+    try:
+        if tracker.check_price(flight_id, defer_alerts=True, retry=retry):
+            return True
+        logger.warning("Could not fetch price", extra={'flight_id': flight_id})
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        logger.error("Error checking flight #%s: %s", flight_id, e, extra={'flight_id': flight_id})
+    
+    reason = tracker.last_failure_reason
+    if reason in RETRYABLE:
+        due = tracker.queue_retry(flight_id, reason, new_streak=new_streak)
+        if due:
+            logger.info("Retry for flight #%s in %.0fs", flight_id, due - time.time(),
+                        extra={'flight_id': flight_id, 'reason': reason})
+    else:
+        # Not worth retrying (e.g. the flight was deleted)
+        tracker.clear_retry(flight_id)
+    return False
+
+def process_retries(tracker, deadline):
+    """Re-check queued failures that fall due before deadline; returns the number priced"""
+    succeeded = 0
+    
+    while True:
+        due = tracker.due_retries(deadline)
+        if not due:
+            break
+        
+        with span('retry.wait'):
+            time.sleep(max(0.0, due[0][2] - time.time()))
+        
+        # Another scheduler sharing the database may have taken it meanwhile
+        claimed = tracker.claim_retries()
+        if not claimed:
+            continue
+        flight_id, failures, reason = claimed[0]
+        
+        logger.info("Retrying flight #%s (failure %d: %s)", flight_id, failures, reason,
+                    extra={'flight_id': flight_id})
+        try:
+            if _check_flight(tracker, flight_id, retry=True):
+                succeeded += 1
+        except CircuitOpenError as e:
+            # Leave the rest queued (this one until its lease runs out); the
+            # minute job picks them up once the circuit closes
+            logger.warning("Retries paused: %s", e)
+            break
+    
+    return succeeded
+
+def retry_due_checks():
+    """Re-check queued failures that are already due (runs between sweeps)"""
+    tracker = FlightTracker()
+    if not tracker.due_retries(time.time()):
+        return
+    
+    with log_context(cycle_id=new_id()):
+        if process_retries(tracker, time.time()):
+            tracker.flush_alerts()
+
+def refresh_exchange_rates():
+    """Download current exchange rates; on failure the cached table stays in use"""
+    try:
+        refresh_rates()
+    except Exception as e:
+        logger.warning("Could not refresh exchange rates: %s", e)
 
 def main():
     """Main scheduler function"""
+    parser = argparse.ArgumentParser(description="Check tracked flight prices every 6 hours")
+    parser.add_argument('--trace-dir', default=os.getenv('TRACE_DIR'),
+                        help='Write per-cycle span traces (folded stacks + JSON) to this directory')
+    parser.add_argument('--profile', default=os.getenv('PROFILE', ''),
+                        help='Profile each cycle: cprofile, sample and/or memory, comma-separated')
+    parser.add_argument('--profile-dir', default=os.getenv('PROFILE_DIR', 'profiles'),
+                        help='Directory for per-cycle profiles (default profiles)')
+    provider = parser.add_mutually_exclusive_group()
+    provider.add_argument('--record', metavar='DIR', help='Save every result page to DIR for later replay')
+    provider.add_argument('--replay', metavar='DIR', help='Check against pages recorded in DIR instead of the site')
+    parser.add_argument('--replay-speed', type=float,
+                        help='Replay load times this many times faster (0: no waiting; default 1)')
+    parser.add_argument('--once', action='store_true', help='Run one cycle and exit')
+    args = parser.parse_args()
+    try:
+        parse_modes(args.profile)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    # FlightTracker reads these when each cycle creates it
+    if args.record or args.replay:
+        os.environ['PROVIDER_MODE'] = 'record' if args.record else 'replay'
+        os.environ['PROVIDER_SNAPSHOT_DIR'] = args.record or args.replay
+    if args.replay_speed is not None:
+        os.environ['REPLAY_SPEED'] = str(args.replay_speed)
+    
+    if args.once:
+        setup_logging()
+        check_all_flights(trace_dir=args.trace_dir, profile=args.profile, profile_dir=args.profile_dir)
+        return
+    
+    setup_logging()
+    
     print("\n" + "="*60)
     print("🚀 Flight Price Tracker - Automated Monitoring")
     print("="*60)
@@ -60,11 +258,26 @@ def main():
     print("🛑 Press Ctrl+C to stop")
     print("="*60 + "\n")
     
+    # Expose Prometheus metrics for this process if requested
+    metrics_port = os.getenv('METRICS_PORT')
+    if metrics_port:
+        start_metrics_server(int(metrics_port))
+        logger.info("Metrics available at http://localhost:%s/metrics", metrics_port)
+    
+    # Rates for alerting on targets set in another currency than the page shows
+    if os.getenv('FX_REFRESH', '1') != '0':
+        refresh_exchange_rates()
+        schedule.every().day.do(refresh_exchange_rates)
+    
     # Run immediately on start
-    check_all_flights()
+    cycle_options = {'trace_dir': args.trace_dir, 'profile': args.profile, 'profile_dir': args.profile_dir}
+    check_all_flights(**cycle_options)
     
     # Schedule to run every 6 hours
-    schedule.every(6).hours.do(check_all_flights)
+    schedule.every(6).hours.do(check_all_flights, **cycle_options)
+    
+    # Failed checks left over from a cycle's budget are retried as they fall due
+    schedule.every(1).minutes.do(retry_due_checks)
     
     # You can also schedule specific times:
     # schedule.every().day.at("09:00").do(check_all_flights)
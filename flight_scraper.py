@@ -0,0 +1,110 @@
+"""
+Flight Scraper - Offline price extraction from saved page source
+
+Applies the same selectors as FlightTracker.extract_price to HTML on disk,
+so pages captured from failed checks can be re-parsed without a browser.
+Only the selector forms used in PRICE_SELECTORS are supported:
+tag[attr*='value'], tag[attr='value'], tag[attr^='value'] and
+tag[attr$='value'], with the tag optional.
+"""
+
+import re
+from html.parser import HTMLParser
+
+from flight_currency import lowest_price
+
+SELECTOR_RE = re.compile(r"^(?P<tag>[\w-]*)\[(?P<attr>[\w-]+)(?P<op>[*^$]?=)['\"](?P<value>[^'\"]*)['\"]\]$")
+
+# Elements that never have a closing tag
+VOID_TAGS = frozenset({'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+                       'meta', 'param', 'source', 'track', 'wbr'})
+
+_MATCHERS = {
+    '*=': lambda actual, value: value in actual,
+    '=': lambda actual, value: actual == value,
+    '^=': lambda actual, value: actual.startswith(value),
+    '$=': lambda actual, value: actual.endswith(value),
+}
+
+
+def compile_selector(selector):
+    """(tag or None, attribute, matcher, value) for a supported selector"""
+    match = SELECTOR_RE.match(selector.strip())
+    if not match:
+        raise ValueError(f"Unsupported selector: {selector}")
+    return (match['tag'].lower() or None, match['attr'].lower(), _MATCHERS[match['op']], match['value'])
+
+
+class _SelectorParser(HTMLParser):
+    """Collects the text of every element matching each selector, in document order"""
+
+    def __init__(self, selectors):
+        super().__init__(convert_charrefs=True)
+        self.selectors = [compile_selector(s) for s in selectors]
+        self.texts = {}
+        self.depth = 0
+        self._open = []
+
+    def _matches(self, selector, tag, attrs):
+        want_tag, attr, matcher, value = selector
+        if want_tag and want_tag != tag:
+            return False
+        actual = attrs.get(attr)
+        return actual is not None and matcher(actual, value)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {name.lower(): value or '' for name, value in attrs}
+        capturing = {capture[0] for capture in self._open}
+        for index, selector in enumerate(self.selectors):
+            if index not in capturing and self._matches(selector, tag, attrs):
+                if tag in VOID_TAGS:
+                    self.texts.setdefault(index, []).append('')
+                else:
+                    self._open.append((index, self.depth, []))
+        if tag not in VOID_TAGS:
+            self.depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.depth -= 1
+
+    def handle_data(self, data):
+        for _, _, parts in self._open:
+            parts.append(data)
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        self.depth = max(0, self.depth - 1)
+        still_open = []
+        for index, depth, parts in self._open:
+            if depth >= self.depth:
+                self.texts.setdefault(index, []).append(''.join(parts))
+            else:
+                still_open.append((index, depth, parts))
+        self._open = still_open
+
+
+def selector_texts(html, selectors):
+    """Text of every element each selector matches, in document order: one list per selector"""
+    parser = _SelectorParser(selectors)
+    parser.feed(html)
+    parser.close()
+    return [parser.texts.get(index, []) for index in range(len(selectors))]
+
+
+def find_price(html, selectors=None, currency=None):
+    """Return (Money, selector) from page source, or (None, None)
+
+    Like extract_price, selectors are tried in turn and the first whose
+    matching elements hold a price wins, with the lowest of those prices.
+    """
+    if selectors is None:
+        from flight_tracker import PRICE_SELECTORS as selectors
+
+    for selector, texts in zip(selectors, selector_texts(html, selectors)):
+        price = lowest_price(texts, currency)
+        if price is not None:
+            return price, selector
+    return None, None
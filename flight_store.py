@@ -0,0 +1,975 @@
+"""
+Flight Store - Database access for the tracker, on SQLite or PostgreSQL
+
+FlightTracker keeps the scraping and alert logic and does every read and
+write through a store. SQLiteStore (the default) opens the database file
+per call. PostgresStore lets schedulers and web servers on several hosts
+share one database: connections come from a per-process pool, price
+history is bulk-written with COPY, and queued retries are claimed with
+FOR UPDATE SKIP LOCKED so two checkers never take the same flight.
+open_store picks the backend from the location, a postgresql:// URL or
+a file path.
+
+Queries shared by both backends live on Store and are written with ?
+placeholders; PostgresStore rewrites them for psycopg. psycopg is imported
+only when a PostgresStore is opened, so SQLite runs never load it.
+"""
+
+import functools
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from flight_events import ALERT, PRICE, Event
+from flight_models import (ACTIVE, ARCHIVED, DEPARTED, PAUSED, PRICE_OBSERVATION_COLUMNS, Flight, PriceObservation,
+                           fetch_record, fetch_records)
+
+logger = logging.getLogger('flight_store')
+
+POSTGRES_SCHEMES = ('postgres://', 'postgresql://')
+
+# Flight records: a subscription joined with its search and route
+FLIGHT_QUERY = '''
+    SELECT f.id, r.origin, r.destination, s.departure_date, f.email, f.target_price, f.created_at, f.search_id,
+           f.currency, f.status
+    FROM flights f
+    JOIN searches s ON s.id = f.search_id
+    JOIN routes r ON r.id = s.route_id
+'''
+
+
+def _version_triggers(table):
+    """Triggers bumping data_version on any change to table"""
+    return [f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_{action.lower()}_version AFTER {action} ON {table}
+        BEGIN UPDATE data_version SET version = version + 1 WHERE id = 1; END
+        ''' for action in ('INSERT', 'UPDATE', 'DELETE')]
+
+# Schema migrations; SCHEMA_MIGRATIONS[n] upgrades a database from version n
+# to n + 1. The version is stored in PRAGMA user_version.
+SCHEMA_MIGRATIONS = [
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS flights (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin TEXT NOT NULL,
+            destination TEXT NOT NULL,
+            departure_date TEXT NOT NULL,
+            email TEXT NOT NULL,
+            target_price REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS price_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            flight_id INTEGER NOT NULL,
+            price REAL NOT NULL,
+            checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (flight_id) REFERENCES flights(id)
+        )
+        ''',
+        # One row per flight with a target price
+        '''
+        CREATE TABLE IF NOT EXISTS alert_state (
+            flight_id INTEGER PRIMARY KEY,
+            state TEXT NOT NULL DEFAULT 'armed',
+            last_alert_price REAL,
+            last_alert_at TIMESTAMP,
+            FOREIGN KEY (flight_id) REFERENCES flights(id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_price_history_flight ON price_history (flight_id, checked_at)',
+    ],
+    # Circuit breaker state per price source, shared by the scheduler and web app
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS provider_health (
+            provider TEXT PRIMARY KEY,
+            state TEXT NOT NULL DEFAULT 'closed',
+            recent TEXT NOT NULL DEFAULT '',
+            opens INTEGER NOT NULL DEFAULT 0,
+            opened_until REAL NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ],
+    # Failed checks (why, and how long they took) and flights waiting to be re-checked
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS check_failures (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            flight_id INTEGER NOT NULL,
+            reason TEXT NOT NULL,
+            detail TEXT,
+            seconds REAL NOT NULL DEFAULT 0,
+            failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_check_failures_time ON check_failures (failed_at)',
+        '''
+        CREATE TABLE IF NOT EXISTS retry_queue (
+            flight_id INTEGER PRIMARY KEY,
+            failures INTEGER NOT NULL,
+            next_attempt_at REAL NOT NULL,
+            last_reason TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ],
+    # Counter bumped on every change to flights or price_history; the web app's ETags
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        ''',
+        'INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)',
+        *_version_triggers('flights'),
+        *_version_triggers('price_history'),
+    ],
+    # Price and alert events for live dashboards (flight_events)
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            flight_id INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ],
+    # Routes and searches shared by every subscriber; flights become subscriptions to a search
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS routes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin TEXT NOT NULL,
+            destination TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (origin, destination)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS searches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            route_id INTEGER NOT NULL,
+            departure_date TEXT NOT NULL,
+            UNIQUE (route_id, departure_date),
+            FOREIGN KEY (route_id) REFERENCES routes(id)
+        )
+        ''',
+        '''
+        INSERT OR IGNORE INTO routes (origin, destination)
+        SELECT DISTINCT UPPER(TRIM(origin)), UPPER(TRIM(destination)) FROM flights
+        ''',
+        '''
+        INSERT OR IGNORE INTO searches (route_id, departure_date)
+        SELECT DISTINCT r.id, f.departure_date FROM flights f
+        JOIN routes r ON r.origin = UPPER(TRIM(f.origin)) AND r.destination = UPPER(TRIM(f.destination))
+        ''',
+        '''
+        CREATE TABLE flights_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            search_id INTEGER NOT NULL,
+            email TEXT NOT NULL,
+            target_price REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (search_id) REFERENCES searches(id)
+        )
+        ''',
+        '''
+        INSERT INTO flights_new (id, search_id, email, target_price, created_at)
+        SELECT f.id, s.id, f.email, f.target_price, f.created_at FROM flights f
+        JOIN routes r ON r.origin = UPPER(TRIM(f.origin)) AND r.destination = UPPER(TRIM(f.destination))
+        JOIN searches s ON s.route_id = r.id AND s.departure_date = f.departure_date
+        ''',
+        # Carry the id sequence over so ids of deleted flights are not reused
+        '''
+        DELETE FROM sqlite_sequence WHERE name = 'flights_new'
+        ''',
+        '''
+        INSERT INTO sqlite_sequence (name, seq) SELECT 'flights_new', seq FROM sqlite_sequence WHERE name = 'flights'
+        ''',
+        'DROP TABLE flights',
+        'ALTER TABLE flights_new RENAME TO flights',
+        'CREATE INDEX IF NOT EXISTS idx_flights_search ON flights (search_id)',
+        *_version_triggers('flights'),
+    ],
+    # Prices keep the currency they were seen in; flights the currency of their target
+    [
+        "ALTER TABLE flights ADD COLUMN currency TEXT NOT NULL DEFAULT 'INR'",
+        "ALTER TABLE price_history ADD COLUMN currency TEXT NOT NULL DEFAULT 'INR'",
+    ],
+    # Flight lifecycle (active, paused, departed, archived), advanced by departure date
+    [
+        "ALTER TABLE flights ADD COLUMN status TEXT NOT NULL DEFAULT 'active'",
+        'CREATE INDEX IF NOT EXISTS idx_flights_status ON flights (status, search_id)',
+        'CREATE INDEX IF NOT EXISTS idx_searches_departure ON searches (departure_date)',
+    ],
+]
+SCHEMA_VERSION = len(SCHEMA_MIGRATIONS)
+
+# PostgreSQL schema migrations, numbered on their own (stored in schema_version).
+# Timestamps are UTC without time zone, like SQLite's CURRENT_TIMESTAMP.
+POSTGRES_MIGRATIONS = [
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS routes (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            origin TEXT NOT NULL,
+            destination TEXT NOT NULL,
+            created_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (origin, destination)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS searches (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            route_id BIGINT NOT NULL REFERENCES routes(id),
+            departure_date TEXT NOT NULL,
+            UNIQUE (route_id, departure_date)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS flights (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            search_id BIGINT NOT NULL REFERENCES searches(id),
+            email TEXT NOT NULL,
+            target_price DOUBLE PRECISION,
+            created_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_flights_search ON flights (search_id)',
+        '''
+        CREATE TABLE IF NOT EXISTS price_history (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            flight_id BIGINT NOT NULL REFERENCES flights(id),
+            price DOUBLE PRECISION NOT NULL,
+            checked_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_price_history_flight ON price_history (flight_id, checked_at)',
+        '''
+        CREATE TABLE IF NOT EXISTS alert_state (
+            flight_id BIGINT PRIMARY KEY REFERENCES flights(id),
+            state TEXT NOT NULL DEFAULT 'armed',
+            last_alert_price DOUBLE PRECISION,
+            last_alert_at TIMESTAMP(0)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS provider_health (
+            provider TEXT PRIMARY KEY,
+            state TEXT NOT NULL DEFAULT 'closed',
+            recent TEXT NOT NULL DEFAULT '',
+            opens INTEGER NOT NULL DEFAULT 0,
+            opened_until DOUBLE PRECISION NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS check_failures (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            flight_id BIGINT NOT NULL,
+            reason TEXT NOT NULL,
+            detail TEXT,
+            seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+            failed_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_check_failures_time ON check_failures (failed_at)',
+        '''
+        CREATE TABLE IF NOT EXISTS retry_queue (
+            flight_id BIGINT PRIMARY KEY,
+            failures INTEGER NOT NULL,
+            next_attempt_at DOUBLE PRECISION NOT NULL,
+            last_reason TEXT NOT NULL,
+            updated_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_retry_queue_due ON retry_queue (next_attempt_at)',
+        '''
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version BIGINT NOT NULL
+        )
+        ''',
+        'INSERT INTO data_version (id, version) VALUES (1, 0) ON CONFLICT DO NOTHING',
+        # Once per statement, so a COPY of many rows bumps the version once
+        '''
+        CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE data_version SET version = version + 1 WHERE id = 1;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        ''',
+        '''
+        CREATE OR REPLACE TRIGGER flights_version AFTER INSERT OR UPDATE OR DELETE ON flights
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version()
+        ''',
+        '''
+        CREATE OR REPLACE TRIGGER price_history_version AFTER INSERT OR UPDATE OR DELETE ON price_history
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version()
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS events (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            kind TEXT NOT NULL,
+            flight_id BIGINT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ],
+    [
+        "ALTER TABLE flights ADD COLUMN IF NOT EXISTS currency TEXT NOT NULL DEFAULT 'INR'",
+        "ALTER TABLE price_history ADD COLUMN IF NOT EXISTS currency TEXT NOT NULL DEFAULT 'INR'",
+    ],
+    [
+        "ALTER TABLE flights ADD COLUMN IF NOT EXISTS status TEXT NOT NULL DEFAULT 'active'",
+        'CREATE INDEX IF NOT EXISTS idx_flights_status ON flights (status, search_id)',
+        'CREATE INDEX IF NOT EXISTS idx_searches_departure ON searches (departure_date)',
+    ],
+]
+
+# Key for the advisory lock held while migrating a PostgreSQL database
+POSTGRES_MIGRATION_LOCK = 0x666c6967
+
+# Databases already checked by this process
+_initialized_databases = set()
+
+
+class Store:
+    """Reads and writes shared by every backend
+
+    Subclasses provide connect() (a context manager yielding a cursor and
+    committing on success), migrate(), claim_retries() and the few
+    statements whose SQL differs between databases.
+    """
+
+    # SQL for the current UTC time, as stored in TIMESTAMP columns
+    NOW = 'CURRENT_TIMESTAMP'
+
+    def __init__(self, location, event_retention=1000):
+        self.location = location
+        self.event_retention = event_retention
+        self.migrate()
+
+    def connect(self):
+        raise NotImplementedError
+
+    def migrate(self):
+        raise NotImplementedError
+
+    def insert(self, cursor, sql, params):
+        """Run an INSERT into a table with an id column; returns the new id"""
+        raise NotImplementedError
+
+    def bulk_insert(self, cursor, table, columns, rows):
+        """Insert many rows into table"""
+        cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                           rows)
+
+    def since(self, days):
+        """SQL for the UTC time the given number of days ago"""
+        raise NotImplementedError
+
+    def claim_retries(self, now, lease_until, limit):
+        raise NotImplementedError
+
+    def size_bytes(self):
+        raise NotImplementedError
+
+    # Flights, searches and routes
+
+    def ensure_search(self, cursor, origin, destination, departure_date):
+        """Id of the search for a route and date, creating the route and search if new"""
+        cursor.execute('INSERT INTO routes (origin, destination) VALUES (?, ?) ON CONFLICT DO NOTHING',
+                       (origin, destination))
+        cursor.execute('SELECT id FROM routes WHERE origin = ? AND destination = ?', (origin, destination))
+        route_id = cursor.fetchone()[0]
+        cursor.execute('INSERT INTO searches (route_id, departure_date) VALUES (?, ?) ON CONFLICT DO NOTHING',
+                       (route_id, departure_date))
+        cursor.execute('SELECT id FROM searches WHERE route_id = ? AND departure_date = ?', (route_id, departure_date))
+        return cursor.fetchone()[0]
+
+    def ensure_searches(self, keys):
+        """{(origin, destination, departure_date): search id} for many keys, in one transaction"""
+        with self.connect() as cursor:
+            return {key: self.ensure_search(cursor, *key) for key in set(keys)}
+
+    def add_flight(self, origin, destination, departure_date, email, target_price=None, currency='INR'):
+        with self.connect() as cursor:
+            search_id = self.ensure_search(cursor, origin, destination, departure_date)
+            return self.insert(cursor, 'INSERT INTO flights (search_id, email, target_price, currency) '
+                               'VALUES (?, ?, ?, ?)', (search_id, email, target_price, currency))
+
+    def import_flights(self, rows):
+        """Bulk-load (search_id, email, target_price, created_at) rows; returns their ids in order"""
+        with self.connect() as cursor:
+            self.bulk_insert(cursor, 'flights', ('search_id', 'email', 'target_price', 'created_at'), rows)
+            cursor.execute('SELECT id FROM flights ORDER BY id DESC LIMIT ?', (len(rows),))
+            return [row[0] for row in reversed(cursor.fetchall())]
+
+    def get_all_flights(self, statuses=None):
+        """Flights newest first, only those in statuses if given"""
+        with self.connect() as cursor:
+            if statuses is None:
+                cursor.execute(f'{FLIGHT_QUERY} ORDER BY f.created_at DESC')
+            else:
+                cursor.execute(f"{FLIGHT_QUERY} WHERE f.status IN ({', '.join('?' * len(statuses))}) "
+                               'ORDER BY f.created_at DESC', tuple(statuses))
+            return fetch_records(Flight, cursor)
+
+    def get_flight(self, flight_id):
+        with self.connect() as cursor:
+            cursor.execute(f'{FLIGHT_QUERY} WHERE f.id = ?', (flight_id,))
+            return fetch_record(Flight, cursor)
+
+    def get_search_flights(self, search_id):
+        with self.connect() as cursor:
+            cursor.execute(f'{FLIGHT_QUERY} WHERE f.search_id = ? ORDER BY f.id', (search_id,))
+            return fetch_records(Flight, cursor)
+
+    def delete_flight(self, flight_id):
+        with self.connect() as cursor:
+            cursor.execute('DELETE FROM price_history WHERE flight_id = ?', (flight_id,))
+            cursor.execute('DELETE FROM alert_state WHERE flight_id = ?', (flight_id,))
+            cursor.execute('DELETE FROM retry_queue WHERE flight_id = ?', (flight_id,))
+
+            # Delete the flight, and its search if nobody else follows it
+            cursor.execute('SELECT search_id FROM flights WHERE id = ?', (flight_id,))
+            row = cursor.fetchone()
+            cursor.execute('DELETE FROM flights WHERE id = ?', (flight_id,))
+            if row:
+                cursor.execute('''
+                    DELETE FROM searches WHERE id = ?
+                    AND NOT EXISTS (SELECT 1 FROM flights WHERE search_id = ?)
+                ''', (row[0], row[0]))
+
+    def set_flight_status(self, flight_id, status, current):
+        """Move a flight from current to status; returns False if it was not in current
+
+        A flight that stops being active also leaves the retry queue.
+        """
+        with self.connect() as cursor:
+            cursor.execute('UPDATE flights SET status = ? WHERE id = ? AND status = ?', (status, flight_id, current))
+            changed = cursor.rowcount > 0
+            if changed and status != ACTIVE:
+                cursor.execute('DELETE FROM retry_queue WHERE flight_id = ?', (flight_id,))
+        return changed
+
+    def advance_lifecycle(self, today, archive_before):
+        """Mark flights departing before today departed, and those departing before archive_before archived
+
+        Dates are ISO strings; the searches date index finds the departures
+        to move. Departed and archived flights leave the retry queue.
+        Returns {status: number of flights moved into it}.
+        """
+        with self.connect() as cursor:
+            cursor.execute('''
+                UPDATE flights SET status = ?
+                WHERE status IN (?, ?) AND search_id IN (SELECT id FROM searches WHERE departure_date < ?)
+            ''', (DEPARTED, ACTIVE, PAUSED, today))
+            departed = cursor.rowcount
+            cursor.execute('''
+                UPDATE flights SET status = ?
+                WHERE status = ? AND search_id IN (SELECT id FROM searches WHERE departure_date < ?)
+            ''', (ARCHIVED, DEPARTED, archive_before))
+            archived = cursor.rowcount
+            if departed or archived:
+                cursor.execute('''
+                    DELETE FROM retry_queue
+                    WHERE flight_id IN (SELECT id FROM flights WHERE status IN (?, ?))
+                ''', (DEPARTED, ARCHIVED))
+        return {DEPARTED: departed, ARCHIVED: archived}
+
+    def get_data_version(self):
+        with self.connect() as cursor:
+            cursor.execute('SELECT version FROM data_version WHERE id = 1')
+            row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def get_route_summary(self, days=7):
+        """Per route with unarchived flights, busiest first; 'prices' maps each currency seen to its
+        observations, low and average
+        """
+        with self.connect() as cursor:
+            cursor.execute(f'''
+                SELECT r.origin, r.destination, COUNT(DISTINCT s.id), COUNT(DISTINCT f.id),
+                       stats.currency, stats.observations, stats.low, stats.average
+                FROM routes r
+                JOIN searches s ON s.route_id = r.id
+                JOIN flights f ON f.search_id = s.id
+                LEFT JOIN (
+                    SELECT s2.route_id, p.currency, COUNT(*) AS observations, MIN(p.price) AS low,
+                           AVG(p.price) AS average
+                    FROM price_history p
+                    JOIN flights f2 ON f2.id = p.flight_id
+                    JOIN searches s2 ON s2.id = f2.search_id
+                    WHERE p.checked_at >= {self.since(days)}
+                    GROUP BY s2.route_id, p.currency
+                ) stats ON stats.route_id = r.id
+                WHERE f.status <> ?
+                GROUP BY r.id, stats.currency, stats.observations, stats.low, stats.average
+                ORDER BY COUNT(DISTINCT f.id) DESC, r.origin, r.destination, stats.observations DESC
+            ''', (ARCHIVED,))
+            rows = cursor.fetchall()
+
+        # One row per route and currency; routes come out together
+        summary = []
+        for origin, destination, searches, subscribers, currency, observations, low, average in rows:
+            if not summary or (summary[-1]['origin'], summary[-1]['destination']) != (origin, destination):
+                summary.append({'origin': origin, 'destination': destination, 'searches': searches,
+                                'subscribers': subscribers, 'observations': 0, 'prices': {}})
+            if currency is not None:
+                summary[-1]['observations'] += observations
+                summary[-1]['prices'][currency] = {'observations': observations, 'low': low,
+                                                   'average': round(average, 2)}
+        return summary
+
+    # Prices, alert state and events
+
+    def record_prices(self, targets, price, next_state):
+        """Save one price for several flights in one transaction; returns the ids that should alert
+
+        targets is a list of (flight_id, target_price, currency) and price a
+        flight_currency.Money, stored in the currency it was seen in.
+        next_state(state, target_price, currency) returns (new_state,
+        should_alert) for a flight's alert state machine. A price and alert
+        event is published for each flight, and any queued retries for them
+        are dropped.
+        """
+        if not targets:
+            return set()
+        flight_ids = [flight_id for flight_id, _, _ in targets]
+        marks = ', '.join('?' * len(flight_ids))
+        amount, currency = price
+        alerted = set()
+        with self.connect() as cursor:
+            cursor.execute(f'SELECT {self.NOW}')
+            checked_at = cursor.fetchone()[0]
+            self.bulk_insert(cursor, 'price_history', ('flight_id', 'price', 'checked_at', 'currency'),
+                             [(flight_id, amount, checked_at, currency) for flight_id in flight_ids])
+
+            # Advance each flight's alert state (once per drop, not per check)
+            cursor.execute(f'SELECT flight_id, state FROM alert_state WHERE flight_id IN ({marks})', flight_ids)
+            states = dict(cursor.fetchall())
+            for flight_id, target_price, target_currency in targets:
+                state = states.get(flight_id)
+                new_state, should_alert = next_state(state or 'armed', target_price, target_currency)
+                if should_alert:
+                    alerted.add(flight_id)
+                    cursor.execute('''
+                        INSERT INTO alert_state (flight_id, state, last_alert_price, last_alert_at)
+                        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                        ON CONFLICT(flight_id) DO UPDATE SET
+                            state = excluded.state,
+                            last_alert_price = excluded.last_alert_price,
+                            last_alert_at = excluded.last_alert_at
+                    ''', (flight_id, new_state, amount))
+                elif new_state != state:
+                    cursor.execute('''
+                        INSERT INTO alert_state (flight_id, state) VALUES (?, ?)
+                        ON CONFLICT(flight_id) DO UPDATE SET state = excluded.state
+                    ''', (flight_id, new_state))
+
+                # Tell open dashboards, in the same transaction as the price
+                self.publish_event(cursor, PRICE, flight_id,
+                                   {'price': amount, 'currency': currency, 'checked_at': checked_at})
+                if should_alert:
+                    self.publish_event(cursor, ALERT, flight_id,
+                                       {'price': amount, 'currency': currency, 'target_price': target_price,
+                                        'target_currency': target_currency})
+
+            # A price ends any pending retries for these flights
+            cursor.execute(f'DELETE FROM retry_queue WHERE flight_id IN ({marks})', flight_ids)
+        return alerted
+
+    def import_history(self, rows):
+        """Bulk-load (flight_id, price, checked_at) rows, in the column default currency (INR)"""
+        with self.connect() as cursor:
+            self.bulk_insert(cursor, 'price_history', ('flight_id', 'price', 'checked_at'), rows)
+
+    def get_recent_search_prices(self, search_id, currency, limit):
+        """The search's latest prices in currency, newest first, once per check"""
+        with self.connect() as cursor:
+            cursor.execute('''
+                SELECT p.price
+                FROM price_history p
+                JOIN flights f ON f.id = p.flight_id
+                WHERE f.search_id = ? AND p.currency = ?
+                GROUP BY p.checked_at, p.price
+                ORDER BY p.checked_at DESC
+                LIMIT ?
+            ''', (search_id, currency, limit))
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_price_history(self, flight_id):
+        with self.connect() as cursor:
+            cursor.execute(f'''
+                SELECT {PRICE_OBSERVATION_COLUMNS}
+                FROM price_history
+                WHERE flight_id = ?
+                ORDER BY checked_at DESC, id DESC
+            ''', (flight_id,))
+            return fetch_records(PriceObservation, cursor)
+
+    def publish_event(self, cursor, kind, flight_id, payload):
+        """Append an event for live dashboards, trimming old ones now and then"""
+        event_id = self.insert(cursor, 'INSERT INTO events (kind, flight_id, payload) VALUES (?, ?, ?)',
+                               (kind, flight_id, json.dumps(payload)))
+        if event_id % 100 == 0:
+            cursor.execute('DELETE FROM events WHERE id <= ?', (event_id - self.event_retention,))
+        return event_id
+
+    def get_events(self, after_id=0, limit=100):
+        with self.connect() as cursor:
+            cursor.execute('''
+                SELECT id, kind, flight_id, payload, created_at FROM events
+                WHERE id > ? ORDER BY id LIMIT ?
+            ''', (after_id, limit))
+            rows = cursor.fetchall()
+        return [Event(id, kind, flight_id, json.loads(payload), created_at)
+                for id, kind, flight_id, payload, created_at in rows]
+
+    def get_last_event_id(self):
+        with self.connect() as cursor:
+            cursor.execute('SELECT MAX(id) FROM events')
+            return cursor.fetchone()[0] or 0
+
+    # Failures and the retry queue
+
+    def record_failure(self, flight_id, reason, seconds, detail=None):
+        with self.connect() as cursor:
+            cursor.execute('''
+                INSERT INTO check_failures (flight_id, reason, detail, seconds)
+                VALUES (?, ?, ?, ?)
+            ''', (flight_id, reason, detail, round(seconds, 3)))
+
+    def get_failure_summary(self, days=7):
+        with self.connect() as cursor:
+            cursor.execute(f'''
+                SELECT reason, COUNT(*), SUM(seconds) FROM check_failures
+                WHERE failed_at >= {self.since(days)}
+                GROUP BY reason
+                ORDER BY SUM(seconds) DESC
+            ''')
+            rows = cursor.fetchall()
+        return {reason: {'count': count, 'seconds': round(seconds or 0, 1)} for reason, count, seconds in rows}
+
+    def retry_failures(self, flight_id):
+        """Failed checks in the flight's current retry streak (0 if it is not queued)"""
+        with self.connect() as cursor:
+            cursor.execute('SELECT failures FROM retry_queue WHERE flight_id = ?', (flight_id,))
+            row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def schedule_retry(self, flight_id, failures, due, reason):
+        with self.connect() as cursor:
+            cursor.execute('''
+                INSERT INTO retry_queue (flight_id, failures, next_attempt_at, last_reason, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(flight_id) DO UPDATE SET
+                    failures = excluded.failures,
+                    next_attempt_at = excluded.next_attempt_at,
+                    last_reason = excluded.last_reason,
+                    updated_at = excluded.updated_at
+            ''', (flight_id, failures, due, reason))
+
+    def clear_retry(self, flight_id):
+        with self.connect() as cursor:
+            cursor.execute('DELETE FROM retry_queue WHERE flight_id = ?', (flight_id,))
+
+    def retry_depth(self):
+        with self.connect() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM retry_queue')
+            return cursor.fetchone()[0]
+
+    def due_retries(self, until):
+        with self.connect() as cursor:
+            cursor.execute('''
+                SELECT flight_id, failures, next_attempt_at, last_reason FROM retry_queue
+                WHERE next_attempt_at <= ?
+                ORDER BY next_attempt_at
+            ''', (until,))
+            return cursor.fetchall()
+
+    # Circuit breaker state
+
+    def get_breaker(self, provider):
+        """(state, recent, opens, opened_until) for a provider, or None"""
+        with self.connect() as cursor:
+            cursor.execute('''
+                SELECT state, recent, opens, opened_until FROM provider_health WHERE provider = ?
+            ''', (provider,))
+            return cursor.fetchone()
+
+    def save_breaker(self, provider, state):
+        with self.connect() as cursor:
+            cursor.execute('''
+                INSERT INTO provider_health (provider, state, recent, opens, opened_until, updated_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(provider) DO UPDATE SET
+                    state = excluded.state,
+                    recent = excluded.recent,
+                    opens = excluded.opens,
+                    opened_until = excluded.opened_until,
+                    updated_at = excluded.updated_at
+            ''', (provider, state['state'], state['recent'], state['opens'], state['opened_until']))
+
+    def get_provider_health(self):
+        """(provider, state, recent, opens, opened_until, updated_at) rows"""
+        with self.connect() as cursor:
+            cursor.execute('SELECT provider, state, recent, opens, opened_until, updated_at FROM provider_health')
+            return cursor.fetchall()
+
+    def count_rows(self, table):
+        with self.connect() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {table}')
+            return cursor.fetchone()[0]
+
+
+class SQLiteStore(Store):
+    """One SQLite file, opened per call; a single writer at a time"""
+
+    @contextmanager
+    def connect(self):
+        conn = sqlite3.connect(self.location)
+        try:
+            yield conn.cursor()
+            conn.commit()
+        finally:
+            conn.close()
+
+    def migrate(self):
+        """Create or upgrade the schema (runs DDL once per schema version)"""
+        if self.location in _initialized_databases:
+            return
+
+        conn = sqlite3.connect(self.location, isolation_level=None)
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+        if version < SCHEMA_VERSION:
+            # Re-check under a write lock in case another process is migrating too
+            conn.execute('BEGIN IMMEDIATE')
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for statements in SCHEMA_MIGRATIONS[version:]:
+                for statement in statements:
+                    conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.execute('COMMIT')
+            logger.debug("Database schema upgraded", extra={'db_path': self.location,
+                                                            'from_version': version, 'to_version': SCHEMA_VERSION})
+
+        conn.close()
+        _initialized_databases.add(self.location)
+
+    def insert(self, cursor, sql, params):
+        cursor.execute(sql, params)
+        return cursor.lastrowid
+
+    def since(self, days):
+        return f"datetime('now', '-{int(days)} days')"
+
+    def claim_retries(self, now, lease_until, limit):
+        """Take up to limit due retries, pushing them to lease_until; (flight_id, failures, reason) rows"""
+        conn = sqlite3.connect(self.location, isolation_level=None)
+        try:
+            # The write lock keeps other processes from claiming the same rows
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute('''
+                SELECT flight_id, failures, last_reason FROM retry_queue
+                WHERE next_attempt_at <= ?
+                ORDER BY next_attempt_at LIMIT ?
+            ''', (now, limit)).fetchall()
+            conn.executemany('UPDATE retry_queue SET next_attempt_at = ? WHERE flight_id = ?',
+                             [(lease_until, flight_id) for flight_id, _, _ in rows])
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        return rows
+
+    def size_bytes(self):
+        return os.path.getsize(self.location)
+
+
+# A quoted string literal or identifier, with doubled quotes inside
+_QUOTED_RE = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+
+
+@functools.lru_cache(maxsize=256)
+def postgres_sql(sql):
+    """Store SQL in psycopg's paramstyle
+
+    ? placeholders become %s, except inside quoted strings and identifiers.
+    Literal % signs are doubled everywhere, as psycopg parses the whole
+    query for placeholders when parameters are passed.
+    """
+    parts = _QUOTED_RE.split(sql.replace('%', '%%'))
+    # split() puts the quoted parts at the odd indexes
+    parts[::2] = [part.replace('?', '%s') for part in parts[::2]]
+    return ''.join(parts)
+
+
+class _PostgresCursor:
+    """psycopg cursor that takes the ? placeholders used by Store"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=None):
+        # Without parameters psycopg sends the query as it is
+        return self._cursor.execute(sql if params is None else postgres_sql(sql), params)
+
+    def executemany(self, sql, params, **kwargs):
+        return self._cursor.executemany(postgres_sql(sql), params, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+# Connection pools by (url, pid); a forked worker builds its own
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _configure_connection(conn):
+    from psycopg.types.string import TextLoader
+
+    # Timestamps come back as 'YYYY-MM-DD HH:MM:SS' strings, as from SQLite
+    conn.adapters.register_loader('timestamp', TextLoader)
+
+
+def connection_pool(url):
+    """This process's connection pool for a PostgreSQL URL
+
+    DATABASE_POOL_SIZE caps the connections per process; size it to the
+    threads that query at once (gunicorn threads, scheduler).
+    """
+    key = (url, os.getpid())
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                from psycopg_pool import ConnectionPool
+
+                pool = ConnectionPool(url, min_size=1, max_size=int(os.getenv('DATABASE_POOL_SIZE', 4)),
+                                      kwargs={'options': '-c timezone=UTC'}, configure=_configure_connection,
+                                      name='flight-store', open=True)
+                _pools[key] = pool
+    return pool
+
+
+class PostgresStore(Store):
+    """A PostgreSQL database shared by several hosts, through a per-process connection pool"""
+
+    NOW = 'LOCALTIMESTAMP(0)'
+
+    def __init__(self, location, event_retention=1000):
+        try:
+            self.pool = connection_pool(location)
+        except ImportError as e:
+            raise RuntimeError("PostgreSQL support needs psycopg and psycopg_pool "
+                               "(pip install 'psycopg[binary]' psycopg_pool)") from e
+        super().__init__(location, event_retention)
+
+    @contextmanager
+    def connect(self):
+        # Commits on a clean exit, rolls back on an exception
+        with self.pool.connection() as conn:
+            yield _PostgresCursor(conn.cursor())
+
+    def migrate(self):
+        if self.location in _initialized_databases:
+            return
+
+        with self.connect() as cursor:
+            # Serialize migrations from several processes until this transaction ends
+            cursor.execute('SELECT pg_advisory_xact_lock(?)', (POSTGRES_MIGRATION_LOCK,))
+            cursor.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)')
+            cursor.execute('SELECT version FROM schema_version')
+            row = cursor.fetchone()
+            version = row[0] if row else 0
+            for statements in POSTGRES_MIGRATIONS[version:]:
+                for statement in statements:
+                    cursor.execute(statement)
+            if version < len(POSTGRES_MIGRATIONS):
+                cursor.execute('DELETE FROM schema_version')
+                cursor.execute('INSERT INTO schema_version (version) VALUES (?)', (len(POSTGRES_MIGRATIONS),))
+                logger.debug("Database schema upgraded", extra={'from_version': version,
+                                                                'to_version': len(POSTGRES_MIGRATIONS)})
+
+        _initialized_databases.add(self.location)
+
+    def insert(self, cursor, sql, params):
+        cursor.execute(f'{sql} RETURNING id', params)
+        return cursor.fetchone()[0]
+
+    def import_flights(self, rows):
+        """Bulk-load (search_id, email, target_price, created_at) rows; returns their ids in order
+
+        Ids come back from each row's INSERT, so flights other processes add
+        meanwhile cannot be mistaken for these.
+        """
+        with self.connect() as cursor:
+            cursor.executemany('INSERT INTO flights (search_id, email, target_price, created_at) '
+                               'VALUES (?, ?, ?, ?) RETURNING id', rows, returning=True)
+            ids = []
+            if rows:
+                ids.append(cursor.fetchone()[0])
+                while cursor.nextset():
+                    ids.append(cursor.fetchone()[0])
+            return ids
+
+    def bulk_insert(self, cursor, table, columns, rows):
+        """COPY rows into table: one round trip however many rows there are"""
+        with cursor.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
+
+    def since(self, days):
+        return f"LOCALTIMESTAMP - INTERVAL '{int(days)} days'"
+
+    def claim_retries(self, now, lease_until, limit):
+        """Take up to limit due retries, pushing them to lease_until; (flight_id, failures, reason) rows
+
+        Rows another checker is claiming at the same moment are skipped
+        rather than waited for.
+        """
+        with self.connect() as cursor:
+            cursor.execute('''
+                UPDATE retry_queue SET next_attempt_at = ?
+                WHERE flight_id IN (
+                    SELECT flight_id FROM retry_queue
+                    WHERE next_attempt_at <= ?
+                    ORDER BY next_attempt_at LIMIT ?
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING flight_id, failures, last_reason
+            ''', (lease_until, now, limit))
+            return cursor.fetchall()
+
+    def size_bytes(self):
+        with self.connect() as cursor:
+            cursor.execute('SELECT pg_database_size(current_database())')
+            return cursor.fetchone()[0]
+
+
+def open_store(location, event_retention=1000):
+    """Store for a SQLite file path or a postgresql:// URL"""
+    if location.startswith(POSTGRES_SCHEMES):
+        return PostgresStore(location, event_retention)
+    return SQLiteStore(location, event_retention)
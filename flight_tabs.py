@@ -0,0 +1,256 @@
+"""
+Flight Tabs - Run many searches through tabs of a single headless Chrome
+
+Navigation is started with a script so it does not block; the pool then
+polls every busy tab with one round trip and hands results back as each page
+shows a price. The number of open tabs starts at one and grows toward
+max_tabs while the browser's RSS, with an estimated cost per in-flight
+search, fits under the configured ceiling. Tabs are shed again when the
+browser goes over it.
+"""
+
+import logging
+import os
+import time
+from collections import namedtuple
+
+from flight_browser import page_stats
+from flight_currency import lowest_price
+from flight_metrics import BROWSER_RSS_BYTES, BROWSER_TABS, SEARCH_RSS_BYTES
+
+logger = logging.getLogger('flight_tabs')
+
+# Background tabs must keep rendering and running timers while they load
+TAB_ARGUMENTS = [
+    '--disable-background-timer-throttling',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-renderer-backgrounding',
+]
+
+# One finished search: price (a flight_currency.Money) and selector are None
+# unless a price was found; error is None (priced, or loaded without a
+# price), 'timeout' (still loading) or 'driver'
+TabResult = namedtuple('TabResult', 'key price selector error seconds stats')
+
+# Marks the outgoing document so a poll never reads the previous search's page
+NAVIGATE_SCRIPT = """
+document.documentElement.setAttribute('data-flight-stale', '1');
+window.location.href = arguments[0];
+"""
+
+# null while still loading, [] when loaded without a price, else [selector, texts]
+# with the text of every element the first selector holding digits matches
+POLL_SCRIPT = """
+const root = document.documentElement;
+if (!root || root.hasAttribute('data-flight-stale') || document.readyState === 'loading') {
+    return null;
+}
+for (const selector of arguments[0]) {
+    const texts = Array.from(document.querySelectorAll(selector),
+                             element => element.innerText || element.textContent || '');
+    if (texts.some(text => /[0-9]/.test(text))) {
+        return [selector, texts];
+    }
+}
+return [];
+"""
+
+
+def process_tree_rss(pid):
+    """Resident memory in bytes of pid and all its descendants (Linux), or None"""
+    children = {}
+    rss = {}
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return None
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            children.setdefault(int(fields[1]), []).append(int(entry))
+            # Field 24 of /proc/<pid>/stat (index 21 after the command) is RSS in pages
+            rss[int(entry)] = int(fields[21]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, IndexError, ValueError):
+            continue
+    if pid not in rss:
+        return None
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        total += rss.get(current, 0)
+        stack.extend(children.get(current, ()))
+    return total
+
+
+def browser_pid(driver):
+    """Process id of chromedriver for a Selenium Chrome driver, or None"""
+    try:
+        return driver.service.process.pid
+    except AttributeError:
+        return None
+
+
+class _Tab:
+    __slots__ = ('handle', 'key', 'started')
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.key = None
+        self.started = None
+
+
+class TabPool:
+    """Multiplexes searches over tabs of one driver"""
+
+    def __init__(self, driver, selectors, max_tabs=4, rss_ceiling_mb=None, timeout=20,
+                 poll_interval=0.25, dispatch_interval=0, on_failure=None, currency=None):
+        self.driver = driver
+        self.selectors = list(selectors)
+        # Currency of prices shown without a symbol
+        self.currency = currency
+        self.max_tabs = max(1, max_tabs)
+        self.rss_ceiling = rss_ceiling_mb * 1024 * 1024 if rss_ceiling_mb else None
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.dispatch_interval = dispatch_interval
+        # Called as on_failure(key, error) with the failed tab focused
+        self.on_failure = on_failure
+
+        self.tabs = [_Tab(driver.current_window_handle)]
+        self.pid = browser_pid(driver)
+        self.baseline_rss = self.sample_rss()
+        self.search_rss = None
+        # Grow from one tab only when memory can be measured against a ceiling
+        self.limit = 1 if self.rss_ceiling and self.baseline_rss else self.max_tabs
+        self._last_dispatch = 0.0
+        self._last_rescale = 0.0
+
+    def sample_rss(self):
+        rss = process_tree_rss(self.pid) if self.pid else None
+        if rss is not None:
+            BROWSER_RSS_BYTES.set(rss)
+        return rss
+
+    def in_flight(self):
+        return sum(1 for tab in self.tabs if tab.key is not None)
+
+    def rescale(self):
+        """Adjust the tab limit from current RSS and the per-search estimate"""
+        now = time.perf_counter()
+        if not self.rss_ceiling or not self.baseline_rss or now - self._last_rescale < 1:
+            return
+        self._last_rescale = now
+        rss = self.sample_rss()
+        busy = self.in_flight()
+        if rss is None:
+            return
+        if busy:
+            estimate = max(0, rss - self.baseline_rss) / busy
+            # Smooth the estimate; single samples swing with page content
+            self.search_rss = estimate if self.search_rss is None else 0.7 * self.search_rss + 0.3 * estimate
+            SEARCH_RSS_BYTES.set(self.search_rss)
+
+        if rss > self.rss_ceiling:
+            limit = max(1, self.limit - 1)
+        elif self.search_rss:
+            limit = int((self.rss_ceiling - self.baseline_rss) // self.search_rss)
+            limit = max(1, min(self.max_tabs, limit, self.limit + 1))
+        else:
+            limit = self.limit
+
+        if limit != self.limit:
+            logger.debug("Tab limit %d -> %d", self.limit, limit,
+                         extra={'rss_mb': round(rss / 1048576, 1), 'in_flight': busy})
+            self.limit = limit
+        if len(self.tabs) > self.limit:
+            self.close_idle_tabs()
+        BROWSER_TABS.labels(state='limit').set(self.limit)
+
+    def close_idle_tabs(self):
+        """Close idle tabs beyond the limit (always keeping one window)"""
+        for tab in list(self.tabs):
+            if len(self.tabs) <= self.limit:
+                break
+            if tab.key is None:
+                self.driver.switch_to.window(tab.handle)
+                self.driver.close()
+                self.tabs.remove(tab)
+
+    def idle_tab(self):
+        """An idle tab, opening a new one if under the limit, or None"""
+        for tab in self.tabs:
+            if tab.key is None:
+                return tab
+        if len(self.tabs) < self.limit:
+            self.driver.switch_to.new_window('tab')
+            tab = _Tab(self.driver.current_window_handle)
+            self.tabs.append(tab)
+            return tab
+        return None
+
+    def dispatch(self, tab, key, url):
+        self.driver.switch_to.window(tab.handle)
+        self.driver.execute_script(NAVIGATE_SCRIPT, url)
+        tab.key = key
+        tab.started = time.perf_counter()
+        self._last_dispatch = tab.started
+
+    def poll(self, tab):
+        """Return a TabResult if the tab's search has finished, else None"""
+        elapsed = time.perf_counter() - tab.started
+        try:
+            self.driver.switch_to.window(tab.handle)
+            found = self.driver.execute_script(POLL_SCRIPT, self.selectors)
+        except Exception as e:
+            logger.warning("Tab failed: %s", e, extra={'search': tab.key})
+            return TabResult(tab.key, None, None, 'driver', elapsed, {})
+
+        price = lowest_price(found[1], self.currency) if found else None
+        if price is not None:
+            return TabResult(tab.key, price, found[0], None, elapsed, page_stats(self.driver))
+        if elapsed >= self.timeout:
+            error = 'timeout' if found is None else None
+            stats = page_stats(self.driver)
+            if self.on_failure:
+                self.on_failure(tab.key, error)
+            return TabResult(tab.key, None, None, error, elapsed, stats)
+        # Loaded with no price yet: script-rendered results may still arrive
+        return None
+
+    def run(self, jobs):
+        """Yield a TabResult for each (key, url) job as it completes
+
+        jobs is consumed lazily, one item per free tab, so a generator can
+        stop handing out work part way through.
+        """
+        jobs = iter(jobs)
+        job = next(jobs, None)
+        while job is not None or self.in_flight():
+            now = time.perf_counter()
+            while job is not None and now - self._last_dispatch >= self.dispatch_interval:
+                tab = self.idle_tab()
+                if tab is None:
+                    break
+                self.dispatch(tab, *job)
+                job = next(jobs, None)
+                now = time.perf_counter()
+            BROWSER_TABS.labels(state='in_flight').set(self.in_flight())
+
+            finished = False
+            for tab in self.tabs:
+                if tab.key is None:
+                    continue
+                result = self.poll(tab)
+                if result is not None:
+                    tab.key = None
+                    finished = True
+                    yield result
+
+            self.rescale()
+            if not finished:
+                time.sleep(self.poll_interval)
+
+        BROWSER_TABS.labels(state='in_flight').set(0)
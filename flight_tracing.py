@@ -0,0 +1,142 @@
+"""
+Flight Tracing - Lightweight span recorder for timing each stage of a check
+
+Spans nest through a context variable, so code only needs `with span(...)`.
+When no recorder is active the spans are timed and dropped. A recorder
+collects finished root spans and can export them as OpenTelemetry-style
+dicts (JSON) or as folded stacks that flamegraph.pl and speedscope load.
+"""
+
+import contextvars
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+_current_span = contextvars.ContextVar('flight_current_span', default=None)
+_current_recorder = contextvars.ContextVar('flight_span_recorder', default=None)
+
+
+class Span:
+    """One timed stage, with optional attributes and child spans"""
+    __slots__ = ('name', 'attributes', 'parent', 'children', 'trace_id', 'span_id',
+                 'start_ns', 'end_ns', 'status')
+
+    def __init__(self, name, attributes, parent):
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.children = []
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = 'ok'
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def walk(self, depth=0):
+        """Yield (depth, span) for this span and its descendants"""
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time the with-block as a child of the current span"""
+    parent = _current_span.get()
+    current = Span(name, attributes, parent)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = 'error'
+        current.attributes['error'] = type(e).__name__
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+        if parent is not None:
+            parent.children.append(current)
+        else:
+            recorder = _current_recorder.get()
+            if recorder is not None:
+                recorder.spans.append(current)
+
+
+class SpanRecorder:
+    """Collects root spans finished while it is active"""
+
+    def __init__(self):
+        self.spans = []
+
+    def to_dicts(self):
+        """Spans flattened into OpenTelemetry-style records"""
+        records = []
+        for root in self.spans:
+            for _, s in root.walk():
+                records.append({
+                    'trace_id': s.trace_id,
+                    'span_id': s.span_id,
+                    'parent_span_id': s.parent.span_id if s.parent else None,
+                    'name': s.name,
+                    'start_time_unix_nano': s.start_ns,
+                    'end_time_unix_nano': s.end_ns,
+                    'status': s.status,
+                    'attributes': s.attributes,
+                })
+        return records
+
+    def folded(self):
+        """Collapsed stacks ("a;b;c <self time in microseconds>") for flame graphs"""
+        totals = defaultdict(int)
+
+        def visit(s, prefix):
+            path = f'{prefix};{s.name}' if prefix else s.name
+            child_ns = sum(c.end_ns - c.start_ns for c in s.children)
+            totals[path] += max(0, (s.end_ns - s.start_ns) - child_ns) // 1000
+            for child in s.children:
+                visit(child, path)
+
+        for root in self.spans:
+            visit(root, '')
+        return '\n'.join(f'{path} {us}' for path, us in totals.items() if us) + '\n'
+
+    def summary(self):
+        """Total time, count and max per span name, slowest first"""
+        stats = defaultdict(lambda: {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        for root in self.spans:
+            for _, s in root.walk():
+                entry = stats[s.name]
+                entry['count'] += 1
+                entry['total_ms'] += s.duration_ms
+                entry['max_ms'] = max(entry['max_ms'], s.duration_ms)
+        return dict(sorted(stats.items(), key=lambda item: -item[1]['total_ms']))
+
+    def dump(self, directory, prefix):
+        """Write <prefix>.folded and <prefix>.spans.json into directory"""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, prefix)
+        with open(base + '.folded', 'w') as f:
+            f.write(self.folded())
+        with open(base + '.spans.json', 'w') as f:
+            json.dump({'summary': self.summary(), 'spans': self.to_dicts()}, f, default=str)
+        return base
+
+
+@contextmanager
+def recording():
+    """Collect every root span finished inside the with-block"""
+    recorder = SpanRecorder()
+    token = _current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current_recorder.reset(token)
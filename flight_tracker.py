@@ -1,293 +1,765 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-import sqlite3
-from datetime import datetime
+# Selenium, webdriver_manager, dotenv and the email modules are imported lazily
+# (on first scrape, send or tracker creation) so read-only commands start fast.
+import logging
+import time
 import os
-from dotenv import load_dotenv
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from datetime import date, timedelta
+from flight_alerts import AlertBatch, PriceAlert, next_alert_state
+from flight_breaker import HALF_OPEN, CircuitBreaker, CircuitOpenError
+from flight_store import open_store
+from flight_airports import lookup, validate_route
+from flight_currency import (Money, convert, default_currency, format_money, fx_rates, lowest_price,
+                             validate_currency)
+from flight_browser import chrome_options, create_driver, page_stats, scraper_profile
+from flight_models import ACTIVE, LISTED_STATES, PAUSED
+from flight_outliers import CONFIRMED, HELD_BACK, price_screen
+from flight_replay import RECORD, REPLAY, ReplayDriver, provider_mode, snapshot_store
+from flight_retry import (CIRCUIT_OPEN, DRIVER_CRASH, NO_PRICE, NOT_FOUND, OUTLIER, TIMEOUT, RetryPolicy,
+                          classify_failure)
+from flight_logging import bind, log_context, new_id, unbind
+from flight_tracing import span
+from flight_metrics import (CHECK_FAILURE_SECONDS, CHECK_SECONDS, CHECKS_TOTAL, DB_QUERY_SECONDS,
+                            DRIVER_STARTUP_SECONDS, EMAIL_SEND_SECONDS, EMAILS_SENT_TOTAL, PAGE_BYTES,
+                            PAGE_READY_SECONDS, PRICES_SCREENED_TOTAL, QUEUE_DEPTH, SCRAPE_SECONDS)
 
-# Load environment variables
-load_dotenv()
+# Price source label used in metrics
+PROVIDER = 'google_flights'
+
+logger = logging.getLogger('flight_tracker')
+
+_env_loaded = False
+
+
+def load_env():
+    """Load .env once per process"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+# Price selectors on the Google Flights results page, tried in order
+PRICE_SELECTORS = [
+    "div[class*='YMlIz FpEdX']",
+    "div[class*='airline-price']",
+    "span[class*='price']",
+    "[aria-label*='price']"
+]
+
+# Text of every element matching a selector, in one round trip
+TEXTS_SCRIPT = """
+return Array.from(document.querySelectorAll(arguments[0]), element => element.innerText || element.textContent || '');
+"""
+
+def outlier_detail(price, verdict):
+    """One-line description of a screened price, for logs and check_failures"""
+    return (f'{format_money(*price)} is {verdict.deviation} MADs from the route median '
+            f'{format_money(verdict.median, price.currency)} ({verdict.outcome})')
+
+# TabPool error codes as failure reasons (None: the page loaded without a price)
+TAB_FAILURES = {None: NO_PRICE, 'timeout': TIMEOUT, 'driver': DRIVER_CRASH}
 
 class FlightTracker:
-    def __init__(self, db_path='flights.db'):
-        """Initialize the flight tracker"""
-        self.db_path = db_path
-        self.init_database()
+    def __init__(self, db_path=None, breaker=None):
+        """Initialize the flight tracker
+        
+        db_path is a SQLite file or a postgresql:// URL; it defaults to
+        DATABASE_URL, then flights.db. breaker is a CircuitBreaker shared
+        with other trackers in the process (web worker threads); by default
+        the tracker builds its own from the saved state.
+        """
+        load_env()
+        self.db_path = db_path or os.getenv('DATABASE_URL') or 'flights.db'
+        
+        # Price/alert events kept for dashboards that reconnect
+        self.event_retention = int(os.getenv('EVENT_RETENTION', 1000))
+        self.store = open_store(self.db_path, event_retention=self.event_retention)
         
         # Email configuration
         self.email_address = os.getenv('EMAIL_ADDRESS')
         self.email_password = os.getenv('EMAIL_PASSWORD')
         self.smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
         self.smtp_port = int(os.getenv('SMTP_PORT', 587))
+        self.smtp_starttls = os.getenv('SMTP_STARTTLS', '1') != '0'
         
-        print(f"📧 Email configured: {self.email_address}")
-    
-    def init_database(self):
-        """Initialize SQLite database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create flights table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS flights (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                origin TEXT NOT NULL,
-                destination TEXT NOT NULL,
-                departure_date TEXT NOT NULL,
-                email TEXT NOT NULL,
-                target_price REAL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create price history table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS price_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                flight_id INTEGER NOT NULL,
-                price REAL NOT NULL,
-                checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (flight_id) REFERENCES flights(id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        print("✅ Database initialized")
-    
-    def get_chrome_driver(self):
-        """Initialize Chrome driver with proper options for PythonAnywhere"""
-        chrome_options = Options()
+        # Price source (overridable to point at a local fixture server)
+        self.search_base_url = os.getenv('FLIGHTS_BASE_URL', 'https://www.google.com').rstrip('/')
         
-        # Essential options for headless mode
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--disable-software-rasterizer')
-        chrome_options.add_argument('--disable-extensions')
+        # Page-load profile ("default" or "lean") and stats from the last check
+        self.scraper_profile = scraper_profile()
+        self.last_page_stats = {}
         
-        # User agent to avoid detection
-        chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+        # Record result pages for replay, or replay them instead of starting Chrome (flight_replay)
+        self.provider_mode = provider_mode()
+        self.snapshots = snapshot_store() if self.provider_mode in (RECORD, REPLAY) else None
+        self.replay_speed = float(os.getenv('REPLAY_SPEED', 1))
         
-        # Performance optimizations
-        chrome_options.add_argument('--blink-settings=imagesEnabled=false')  # Don't load images
-        chrome_options.page_load_strategy = 'eager'  # Don't wait for all resources
+        # How long a page may take to show a price; replays scale it with their speed
+        self.page_timeout = float(os.getenv('PAGE_TIMEOUT_SECONDS', 20))
+        if self.provider_mode == REPLAY:
+            self.page_timeout = self.page_timeout / self.replay_speed if self.replay_speed else 0
         
-        try:
-            # Try to use ChromeDriverManager
-            service = Service(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=chrome_options)
-            print("✅ Chrome driver initialized with ChromeDriverManager")
-        except Exception as e:
-            print(f"⚠️ ChromeDriverManager failed: {e}")
-            # Fallback: try system chromedriver
-            try:
-                driver = webdriver.Chrome(options=chrome_options)
-                print("✅ Chrome driver initialized with system chromedriver")
-            except Exception as e2:
-                print(f"❌ Could not initialize Chrome driver: {e2}")
-                raise
+        # Alert debouncing: re-arm once price rebounds this % above target
+        self.alert_rearm_pct = float(os.getenv('ALERT_REARM_PCT', 5))
+        self.pending_alerts = AlertBatch()
         
-        return driver
-    
-    def add_flight(self, origin, destination, departure_date, email, target_price=None):
-        """Add a new flight to track"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # Digest mode: one email per recipient per cycle instead of one per flight
+        self.alert_digest = os.getenv('ALERT_DIGEST', '1') != '0'
         
-        cursor.execute('''
-            INSERT INTO flights (origin, destination, departure_date, email, target_price)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (origin, destination, departure_date, email, target_price))
+        # Stop launching Chrome against a source that keeps failing
+        self.breaker = breaker or CircuitBreaker(
+            PROVIDER,
+            window=int(os.getenv('BREAKER_WINDOW', 20)),
+            failure_rate=float(os.getenv('BREAKER_FAILURE_RATE', 0.5)),
+            min_calls=int(os.getenv('BREAKER_MIN_CALLS', 5)),
+            backoff_seconds=float(os.getenv('BREAKER_BACKOFF_SECONDS', 300)),
+            max_backoff_seconds=float(os.getenv('BREAKER_MAX_BACKOFF_SECONDS', 21600)),
+        )
+        if breaker is None:
+            self.load_breaker()
         
-        flight_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        # Failed checks are retried with backoff, up to RETRY_MAX_ATTEMPTS checks in a row
+        self.retry_policy = RetryPolicy(
+            max_attempts=int(os.getenv('RETRY_MAX_ATTEMPTS', 3)),
+            base_delay=float(os.getenv('RETRY_BASE_DELAY_SECONDS', 60)),
+            max_delay=float(os.getenv('RETRY_MAX_DELAY_SECONDS', 1800)),
+        )
+        # How long a claimed retry is held before another checker may take it
+        self.retry_lease_seconds = float(os.getenv('RETRY_LEASE_SECONDS', 600))
+        self.last_failure_reason = None
         
-        print(f"✅ Flight added: {origin} → {destination} on {departure_date} (ID: {flight_id})")
-        return flight_id
+        # Departed flights are archived (left out of listings) this many days after departure
+        self.archive_after_days = int(os.getenv('ARCHIVE_AFTER_DAYS', 30))
+        
+        logger.debug("Email configured: %s", self.email_address)
+    
+    def get_chrome_driver(self, options=None):
+        """Initialize Chrome driver with proper options for PythonAnywhere"""
+        if self.provider_mode == REPLAY:
+            return ReplayDriver(self.snapshots, self.replay_speed)
+        with DRIVER_STARTUP_SECONDS.time():
+            return create_driver(options, profile=self.scraper_profile)
     
-    def get_all_flights(self):
-        """Get all tracked flights"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def add_flight(self, origin, destination, departure_date, email, target_price=None, currency=None):
+        """Add a new flight to track; raises ValueError for malformed airport or unknown currency codes
+        
+        currency is the one the target is in and alerts are shown in
+        (default DEFAULT_CURRENCY).
+        """
+        origin, destination = validate_route(origin, destination)
+        currency = validate_currency(currency or default_currency())
         
-        cursor.execute('SELECT * FROM flights ORDER BY created_at DESC')
-        flights = cursor.fetchall()
+        with DB_QUERY_SECONDS.labels(operation='add_flight').time():
+            flight_id = self.store.add_flight(origin, destination, departure_date, email, target_price, currency)
         
-        conn.close()
-        return flights
+        logger.info("Flight added: %s → %s on %s", origin, destination, departure_date,
+                    extra={'flight_id': flight_id})
+        for code in (origin, destination):
+            if lookup(code) is None:
+                logger.warning("Airport code %s is not in the airport list", code, extra={'flight_id': flight_id})
+        return flight_id
     
-    def delete_flight(self, flight_id):
-        """Delete a flight from tracking"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def get_all_flights(self, statuses=LISTED_STATES):
+        """Get tracked flights as Flight records; archived ones only if statuses includes them (None: all)"""
+        with DB_QUERY_SECONDS.labels(operation='get_all_flights').time():
+            return self.store.get_all_flights(statuses)
+    
+    def pause_flight(self, flight_id):
+        """Stop checking an active flight until it is resumed; raises ValueError otherwise"""
+        self._change_status(flight_id, ACTIVE, PAUSED)
+    
+    def resume_flight(self, flight_id):
+        """Start checking a paused flight again; raises ValueError if it is not paused or has departed"""
+        self._change_status(flight_id, PAUSED, ACTIVE)
+    
+    def _change_status(self, flight_id, current, status):
+        flight = self.get_flight(flight_id)
+        if flight is None:
+            raise ValueError(f"Flight {flight_id} not found")
+        if flight.status != current:
+            raise ValueError(f"Flight {flight_id} is {flight.status}, not {current}")
+        if status == ACTIVE and flight.departure_date < date.today().isoformat():
+            raise ValueError(f"Flight {flight_id} departed on {flight.departure_date}")
         
-        # Delete price history first
-        cursor.execute('DELETE FROM price_history WHERE flight_id = ?', (flight_id,))
+        with DB_QUERY_SECONDS.labels(operation='set_flight_status').time():
+            if not self.store.set_flight_status(flight_id, status, current):
+                raise ValueError(f"Flight {flight_id} changed while being updated; try again")
         
-        # Delete flight
-        cursor.execute('DELETE FROM flights WHERE id = ?', (flight_id,))
+        logger.info("Flight status %s → %s", current, status, extra={'flight_id': flight_id})
+    
+    def advance_lifecycle(self, today=None):
+        """Move flights whose departure date has passed to departed, and on to archived
         
-        conn.commit()
-        conn.close()
+        Returns {status: number of flights moved into it}.
+        """
+        today = today or date.today()
+        archive_before = today - timedelta(days=self.archive_after_days)
+        with DB_QUERY_SECONDS.labels(operation='advance_lifecycle').time():
+            moved = self.store.advance_lifecycle(today.isoformat(), archive_before.isoformat())
         
-        print(f"✅ Flight {flight_id} deleted")
+        if any(moved.values()):
+            logger.info("Flight lifecycle: %s", ', '.join(f'{count} {status}' for status, count in moved.items()),
+                        extra=moved)
+        return moved
+    
+    def get_data_version(self):
+        """Counter that changes whenever flights or price history change"""
+        with DB_QUERY_SECONDS.labels(operation='get_data_version').time():
+            return self.store.get_data_version()
     
-    def check_price(self, flight_id):
-        """Check current price for a flight"""
-        # Get flight details
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def delete_flight(self, flight_id):
+        """Delete a flight from tracking, with its history and its search if nobody else follows it"""
+        with DB_QUERY_SECONDS.labels(operation='delete_flight').time():
+            self.store.delete_flight(flight_id)
         
-        cursor.execute('SELECT * FROM flights WHERE id = ?', (flight_id,))
-        flight = cursor.fetchone()
+        logger.info("Flight deleted", extra={'flight_id': flight_id})
+    
+    def get_flight(self, flight_id):
+        """Get a single tracked flight as a Flight record, or None"""
+        with DB_QUERY_SECONDS.labels(operation='get_flight').time():
+            return self.store.get_flight(flight_id)
+    
+    def get_search_flights(self, search_id):
+        """Every flight subscribed to a search, as Flight records"""
+        with DB_QUERY_SECONDS.labels(operation='get_search_flights').time():
+            return self.store.get_search_flights(search_id)
+    
+    def get_route_summary(self, days=7, currency=None):
+        """Per route: searches, subscribers and prices seen over the last days, busiest first
         
-        if not flight:
-            conn.close()
-            raise ValueError(f"Flight {flight_id} not found")
+        Lowest and average prices are converted to currency (default
+        DEFAULT_CURRENCY); prices in currencies without a rate are left out
+        of them but still counted as observations.
+        """
+        currency = currency or default_currency()
+        rates = fx_rates()
+        summary = self.store.get_route_summary(days)
+        for route in summary:
+            low = total = None
+            count = 0
+            for seen_in, stats in route.pop('prices').items():
+                route_low = convert(Money(stats['low'], seen_in), currency, rates)
+                route_average = convert(Money(stats['average'], seen_in), currency, rates)
+                if route_low is None:
+                    continue
+                low = route_low.amount if low is None else min(low, route_low.amount)
+                total = (total or 0) + route_average.amount * stats['observations']
+                count += stats['observations']
+            route.update(currency=currency, low=low, average=round(total / count, 2) if count else None)
+        return summary
+    
+    def build_search_url(self, origin, destination, departure_date):
+        """Google Flights search URL for a route and date"""
+        return f"{self.search_base_url}/travel/flights?q=flights+from+{origin}+to+{destination}+on+{departure_date}"
+    
+    def extract_price(self, driver):
+        """Find the lowest price on the loaded page; returns (Money, selector) or (None, None)
         
-        origin, destination, departure_date, email, target_price = flight[1:6]
+        Selectors are tried in order; the first whose elements hold a price
+        wins, and every element it matches (one per itinerary) is read in a
+        single script call and parsed together.
+        """
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
         
-        print(f"🔍 Checking price for: {origin} → {destination} on {departure_date}")
+        # Wait for price elements to load
+        wait = WebDriverWait(driver, self.page_timeout)
         
-        driver = None
-        try:
-            # Initialize browser
-            driver = self.get_chrome_driver()
-            
-            # Build Google Flights URL
-            url = f"https://www.google.com/travel/flights?q=flights+from+{origin}+to+{destination}+on+{departure_date}"
-            
-            print(f"🌐 Opening: {url}")
-            driver.get(url)
-            
-            # Wait for price elements to load
-            wait = WebDriverWait(driver, 20)
-            
-            # Try multiple selectors for price
-            price_selectors = [
-                "div[class*='YMlIz FpEdX']",
-                "div[class*='airline-price']",
-                "span[class*='price']",
-                "[aria-label*='price']"
-            ]
-            
+        for selector in PRICE_SELECTORS:
             current_price = None
-            
-            for selector in price_selectors:
-                try:
-                    price_element = wait.until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                    )
-                    price_text = price_element.text
-                    
-                    # Extract numeric value
-                    price_str = ''.join(filter(str.isdigit, price_text))
-                    if price_str:
-                        current_price = float(price_str)
-                        print(f"💰 Found price: ₹{current_price}")
-                        break
-                except:
-                    continue
-            
-            if current_price is None:
-                print("⚠️ Could not find price on page")
-                # Save screenshot for debugging
+            selector_start = time.perf_counter()
+            with span('selector.wait', selector=selector) as selector_span:
                 try:
-                    driver.save_screenshot(f'debug_flight_{flight_id}.png')
-                    print(f"📸 Screenshot saved: debug_flight_{flight_id}.png")
+                    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
+                    texts = driver.execute_script(TEXTS_SCRIPT, selector)
+                    current_price = lowest_price(texts or [])
                 except:
                     pass
-                return None
+                selector_span.set_attribute('found', current_price is not None)
             
-            # Save price to history
-            cursor.execute('''
-                INSERT INTO price_history (flight_id, price)
-                VALUES (?, ?)
-            ''', (flight_id, current_price))
-            conn.commit()
+            SCRAPE_SECONDS.labels(provider=PROVIDER, selector=selector,
+                                  outcome='found' if current_price is not None else 'miss') \
+                .observe(time.perf_counter() - selector_start)
+            if current_price is not None:
+                return current_price, selector
+        
+        return None, None
+    
+    def record_price(self, flight_id, current_price, target_price, currency=None):
+        """Save a price observation (Money); returns True if it should trigger an alert"""
+        targets = [(flight_id, target_price, currency or current_price.currency)]
+        return flight_id in self.record_prices(targets, current_price)
+    
+    def record_prices(self, targets, current_price):
+        """Save one price (Money) for several (flight_id, target_price, currency) in one transaction
+        
+        Each target is compared with the price converted to its currency;
+        a target in a currency without an exchange rate cannot alert.
+        Returns the ids to alert.
+        """
+        rates = fx_rates()
+        converted = {}
+        
+        def next_state(state, target_price, currency):
+            if currency not in converted:
+                converted[currency] = convert(current_price, currency, rates)
+                if converted[currency] is None and target_price:
+                    logger.warning("No exchange rate from %s to %s; run 'flight_cli.py fx --refresh'",
+                                   current_price.currency, currency)
+            if converted[currency] is None:
+                return state, False
+            return next_alert_state(state, converted[currency].amount, target_price, self.alert_rearm_pct)
+        
+        with DB_QUERY_SECONDS.labels(operation='record_price').time():
+            return self.store.record_prices(targets, current_price, next_state)
+    
+    def check_price(self, flight_id, defer_alerts=False, retry=False):
+        """Check current price for a flight
+
+        Returns the price found (Money), or None if there was none or it
+        was held back as an outlier. With defer_alerts=True, alerts are
+        queued in pending_alerts and sent as one message per recipient by
+        flush_alerts(). A retry=True check (a re-check of a failed search)
+        is left out of the breaker's failure rate, unless it is the
+        half-open probe.
+        """
+        self.last_failure_reason = None
+        with span('check_price', flight_id=flight_id) as check_span:
+            # Get flight details
+            with span('db.get_flight'):
+                flight = self.get_flight(flight_id)
+            
+            if not flight:
+                raise ValueError(f"Flight {flight_id} not found")
             
-            # Check if price dropped below target
-            if target_price and current_price <= target_price:
-                print(f"🎉 Price alert! Current: ₹{current_price}, Target: ₹{target_price}")
-                self.send_email_alert(email, origin, destination, departure_date, current_price, target_price)
+            check_span.set_attribute('route', f'{flight.origin}-{flight.destination}')
             
-            conn.close()
-            return current_price
+            if not self.breaker.allow():
+                CHECKS_TOTAL.labels(provider=PROVIDER, result='circuit_open').inc()
+                check_span.set_attribute('result', 'circuit_open')
+                self.last_failure_reason = CIRCUIT_OPEN
+                raise CircuitOpenError(PROVIDER, self.breaker.opened_until)
+            # One search failing again says nothing new about the provider
+            counted = not retry or self.breaker.state == HALF_OPEN
             
+            log_token = bind(check_id=new_id(), flight_id=flight_id)
+            logger.info("Checking price for: %s → %s on %s", flight.origin, flight.destination, flight.departure_date)
+            
+            check_start = time.perf_counter()
+            result = 'error'
+            reason = detail = None
+            driver = None
+            try:
+                # Initialize browser
+                with span('driver.start'):
+                    driver = self.get_chrome_driver()
+                
+                url = self.build_search_url(flight.origin, flight.destination, flight.departure_date)
+                logger.debug("Opening: %s", url)
+                navigation_start = time.perf_counter()
+                with span('driver.get'):
+                    driver.get(url)
+                
+                current_price, selector = self.extract_price(driver)
+                load_seconds = time.perf_counter() - navigation_start
+                stats = page_stats(driver)
+                self.record_page_stats(stats, load_seconds, current_price is not None)
+                if self.provider_mode == RECORD:
+                    self.record_snapshot(driver, url, load_seconds, current_price, selector, stats)
+                
+                if current_price is None:
+                    result = 'no_price'
+                    reason = NO_PRICE
+                    logger.warning("Could not find price on page")
+                    self.capture_debug(driver, flight_id, reason)
+                    return None
+                
+                logger.info("Found price: %s", format_money(*current_price), extra={'selector': selector})
+                verdict = self.handle_price(flight, current_price, defer_alerts)
+                if verdict.outcome in HELD_BACK:
+                    result = 'outlier'
+                    reason = OUTLIER
+                    detail = outlier_detail(current_price, verdict)
+                    self.capture_debug(driver, flight_id, reason)
+                    return None
+                result = 'success'
+                
+                return current_price
+                
+            except Exception as e:
+                reason = classify_failure(e)
+                detail = f'{type(e).__name__}: {e}'[:500]
+                logger.error("Error checking price: %s", e, extra={'reason': reason})
+                if driver and reason != DRIVER_CRASH:
+                    self.capture_debug(driver, flight_id, reason)
+                raise
+            finally:
+                if driver:
+                    with span('driver.quit'):
+                        try:
+                            driver.quit()
+                        except Exception:
+                            # A crashed browser can fail to quit; the check already failed
+                            if reason is None:
+                                raise
+                elapsed = time.perf_counter() - check_start
+                check_span.set_attribute('result', result)
+                CHECKS_TOTAL.labels(provider=PROVIDER, result=result).inc()
+                CHECK_SECONDS.labels(provider=PROVIDER).observe(elapsed)
+                # The source answered with a price, even if it was held back
+                if counted:
+                    self.record_breaker(result in ('success', 'outlier'))
+                if reason:
+                    self.record_failure(flight_id, reason, elapsed, detail)
+                unbind(log_token)
+    
+    def handle_price(self, flight, current_price, defer_alerts):
+        """Save a found price for every subscriber of the flight's search; send or queue their alerts
+        
+        The price is screened against the route's recent prices first;
+        returns the flight_outliers.Verdict, and an outlier held back is
+        neither saved nor alerted on.
+        """
+        verdict = self.screen_price(flight, current_price)
+        if verdict.outcome in HELD_BACK:
+            return verdict
+        
+        # Paused, departed and archived subscribers get no prices or alerts
+        with span('db.get_search_flights'):
+            subscribers = [subscriber for subscriber in self.get_search_flights(flight.search_id)
+                           if subscriber.status == ACTIVE] or [flight]
+        
+        # Save price to history
+        with span('db.record_price', subscribers=len(subscribers)):
+            alerted = self.record_prices([(subscriber.id, subscriber.target_price, subscriber.currency)
+                                          for subscriber in subscribers], current_price)
+        
+        for subscriber in subscribers:
+            if subscriber.id in alerted:
+                self.raise_alert(subscriber, convert(current_price, subscriber.currency), defer_alerts)
+        return verdict
+    
+    def screen_price(self, flight, current_price):
+        """Compare a found price with its search's recent prices; returns a flight_outliers.Verdict"""
+        amount, currency = current_price
+        screen = price_screen(self.db_path)
+        with span('outlier.screen') as screen_span:
+            verdict = screen.check(
+                (flight.search_id, currency), amount,
+                history=lambda: self.store.get_recent_search_prices(flight.search_id, currency, screen.window))
+            screen_span.set_attribute('outcome', verdict.outcome)
+        PRICES_SCREENED_TOTAL.labels(provider=PROVIDER, outcome=verdict.outcome).inc()
+        QUEUE_DEPTH.labels(queue='quarantine').set(len(screen.pending))
+        if verdict.outcome in HELD_BACK:
+            logger.warning("Price held back as an outlier: %s", outlier_detail(current_price, verdict),
+                           extra={'outcome': verdict.outcome, 'deviation': verdict.deviation})
+        elif verdict.outcome == CONFIRMED:
+            logger.info("Outlier confirmed by re-check: %s", outlier_detail(current_price, verdict))
+        return verdict
+    
+    def raise_alert(self, flight, current_price, defer_alerts):
+        """Send or queue the alert for a flight whose price (Money in its currency) dropped to its target"""
+        logger.info("Price alert! Current: %s, Target: %s", format_money(*current_price),
+                    format_money(flight.target_price, flight.currency))
+        alert = PriceAlert(flight.id, flight.origin, flight.destination, flight.departure_date,
+                           current_price.amount, flight.target_price, flight.currency)
+        if defer_alerts:
+            self.pending_alerts.add(flight.email, alert)
+            QUEUE_DEPTH.labels(queue='alerts').set(len(self.pending_alerts))
+        else:
+            self.send_email_alert(flight.email, flight.origin, flight.destination, flight.departure_date,
+                                  current_price.amount, flight.target_price, flight.currency)
+    
+    def check_prices(self, flight_ids, max_tabs, rss_ceiling_mb=None, dispatch_interval=0, defer_alerts=True):
+        """Check several flights through tabs of one browser
+        
+        Yields (flight_id, price, reason) as each search finishes; price is
+        None and reason is a flight_retry failure reason (or NOT_FOUND)
+        when no price was found or it was held back as an outlier.
+        """
+        from flight_tabs import TAB_ARGUMENTS, TabPool
+        
+        flights = {}
+        for flight_id in flight_ids:
+            with span('db.get_flight'):
+                flight = self.get_flight(flight_id)
+            if flight:
+                flights[flight_id] = flight
+            else:
+                yield flight_id, None, NOT_FOUND
+        if not flights:
+            return
+        if not self.breaker.allow():
+            for flight_id in flights:
+                CHECKS_TOTAL.labels(provider=PROVIDER, result='circuit_open').inc()
+                yield flight_id, None, CIRCUIT_OPEN
+            return
+        
+        options = chrome_options(self.scraper_profile)
+        for argument in TAB_ARGUMENTS:
+            options.add_argument(argument)
+        with span('driver.start'):
+            driver = self.get_chrome_driver(options)
+        
+        def jobs():
+            # The first search is the one allow() admitted above
+            for position, (flight_id, flight) in enumerate(flights.items()):
+                if position and not self.breaker.allow():
+                    return
+                yield flight_id, self.build_search_url(flight.origin, flight.destination, flight.departure_date)
+        
+        remaining = set(flights)
+        try:
+            pool = TabPool(driver, PRICE_SELECTORS, max_tabs, rss_ceiling_mb, timeout=self.page_timeout,
+                           dispatch_interval=dispatch_interval, currency=default_currency(),
+                           on_failure=lambda flight_id, error: self.capture_debug(driver, flight_id, TAB_FAILURES[error]))
+            for outcome in pool.run(jobs()):
+                flight_id = outcome.key
+                remaining.discard(flight_id)
+                result = 'success' if outcome.price is not None else ('no_price' if not outcome.error else 'error')
+                reason = None if outcome.price is not None else TAB_FAILURES[outcome.error]
+                with span('check_price', flight_id=flight_id, mode='tabs') as check_span, \
+                        log_context(check_id=new_id(), flight_id=flight_id):
+                    self.record_page_stats(outcome.stats, outcome.seconds, outcome.price is not None)
+                    # The finished search's tab is still the focused one
+                    if self.provider_mode == RECORD and outcome.error != 'driver':
+                        flight = flights[flight_id]
+                        self.record_snapshot(driver, self.build_search_url(flight.origin, flight.destination,
+                                                                           flight.departure_date),
+                                             outcome.seconds, outcome.price, outcome.selector, outcome.stats,
+                                             outcome.error)
+                    if outcome.price is None:
+                        logger.warning("Could not find price on page", extra={'reason': reason})
+                        self.record_failure(flight_id, reason, outcome.seconds)
+                    else:
+                        logger.info("Found price: %s", format_money(*outcome.price), extra={'selector': outcome.selector})
+                        verdict = self.handle_price(flights[flight_id], outcome.price, defer_alerts)
+                        if verdict.outcome in HELD_BACK:
+                            result = 'outlier'
+                            reason = OUTLIER
+                            self.record_failure(flight_id, reason, outcome.seconds,
+                                                outlier_detail(outcome.price, verdict))
+                    check_span.set_attribute('result', result)
+                    CHECKS_TOTAL.labels(provider=PROVIDER, result=result).inc()
+                    CHECK_SECONDS.labels(provider=PROVIDER).observe(outcome.seconds)
+                    self.record_breaker(result in ('success', 'outlier'))
+                yield flight_id, outcome.price if reason is None else None, reason
         except Exception as e:
-            print(f"❌ Error checking price: {e}")
-            conn.close()
-            raise
+            reason = classify_failure(e)
+            logger.error("Browser failed with %d search(es) outstanding: %s", len(remaining), e,
+                         extra={'reason': reason})
+            self.record_breaker(False)
+            for flight_id in list(remaining):
+                remaining.discard(flight_id)
+                CHECKS_TOTAL.labels(provider=PROVIDER, result='error').inc()
+                self.record_failure(flight_id, reason, 0, detail=f'{type(e).__name__}: {e}'[:500])
+                yield flight_id, None, reason
         finally:
-            if driver:
-                driver.quit()
+            with span('driver.quit'):
+                try:
+                    driver.quit()
+                except Exception as e:
+                    logger.warning("Could not quit browser: %s", e)
+        
+        # Searches never dispatched because the circuit opened part way through
+        for flight_id in remaining:
+            CHECKS_TOTAL.labels(provider=PROVIDER, result='circuit_open').inc()
+            yield flight_id, None, CIRCUIT_OPEN
     
-    def get_price_history(self, flight_id):
-        """Get price history for a flight"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def capture_debug(self, driver, flight_id, reason):
+        """Hand the failed page to the debug artifact store (sampled, written in the background)"""
+        from flight_artifacts import artifact_store
+        
+        with span('debug.capture'):
+            capture_id = artifact_store().capture(driver, flight_id, reason, selectors=PRICE_SELECTORS,
+                                                  profile=self.scraper_profile)
+        if capture_id:
+            logger.info("Debug artifact queued: %s", capture_id)
+    
+    def record_snapshot(self, driver, url, load_seconds, price, selector, stats, error=None):
+        """Save the loaded page for later replay (PROVIDER_MODE=record)"""
+        try:
+            html = driver.page_source
+        except Exception as e:
+            logger.warning("Could not record page: %s", e)
+            return
+        with span('snapshot.record'):
+            self.snapshots.record(url, html, load_seconds, price, selector, stats, error)
+    
+    def record_page_stats(self, stats, ready_seconds, found):
+        """Record bytes transferred and page-ready time for the page just scraped"""
+        stats = dict(stats)
+        stats['profile'] = self.scraper_profile
+        stats['ready_ms'] = round(ready_seconds * 1000, 1) if found else None
+        self.last_page_stats = stats
+        
+        labels = {'provider': PROVIDER, 'profile': self.scraper_profile}
+        if found:
+            PAGE_READY_SECONDS.labels(**labels).observe(ready_seconds)
+        if 'transfer_bytes' in stats:
+            PAGE_BYTES.labels(**labels).observe(stats['transfer_bytes'])
+        logger.debug("Page loaded", extra=stats)
+    
+    def get_events(self, after_id=0, limit=100):
+        """Events newer than after_id, oldest first"""
+        with DB_QUERY_SECONDS.labels(operation='get_events').time():
+            return self.store.get_events(after_id, limit)
+    
+    def get_last_event_id(self):
+        """Id of the newest event, or 0"""
+        with DB_QUERY_SECONDS.labels(operation='get_last_event_id').time():
+            return self.store.get_last_event_id()
+    
+    def flush_alerts(self):
+        """Send queued alerts, one digest message per recipient"""
+        with span('flush_alerts'):
+            return self._flush_alerts()
+    
+    def _flush_alerts(self):
+        pending = self.pending_alerts.drain()
+        QUEUE_DEPTH.labels(queue='alerts').set(0)
+        if not pending:
+            return 0
         
-        cursor.execute('''
-            SELECT price, checked_at 
-            FROM price_history 
-            WHERE flight_id = ? 
-            ORDER BY checked_at DESC
-        ''', (flight_id,))
+        if not self.email_address or not self.email_password:
+            logger.warning("Email not configured, skipping %d alert(s)", len(pending))
+            return 0
+        
+        if self.alert_digest:
+            batches = list(pending.items())
+        else:
+            batches = [(recipient, [alert]) for recipient, alerts in pending.items() for alert in alerts]
+        
+        from flight_email import build_alert_message, send_messages
+        
+        with span('email.build', messages=len(batches)):
+            messages = [build_alert_message(self.email_address, recipient, alerts) for recipient, alerts in batches]
+        
+        try:
+            with span('email.smtp', messages=len(messages)), EMAIL_SEND_SECONDS.time():
+                send_messages(self.smtp_server, self.smtp_port, self.email_address, self.email_password, messages,
+                              starttls=self.smtp_starttls)
+            EMAILS_SENT_TOTAL.labels(result='sent').inc(len(messages))
+            logger.info("Sent %d alert email(s) to %d recipient(s)", len(messages), len(pending))
+        except Exception as e:
+            EMAILS_SENT_TOTAL.labels(result='failed').inc(len(messages))
+            logger.error("Error sending email: %s", e)
+            return 0
+        
+        return sum(len(alerts) for alerts in pending.values())
+    
+    def record_failure(self, flight_id, reason, seconds, detail=None):
+        """Log a failed check and the scrape time it cost"""
+        CHECK_FAILURE_SECONDS.labels(reason=reason).inc(seconds)
+        with DB_QUERY_SECONDS.labels(operation='record_failure').time():
+            self.store.record_failure(flight_id, reason, seconds, detail)
+        self.last_failure_reason = reason
+    
+    def queue_retry(self, flight_id, reason, new_streak=False):
+        """Schedule a re-check of a failed flight; returns the due time, or None once attempts run out
+        
+        new_streak=True (a failure in the regular sweep) starts counting
+        attempts again; otherwise this failure adds to the flight's streak.
+        """
+        failures = 1 if new_streak else self.store.retry_failures(flight_id) + 1
+        delay = self.retry_policy.next_delay(failures)
+        
+        if delay is None:
+            self.store.clear_retry(flight_id)
+            due = None
+            logger.warning("Giving up on flight #%s after %d failed checks", flight_id, failures,
+                           extra={'flight_id': flight_id, 'reason': reason})
+        else:
+            due = time.time() + delay
+            self.store.schedule_retry(flight_id, failures, due, reason)
+        QUEUE_DEPTH.labels(queue='retry').set(self.store.retry_depth())
+        return due
+    
+    def clear_retry(self, flight_id):
+        """Drop a flight from the retry queue"""
+        self.store.clear_retry(flight_id)
+    
+    def due_retries(self, until):
+        """Queued re-checks due by the given time, earliest first: (flight_id, failures, due, reason)"""
+        return self.store.due_retries(until)
+    
+    def claim_retries(self, limit=1):
+        """Take up to limit re-checks that are due now: (flight_id, failures, reason)
         
-        history = cursor.fetchall()
-        conn.close()
+        A claimed flight is held for retry_lease_seconds, so other
+        schedulers sharing the database skip it; the check's outcome then
+        clears or reschedules it.
+        """
+        now = time.time()
+        return self.store.claim_retries(now, now + self.retry_lease_seconds, limit)
+    
+    def get_failure_summary(self, days=7):
+        """Failed checks per reason over the last days: {reason: {'count', 'seconds'}}"""
+        return self.store.get_failure_summary(days)
+    
+    def load_breaker(self):
+        """Restore this provider's breaker state from the database"""
+        row = self.store.get_breaker(PROVIDER)
+        if row:
+            self.breaker.restore(*row)
+    
+    def record_breaker(self, success):
+        """Feed a check outcome to the breaker and persist its state"""
+        previous = self.breaker.state
+        self.breaker.record(success)
+        state = self.breaker.snapshot()
+        if state['state'] != previous:
+            logger.warning("Circuit %s → %s", previous, state['state'],
+                           extra={'provider': PROVIDER, 'failure_rate': state['failure_rate'],
+                                  'opened_until': state['opened_until']})
+        
+        with DB_QUERY_SECONDS.labels(operation='record_breaker').time():
+            self.store.save_breaker(PROVIDER, state)
+    
+    def get_provider_health(self):
+        """Breaker state per provider, as last saved by whichever process ran checks"""
+        health = {}
+        for provider, state, recent, opens, opened_until, updated_at in self.store.get_provider_health():
+            health[provider] = {
+                'state': state,
+                'failure_rate': round(recent.count('f') / len(recent), 3) if recent else 0.0,
+                'recent_checks': len(recent),
+                'opens': opens,
+                'retry_at': opened_until if state == 'open' else None,
+                'updated_at': updated_at,
+            }
+        return health
         
-        return history
+    def get_price_history(self, flight_id):
+        """Get price history for a flight as PriceObservation records, newest first"""
+        with DB_QUERY_SECONDS.labels(operation='get_price_history').time():
+            return self.store.get_price_history(flight_id)
     
-    def send_email_alert(self, recipient, origin, destination, date, current_price, target_price):
+    def send_email_alert(self, recipient, origin, destination, date, current_price, target_price, currency=None):
         """Send email alert when price drops"""
+        alert = PriceAlert(None, origin, destination, date, current_price, target_price,
+                           currency or default_currency())
+        with span('send_email_alert'):
+            self.send_digest_alert(recipient, [alert])
+    
+    def send_digest_alert(self, recipient, alerts):
+        """Send one email covering one or more price drops for the same recipient"""
         if not self.email_address or not self.email_password:
-            print("⚠️ Email not configured, skipping alert")
+            logger.warning("Email not configured, skipping alert")
             return
         
+        from flight_email import build_alert_message, send_messages
+        
         try:
-            # Create email
-            msg = MIMEMultipart()
-            msg['From'] = self.email_address
-            msg['To'] = recipient
-            msg['Subject'] = f'✈️ Price Alert: {origin} → {destination}'
-            
-            body = f"""
-            🎉 Great news! The flight price has dropped!
-            
-            Flight Details:
-            • Route: {origin} → {destination}
-            • Date: {date}
-            • Current Price: ₹{current_price}
-            • Your Target: ₹{target_price}
-            • Savings: ₹{target_price - current_price}
-            
-            Book now before the price goes up!
-            
-            Happy travels! ✈️
-            """
-            
-            msg.attach(MIMEText(body, 'plain'))
-            
-            # Send email
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.email_address, self.email_password)
-            server.send_message(msg)
-            server.quit()
-            
-            print(f"📧 Email alert sent to {recipient}")
+            with span('email.build', messages=1):
+                msg = build_alert_message(self.email_address, recipient, alerts)
+            with span('email.smtp', messages=1), EMAIL_SEND_SECONDS.time():
+                send_messages(self.smtp_server, self.smtp_port, self.email_address, self.email_password, [msg],
+                              starttls=self.smtp_starttls)
+            EMAILS_SENT_TOTAL.labels(result='sent').inc()
+            logger.info("Email alert sent", extra={'recipient': recipient})
             
         except Exception as e:
-            print(f"❌ Error sending email: {e}")
\ No newline at end of file
+            EMAILS_SENT_TOTAL.labels(result='failed').inc()
+            logger.error("Error sending email: %s", e)
@@ -0,0 +1,60 @@
+"""
+Gunicorn settings for the web app (used by the Procfile)
+
+Every value can be overridden from the environment or the command line.
+benchmarks/bench_http_load.py compares worker settings; see the README.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Each thread gets its own tracker (app.WorkerTracker), so concurrent
+# /check requests do not see each other's results; a worker's threads share
+# its circuit breaker. The views are SQLite reads plus template rendering,
+# and /check holds its thread for a whole Chrome run.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+
+# An open /events stream holds a thread for its whole life, but the thread
+# only waits on the event broker, so threads are sized for dashboards
+# rather than CPU (see post_worker_init for how many streams may open).
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+
+# Keep connections from browsers and the load balancer open between requests
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# /check/<id> scrapes synchronously (driver start + page load + selector waits)
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+
+# Import the app once in the master; workers fork from it and build their
+# own tracker on first use (app.WorkerTracker)
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') != '0'
+
+# Recycle workers now and then to bound slow leaks (Chrome children, caches)
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = 100
+
+# Heartbeat files on tmpfs so a slow disk cannot stall workers
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+
+def when_ready(server):
+    """Run schema setup once in the master before workers fork"""
+    if preload_app:
+        from app import app, get_tracker
+        with app.app_context():
+            get_tracker()
+
+
+def post_worker_init(worker):
+    """Let /events streams take all but SSE_RESERVED_THREADS of the worker's threads
+
+    The reserved threads keep pages and /check responsive however many
+    dashboards are open. An explicit SSE_MAX_STREAMS wins.
+    """
+    broker = getattr(worker.wsgi, 'extensions', {}).get('event_broker')
+    if broker is not None and 'SSE_MAX_STREAMS' not in os.environ:
+        broker.max_subscribers = max(1, worker.cfg.threads - int(os.getenv('SSE_RESERVED_THREADS', 4)))
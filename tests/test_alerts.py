@@ -0,0 +1,48 @@
+"""
+Tests for the price alert state machine
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flight_alerts import ARMED, FIRED, next_alert_state
+
+TARGET = 5000
+REARM_PCT = 5
+
+
+class NextAlertStateTest(unittest.TestCase):
+
+    def observe(self, prices, state=None):
+        """(state, should_alert) after each price, starting from state"""
+        steps = []
+        for price in prices:
+            state, should_alert = next_alert_state(state, price, TARGET, REARM_PCT)
+            steps.append((state, should_alert))
+        return steps
+
+    def test_fires_at_target(self):
+        self.assertEqual(self.observe([5200, 5000]), [(ARMED, False), (FIRED, True)])
+
+    def test_quiet_on_further_drops(self):
+        self.assertEqual(self.observe([4800, 4500, 4900, 5100], state=FIRED),
+                         [(FIRED, False)] * 4)
+
+    def test_rearms_above_threshold(self):
+        # 5% above 5000 is 5250
+        self.assertEqual(self.observe([5249, 5250], state=FIRED), [(FIRED, False), (ARMED, False)])
+
+    def test_fires_again_after_rearming(self):
+        self.assertEqual(self.observe([4900, 4700, 5300, 5100, 4950]),
+                         [(FIRED, True), (FIRED, False), (ARMED, False), (ARMED, False), (FIRED, True)])
+
+    def test_no_target_never_fires(self):
+        self.assertEqual(next_alert_state(None, 100, None, REARM_PCT), (ARMED, False))
+        self.assertEqual(next_alert_state(FIRED, 100, 0, REARM_PCT), (FIRED, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
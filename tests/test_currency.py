@@ -0,0 +1,73 @@
+"""
+Tests for reading prices off result pages
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flight_currency import Money, lowest_price, parse_amount, parse_price
+
+
+class ParseAmountTest(unittest.TestCase):
+
+    def test_amounts(self):
+        cases = [
+            # number, currency, expected
+            ('1,234.56', 'USD', 1234.56),
+            ('1.234,56', 'EUR', 1234.56),
+            ('1,23,456', 'INR', 123456),
+            ("1'234.50", 'CHF', 1234.50),
+            ('1 234,50', 'EUR', 1234.50),
+            ('4999', 'INR', 4999),
+            # A single mark: three digits after it group thousands, otherwise it is the decimal mark
+            ('1.234', 'EUR', 1234),
+            ('1,234', 'USD', 1234),
+            ('12,50', 'EUR', 12.50),
+            ('12.5', 'USD', 12.5),
+            ('1.234.567', 'EUR', 1234567),
+            # ... unless the currency has three decimals, or none
+            ('1.234', 'KWD', 1.234),
+            ('12,5', 'JPY', 125),
+        ]
+        for number, currency, expected in cases:
+            with self.subTest(number=number, currency=currency):
+                self.assertAlmostEqual(parse_amount(number, currency), expected)
+
+    def test_prices_with_markers(self):
+        cases = [
+            ('$1,234.56', Money(1234.56, 'USD')),
+            ('1.234,56 €', Money(1234.56, 'EUR')),
+            ('₹1,23,456', Money(123456, 'INR')),
+            ("CHF 1'234.50", Money(1234.50, 'CHF')),
+            ('US$ 99', Money(99, 'USD')),
+            ('Rs. 4,999', Money(4999, 'INR')),
+        ]
+        for text, expected in cases:
+            with self.subTest(text=text):
+                self.assertEqual(parse_price(text), expected)
+
+
+class LowestPriceTest(unittest.TestCase):
+
+    def test_lowest_price(self):
+        cases = [
+            # texts, currency for bare numbers, expected
+            (['DEL-BOM 2h 15m ₹5,499', '₹4,999', '₹12,000'], None, Money(4999, 'INR')),
+            (['€1.234,56', '€999,00'], None, Money(999, 'EUR')),
+            # The first marked currency wins; other currencies are not compared
+            (['$120', '₹4,999'], None, Money(120, 'USD')),
+            # Bare numbers only count when no text is marked, and only alone in their text
+            (['2 stops, 5h 30m', '4,999', '3,999'], 'USD', Money(3999, 'USD')),
+            (['1 stop 4999', '₹5,499'], None, Money(5499, 'INR')),
+            (['Sold out', None], 'USD', None),
+        ]
+        for texts, currency, expected in cases:
+            with self.subTest(texts=texts):
+                self.assertEqual(lowest_price(texts, currency), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
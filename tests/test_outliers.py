@@ -0,0 +1,50 @@
+"""
+Tests for the per-search outlier screen
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flight_outliers import ACCEPTED, CONFIRMED, QUARANTINED, REJECTED, PriceScreen
+
+HISTORY = [5000, 5050, 4950, 5020, 4980, 5010]
+
+
+class PriceScreenTest(unittest.TestCase):
+
+    def setUp(self):
+        self.screen = PriceScreen()
+
+    def outcomes(self, key, prices):
+        return [self.screen.check(key, price, lambda: HISTORY).outcome for price in prices]
+
+    def test_normal_price_accepted(self):
+        self.assertEqual(self.outcomes((1, 'INR'), [5030]), [ACCEPTED])
+
+    def test_quarantined_price_confirmed_by_one_recheck(self):
+        self.assertEqual(self.outcomes((1, 'INR'), [7000, 7000]), [QUARANTINED, CONFIRMED])
+
+    def test_extreme_prices_confirmed_after_repeated_sightings(self):
+        for key, price in (((1, 'INR'), 1100), ((2, 'INR'), 22000)):
+            with self.subTest(price=price):
+                self.assertEqual(self.outcomes(key, [price] * 3), [REJECTED, REJECTED, CONFIRMED])
+
+    def test_inconsistent_sightings_start_over(self):
+        self.assertEqual(self.outcomes((1, 'INR'), [1100, 2000, 1100, 1100]),
+                         [REJECTED, QUARANTINED, REJECTED, REJECTED])
+
+    def test_confirmed_price_becomes_the_new_level(self):
+        self.assertEqual(self.outcomes((1, 'INR'), [22000] * 3 + [22100, 21900]),
+                         [REJECTED, REJECTED, CONFIRMED, ACCEPTED, ACCEPTED])
+
+    def test_windows_are_per_search(self):
+        self.outcomes((1, 'INR'), [5000])
+        verdict = self.screen.check((2, 'INR'), 9000, lambda: [9000, 9100, 8900, 9050, 8950])
+        self.assertEqual(verdict.outcome, ACCEPTED)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+"""
+Tests for PostgresStore against a real PostgreSQL server
+
+Skipped unless DATABASE_URL is a postgresql:// URL. The tests create a
+scratch database next to the one named there (the role needs CREATEDB)
+and drop it afterwards, so the database itself is left untouched:
+
+    DATABASE_URL=postgresql://postgres@localhost/flights python -m pytest tests
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+import uuid
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flight_store
+from flight_store import POSTGRES_SCHEMES, postgres_sql
+
+DATABASE_URL = os.getenv('DATABASE_URL', '')
+
+
+class PostgresSqlTest(unittest.TestCase):
+    """The ? to %s rewrite; needs no server"""
+
+    def test_placeholders(self):
+        self.assertEqual(postgres_sql('SELECT a FROM t WHERE b = ? AND c IN (?, ?)'),
+                         'SELECT a FROM t WHERE b = %s AND c IN (%s, %s)')
+
+    def test_quoted_question_marks_are_kept(self):
+        self.assertEqual(postgres_sql("SELECT '?', \"a?\" FROM t WHERE b = 'it''s ?' AND c = ?"),
+                         "SELECT '?', \"a?\" FROM t WHERE b = 'it''s ?' AND c = %s")
+
+    def test_percent_signs_are_escaped(self):
+        self.assertEqual(postgres_sql("SELECT 1 WHERE a LIKE 'x%' AND b % 2 = ?"),
+                         "SELECT 1 WHERE a LIKE 'x%%' AND b %% 2 = %s")
+
+
+@unittest.skipUnless(DATABASE_URL.startswith(POSTGRES_SCHEMES), 'DATABASE_URL is not a PostgreSQL URL')
+class PostgresStoreTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        import psycopg
+
+        cls.dbname = f'flights_test_{uuid.uuid4().hex[:8]}'
+        with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+            conn.execute(f'CREATE DATABASE {cls.dbname}')
+        cls.url = urlsplit(DATABASE_URL)._replace(path=f'/{cls.dbname}').geturl()
+        cls.store = flight_store.open_store(cls.url)
+
+    @classmethod
+    def tearDownClass(cls):
+        import psycopg
+
+        flight_store.connection_pool(cls.url).close()
+        with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+            conn.execute(f'DROP DATABASE IF EXISTS {cls.dbname}')
+
+    def setUp(self):
+        with self.store.connect() as cursor:
+            cursor.execute('TRUNCATE retry_queue, price_history, alert_state, flights CASCADE')
+
+    def add_flights(self, count, email='a@example.com'):
+        return [self.store.add_flight('DEL', 'BOM', '2030-01-01', email, 5000) for _ in range(count)]
+
+    def test_question_mark_in_literal(self):
+        flight_id, = self.add_flights(1, email='who?@example.com')
+        with self.store.connect() as cursor:
+            cursor.execute("SELECT id FROM flights WHERE email = 'who?@example.com' AND id = ?", (flight_id,))
+            self.assertEqual(cursor.fetchone()[0], flight_id)
+
+    def test_import_flights_ids_with_concurrent_inserts(self):
+        import psycopg
+
+        search_id = self.store.get_flight(self.add_flights(1)[0]).search_id
+        stop = threading.Event()
+
+        def insert_others():
+            with psycopg.connect(self.url, autocommit=True) as conn:
+                while not stop.is_set():
+                    conn.execute("INSERT INTO flights (search_id, email) VALUES (%s, 'other@example.com')",
+                                 (search_id,))
+
+        writer = threading.Thread(target=insert_others)
+        writer.start()
+        try:
+            for batch in range(10):
+                rows = [(search_id, f'import-{batch}-{n}@example.com', 5000, '2030-01-01 00:00:00')
+                        for n in range(200)]
+                ids = self.store.import_flights(rows)
+                self.assertEqual([self.store.get_flight(flight_id).email for flight_id in ids],
+                                 [row[1] for row in rows])
+        finally:
+            stop.set()
+            writer.join()
+
+    def test_claim_retries_skips_locked_rows(self):
+        import psycopg
+
+        flight_ids = self.add_flights(3)
+        now = time.time()
+        for flight_id in flight_ids:
+            self.store.schedule_retry(flight_id, 1, now - 10, 'timeout')
+
+        # Another checker is in the middle of claiming the first one
+        with psycopg.connect(self.url) as other:
+            other.execute('SELECT flight_id FROM retry_queue WHERE flight_id = %s FOR UPDATE', (flight_ids[0],))
+            claimed = self.store.claim_retries(now, now + 300, 10)
+            self.assertEqual(sorted(row[0] for row in claimed), flight_ids[1:])
+            other.rollback()
+
+        # Claimed rows are leased; the skipped one is still due
+        claimed = self.store.claim_retries(now, now + 300, 10)
+        self.assertEqual([row[0] for row in claimed], flight_ids[:1])
+
+    def test_concurrent_claims_are_disjoint(self):
+        flight_ids = self.add_flights(40)
+        now = time.time()
+        for flight_id in flight_ids:
+            self.store.schedule_retry(flight_id, 1, now - 10, 'timeout')
+
+        claims = []
+        barrier = threading.Barrier(4)
+
+        def claim():
+            barrier.wait()
+            while True:
+                rows = self.store.claim_retries(now, now + 300, 3)
+                if not rows:
+                    break
+                claims.extend(row[0] for row in rows)
+
+        threads = [threading.Thread(target=claim) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(claims), flight_ids)
+
+
+if __name__ == '__main__':
+    unittest.main()